@@ -0,0 +1,105 @@
+"""Vector search throughput by batch size, direct and through the micro-batcher.
+
+"direct" calls `VectorStore.search_batch` with caller-side batches of 1, 8 and
+64 queries (bulk jobs). "batcher" fires the same queries from concurrent
+threads through `SearchBatcher`, as API requests would, and reports the
+average batch size it formed. For pgvector, set VECTOR_STORE/PGVECTOR_DATABASE_URL
+as for `benchmarks.vector_store_check`.
+
+Run from `backend/`:
+
+    python -m benchmarks.batch_search [--vectors 20000] [--dim 384] [--queries 512]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+import settings as settings_module
+from settings import settings
+
+_REPO_ID = 990_001
+
+
+def _direct(store, queries: np.ndarray, batch_size: int, top_k: int) -> float:
+    started = time.perf_counter()
+    for offset in range(0, len(queries), batch_size):
+        store.search_batch(_REPO_ID, queries[offset : offset + batch_size].tolist(), top_k)
+    return len(queries) / (time.perf_counter() - started)
+
+
+def _through_batcher(store, queries: np.ndarray, threads: int, window_ms: float, max_batch: int, top_k: int):
+    from vectorstore.batcher import SearchBatcher
+
+    calls = {"batches": 0}
+    original = store.search_batch
+
+    def counting(*args, **kwargs):
+        calls["batches"] += 1
+        return original(*args, **kwargs)
+
+    store.search_batch = counting
+    batcher = SearchBatcher(store, window_ms=window_ms, max_batch=max_batch)
+    rows = queries.tolist()
+    per_thread = [rows[i::threads] for i in range(threads)]
+
+    def worker(items):
+        for vector in items:
+            batcher.search(_REPO_ID, vector, top_k)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(items,)) for items in per_thread]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    store.search_batch = original
+    return len(rows) / elapsed, len(rows) / max(1, calls["batches"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if (settings.vector_store or "faiss").strip().lower() == "faiss":
+        # Keep FAISS files out of the real data directory.
+        settings_module.DATA_DIR = Path(tempfile.mkdtemp(prefix="codelens-batch-"))
+
+    from vectorstore.base import get_vector_store
+
+    store = get_vector_store()
+    if not store.available:
+        raise SystemExit(f"vector store {store.name!r} is not available")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.random((args.vectors, args.dim), dtype=np.float32)
+    metadata = [{"chunk_id": i + 1, "file_path": f"src/f{i % 500}.py", "token_count": 32} for i in range(args.vectors)]
+    for offset in range(0, args.vectors, 10_000):
+        store.add(_REPO_ID, vectors[offset : offset + 10_000].tolist(), metadata[offset : offset + 10_000])
+    queries = rng.random((args.queries, args.dim), dtype=np.float32)
+
+    try:
+        print(f"store={store.name} vectors={args.vectors} dim={args.dim} queries={args.queries} top_k={args.top_k}")
+        for batch_size in (1, 8, 64):
+            qps = _direct(store, queries, batch_size, args.top_k)
+            print(f"direct  batch={batch_size:>2}: {qps:>9,.0f} queries/s")
+        for max_batch in (1, 8, 64):
+            qps, avg = _through_batcher(store, queries, args.threads, args.window_ms, max_batch, args.top_k)
+            print(f"batcher max={max_batch:>2}: {qps:>9,.0f} queries/s (avg batch {avg:.1f}, {args.threads} threads)")
+    finally:
+        store.delete_repo(_REPO_ID)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Query-plan regression check for the hot crud lookups (SQLite).
+
+Creates a fresh database through `init_db` (models + migrations), runs each
+hot crud function while recording the SQL it emits, and inspects
+`EXPLAIN QUERY PLAN` for every SELECT. A check fails when a plan scans a whole
+table or index (`SCAN ...`) or sorts through a temp B-tree where the index
+should already provide the order. Exits non-zero on failure, so it can run in CI:
+
+    python -m benchmarks.check_query_plans
+"""
+
+import re
+import sys
+import tempfile
+from pathlib import Path
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import event, text
+
+from database import crud
+from database.db import SessionLocal, init_db
+
+
+class PlanCheck(NamedTuple):
+    name: str
+    run: Callable
+    # Small result sets (e.g. a handful of paths) may be sorted in memory.
+    allow_sort: bool = False
+
+
+CHECKS: List[PlanCheck] = [
+    PlanCheck("get_repo_owner_id", lambda db: crud.get_repo_owner_id(db, 1)),
+    PlanCheck("list_repos_by_user", lambda db: crud.list_repos_by_user(db, 1)),
+    PlanCheck("get_dashboard_overview", lambda db: crud.get_dashboard_overview(db, 1)),
+    PlanCheck("list_files_by_repo", lambda db: crud.list_files_by_repo(db, 1)),
+    PlanCheck("get_files_by_paths", lambda db: crud.get_files_by_paths(db, 1, ["a.py", "b.py"])),
+    PlanCheck("get_file_summaries", lambda db: crud.get_file_summaries(db, 1, ["a.py", "b.py"])),
+    PlanCheck("get_file_by_id", lambda db: crud.get_file_by_id(db, 1, 1)),
+    PlanCheck("get_file_metrics", lambda db: crud.get_file_metrics(db, 1, 1)),
+    PlanCheck("list_chunks_by_file", lambda db: crud.list_chunks_by_file(db, 1)),
+    PlanCheck("get_chunk_texts_by_ids", lambda db: crud.get_chunk_texts_by_ids(db, [1, 2, 3])),
+    PlanCheck("get_chunk_rows_by_ids", lambda db: crud.get_chunk_rows_by_ids(db, [1, 2, 3])),
+    PlanCheck("get_chunk_rows_by_span", lambda db: crud.get_chunk_rows_by_span(db, 1, 100, 900)),
+    PlanCheck("find_symbol_definitions", lambda db: crud.find_symbol_definitions(db, [1, 2], ["run_job", "Session"])),
+    PlanCheck("get_file_symbol", lambda db: crud.get_file_symbol(db, 1, "run_job")),
+    PlanCheck("find_symbol_references", lambda db: crud.find_symbol_references(db, 1, "run_job")),
+    PlanCheck("search_chunk_rows_lexical", lambda db: crud.search_chunk_rows_lexical(db, 1, "session handler")),
+    PlanCheck("get_cached_chat_message", lambda db: crud.get_cached_chat_message(db, 1, 1, "how does auth work")),
+    PlanCheck("list_chat_messages_by_repo", lambda db: crud.list_chat_messages_by_repo(db, user_id=1, repo_id=1)),
+    PlanCheck("get_latest_ingestion_job", lambda db: crud.get_latest_ingestion_job(db, 1)),
+    PlanCheck("get_active_ingestion_job", lambda db: crud.get_active_ingestion_job(db, 1)),
+]
+
+_SCAN_RE = re.compile(r"^SCAN \w+")
+_SORT_RE = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|RIGHT PART OF ORDER BY)")
+
+
+def _plan_problems(detail_lines: List[str], allow_sort: bool) -> List[str]:
+    problems = []
+    for line in detail_lines:
+        if _SCAN_RE.match(line):
+            problems.append(line)
+        elif _SORT_RE.search(line) and not allow_sort:
+            problems.append(line)
+    return problems
+
+
+def main() -> int:
+    tmpdir = Path(tempfile.mkdtemp(prefix="codelens-plans-"))
+    init_db(f"sqlite:///{tmpdir / 'plans.db'}")
+
+    failures = 0
+    db = SessionLocal()
+    engine = db.get_bind()
+    try:
+        for check in CHECKS:
+            statements: list[tuple[str, object]] = []
+
+            def _record(conn, cursor, statement, parameters, context, executemany):
+                statements.append((statement, parameters))
+
+            event.listen(engine, "before_cursor_execute", _record)
+            try:
+                check.run(db)
+            finally:
+                event.remove(engine, "before_cursor_execute", _record)
+
+            problems: List[str] = []
+            plans: List[str] = []
+            with engine.connect() as conn:
+                for statement, parameters in statements:
+                    if not statement.lstrip().upper().startswith("SELECT"):
+                        continue
+                    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                    details = [str(row[-1]) for row in rows]
+                    plans.extend(details)
+                    problems.extend(_plan_problems(details, check.allow_sort))
+
+            status = "FAIL" if problems else "ok"
+            print(f"{status:<4} {check.name}: {' | '.join(plans)}")
+            for problem in problems:
+                print(f"       -> {problem}")
+            failures += bool(problems)
+    finally:
+        db.close()
+
+    print(f"\n{len(CHECKS) - failures}/{len(CHECKS)} hot queries use index lookups")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
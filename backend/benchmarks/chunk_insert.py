@@ -0,0 +1,103 @@
+"""Chunk insert throughput: ORM `bulk_save_objects(return_defaults=True)` vs. Core bulk insert.
+
+"orm" is the previous ingestion path (one `CodeChunk` object per chunk, ids
+fetched back per row). "core" is `crud.bulk_insert_chunks` (pre-allocated id
+range + executemany on SQLite, INSERT ... RETURNING elsewhere). Both runs use
+a fresh database built with `create_db_engine` and commit in ingestion-sized
+batches.
+
+Run from `backend/`:
+
+    python -m benchmarks.chunk_insert [--chunks 100000] [--files-per-batch 200] [--chunks-per-file 20]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.orm import sessionmaker
+
+from database import crud
+from database.db import Base, create_db_engine
+from database.models import CodeChunk, CodeFile, Repository, User
+
+
+def _session_factory(path: Path):
+    engine = create_db_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+    with factory() as db:
+        user = User(email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        repo = Repository(user_id=user.id, repo_url="https://github.com/bench/bench", repo_name="bench", status="processing")
+        db.add(repo)
+        db.commit()
+        return engine, factory, int(repo.id)
+
+
+def _run(label: str, path: Path, *, chunks: int, files_per_batch: int, chunks_per_file: int) -> float:
+    engine, factory, repo_id = _session_factory(path)
+    per_batch = files_per_batch * chunks_per_file
+    inserted = 0
+    batch_no = 0
+    elapsed = 0.0
+    with factory() as db:
+        while inserted < chunks:
+            files = [
+                CodeFile(repo_id=repo_id, file_path=f"src/b{batch_no}/f{i}.py", language="python", raw_content="")
+                for i in range(files_per_batch)
+            ]
+            db.add_all(files)
+            db.flush()
+            rows = [
+                {
+                    "file_id": int(f.id),
+                    "chunk_index": idx,
+                    "chunk_content": "",
+                    "start_offset": idx * 100,
+                    "end_offset": idx * 100 + 120,
+                    "token_count": 30,
+                }
+                for f in files
+                for idx in range(chunks_per_file)
+            ][: chunks - inserted]
+
+            started = time.perf_counter()
+            if label == "orm":
+                objects = [CodeChunk(**row) for row in rows]
+                db.bulk_save_objects(objects, return_defaults=True)
+                ids = [int(obj.id) for obj in objects]
+            else:
+                ids = crud.bulk_insert_chunks(db, rows)
+            db.commit()
+            elapsed += time.perf_counter() - started
+
+            assert len(ids) == len(rows) and len(set(ids)) == len(ids)
+            inserted += len(rows)
+            batch_no += 1
+
+    with factory() as db:
+        stored = db.query(CodeChunk).count()
+    engine.dispose()
+    print(f"{label:>5}: {inserted} chunks in {elapsed:.2f}s ({inserted / max(elapsed, 1e-9):,.0f} rows/s), stored={stored}")
+    return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--files-per-batch", type=int, default=200)
+    parser.add_argument("--chunks-per-file", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        options = dict(chunks=args.chunks, files_per_batch=args.files_per_batch, chunks_per_file=args.chunks_per_file)
+        orm = _run("orm", Path(tmp) / "orm.db", **options)
+        core = _run("core", Path(tmp) / "core.db", **options)
+    print(f"speedup: {orm / max(core, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Tokens saved by context packing and local extractive compression.
+
+Uses this backend's own source as the corpus: files are split into
+`--lines`-line chunks (with cl100k token counts, as ingestion stores them) and
+each function with a docstring gives a query (the docstring's first line). Per
+query the lexical re-ranker picks the top `--k` chunks, which are packed with
+COMPRESSION_PROVIDER=none and with `local` at each target ratio. Reports
+average context tokens, tokens saved per query, packing time, and how often the
+answer function's `def` line survives compression.
+
+Run from `backend/`:
+
+    python -m benchmarks.context_compression [--k 4] [--ratios 1.0,0.6,0.4] [--queries 100]
+"""
+
+import argparse
+import ast
+import random
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import tiktoken
+
+from rag.compressor import pack_context
+from rag.reranker import RetrievedChunk, rerank
+from settings import settings
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _dataset(lines_per_chunk: int) -> Tuple[List[RetrievedChunk], List[Tuple[str, str]]]:
+    encoder = tiktoken.get_encoding("cl100k_base")
+    chunks: List[RetrievedChunk] = []
+    queries: List[Tuple[str, str]] = []  # (question, answer def line)
+    for file_id, path in enumerate(sorted(BACKEND_DIR.rglob("*.py")), start=1):
+        source = path.read_text(encoding="utf-8", errors="ignore")
+        lines = source.splitlines(keepends=True)
+        rel = str(path.relative_to(BACKEND_DIR))
+        offset = 0
+        for index, start in enumerate(range(0, len(lines), lines_per_chunk)):
+            text = "".join(lines[start : start + lines_per_chunk])
+            chunks.append(
+                RetrievedChunk(
+                    text,
+                    1,
+                    rel,
+                    len(chunks),
+                    file_id=file_id,
+                    chunk_index=index,
+                    token_count=len(encoder.encode(text)),
+                    start_offset=offset,
+                    end_offset=offset + len(text),
+                )
+            )
+            offset += len(text)
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                doc = ast.get_docstring(node)
+                if doc and len(doc.split()) >= 4:
+                    queries.append((doc.splitlines()[0], lines[node.lineno - 1].strip()))
+    return chunks, queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--ratios", default="1.0,0.6,0.4")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=40, help="lines per chunk")
+    parser.add_argument("--budget", type=int, default=0, help="context token budget (default MAX_CONTEXT_TOKENS)")
+    args = parser.parse_args()
+
+    chunks, queries = _dataset(args.lines)
+    random.Random(0).shuffle(queries)
+    queries = queries[: args.queries]
+    settings.reranker = "lexical"
+    ranked = [(question, answer, rerank(question, chunks, args.k)) for question, answer in queries]
+    budget = args.budget or settings.max_context_tokens
+
+    print(f"chunks={len(chunks)} queries={len(ranked)} k={args.k} budget={budget}")
+    print(f"{'mode':>12} {'tokens':>7} {'saved':>6} {'saved %':>7} {'ms':>6} {'answer kept':>11}")
+    modes = [("none", 1.0)] + [("local", float(r)) for r in args.ratios.split(",") if r.strip()]
+    for provider, ratio in modes:
+        settings.compression_provider = provider
+        settings.compression_target_ratio = ratio
+        tokens = saved = kept = 0
+        started = time.perf_counter()
+        for question, answer, top in ranked:
+            packed = pack_context(top, question, budget)
+            tokens += packed.tokens
+            saved += packed.tokens_saved
+            kept += answer in packed.text
+        elapsed_ms = (time.perf_counter() - started) * 1000 / len(ranked)
+        n = len(ranked)
+        label = provider if provider == "none" else f"local@{ratio:g}"
+        share = saved / (tokens + saved) if tokens + saved else 0.0
+        print(f"{label:>12} {tokens / n:>7.0f} {saved / n:>6.0f} {share:>7.1%} {elapsed_ms:>6.2f} {kept / n:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Recall lost by shorter embeddings: Matryoshka truncation and PCA vs. full size.
+
+Ground truth is exact L2 search over the full-size vectors. For each target
+dimension the tool reports recall@k of exact search over (a) truncated,
+re-normalized vectors (what EMBEDDING_REDUCTION=api returns) and (b) a PCA
+projection trained on the corpus (EMBEDDING_REDUCTION=pca), with bytes per
+vector and search time on a flat index.
+
+Use real vectors: `--repo-id` reads a FAISS repo index from the data directory,
+`--npy` a saved (n, d) float32 array. Without either, synthetic low-rank
+vectors are used; truncation numbers are only meaningful for real
+text-embedding-3 vectors, whose leading dimensions carry the most signal.
+
+Run from `backend/`:
+
+    python -m benchmarks.dimension_recall [--repo-id 12 | --npy vectors.npy] [--dims 1024,512,256,128] [--k 10]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+try:
+    import faiss  # type: ignore
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+
+from vectorstore.dimensions import train_pca, truncate
+
+
+def _synthetic(vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rank = max(8, dim // 8)
+    basis = rng.normal(size=(rank, dim)).astype("float32")
+    weights = rng.normal(size=(vectors, rank)).astype("float32") * np.linspace(3.0, 0.2, rank, dtype="float32")
+    data = weights @ basis + 0.05 * rng.normal(size=(vectors, dim)).astype("float32")
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _search(base: np.ndarray, queries: np.ndarray, k: int) -> tuple[np.ndarray, float]:
+    index = faiss.IndexFlatL2(base.shape[1])
+    index.add(np.ascontiguousarray(base, dtype="float32"))
+    started = time.perf_counter()
+    _, ids = index.search(np.ascontiguousarray(queries, dtype="float32"), k)
+    return ids, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(row.tolist()) & set(expected.tolist())) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo-id", type=int)
+    parser.add_argument("--npy")
+    parser.add_argument("--vectors", type=int, default=20_000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=1536, help="synthetic vector size")
+    parser.add_argument("--dims", default="1024,512,256,128")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if faiss is None:
+        raise SystemExit("faiss is not installed")
+    if args.repo_id is not None:
+        from vectorstore.dimensions import _repo_vectors
+
+        data = _repo_vectors(args.repo_id)
+        source = f"repo {args.repo_id}"
+    elif args.npy:
+        data = np.load(args.npy).astype("float32")
+        source = args.npy
+    else:
+        data = _synthetic(args.vectors, args.dim)
+        source = "synthetic"
+
+    rng = np.random.default_rng(1)
+    order = rng.permutation(len(data))
+    queries, base = data[order[: args.queries]], data[order[args.queries :]]
+    truth, full_ms = _search(base, queries, args.k)
+    full_dim = data.shape[1]
+
+    print(f"source={source} vectors={len(base)} full_dim={full_dim} queries={len(queries)} k={args.k}")
+    print(f"{'dims':>6} {'bytes/vec':>9} {'trunc recall':>12} {'pca recall':>10} {'ms/query':>9}")
+    print(f"{full_dim:>6} {full_dim * 4:>9} {1.0:>12.3f} {1.0:>10.3f} {full_ms:>9.2f}")
+    for dims in sorted({int(d) for d in args.dims.split(",") if d.strip()}, reverse=True):
+        if dims >= full_dim:
+            continue
+        found, ms = _search(truncate(base, dims), truncate(queries, dims), args.k)
+        trunc_recall = _recall(found, truth)
+        pca = train_pca(base, dims)
+        found, _ = _search(pca.apply_py(base), pca.apply_py(queries), args.k)
+        print(f"{dims:>6} {dims * 4:>9} {trunc_recall:>12.3f} {_recall(found, truth):>10.3f} {ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Local embedding throughput: chunks/sec and chunks/sec per core.
+
+Embeds code chunks (this backend's own source split into `--lines`-line
+pieces) with the local provider (`vectorstore/local_embeddings.py`) once per
+thread count and batch size. Each configuration gets a warm-up batch first, so
+model loading is not timed.
+
+Needs the local backend installed: `pip install sentence-transformers` or
+`pip install onnxruntime tokenizers` with an ONNX export in
+LOCAL_EMBEDDING_MODEL.
+
+Run from `backend/`:
+
+    python -m benchmarks.embedding_throughput [--threads 1,2,4] [--batch-sizes 16,32,64] [--chunks 512]
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import List
+
+from vectorstore.local_embeddings import LocalEmbeddingProvider
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _chunks(count: int, lines_per_chunk: int) -> List[str]:
+    chunks: List[str] = []
+    for path in sorted(BACKEND_DIR.rglob("*.py")):
+        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+        for start in range(0, len(lines), lines_per_chunk):
+            text = "\n".join(lines[start : start + lines_per_chunk]).strip()
+            if text:
+                chunks.append(text)
+    if not chunks:
+        raise SystemExit("no source files found to embed")
+    while len(chunks) < count:
+        chunks.extend(chunks[: count - len(chunks)])
+    return chunks[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="defaults to LOCAL_EMBEDDING_MODEL")
+    parser.add_argument("--backend", help="auto, onnx or sentence-transformers (defaults to LOCAL_EMBEDDING_BACKEND)")
+    parser.add_argument("--threads", default=",".join(str(n) for n in sorted({1, 2, os.cpu_count() or 1})))
+    parser.add_argument("--batch-sizes", default="32")
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--lines", type=int, default=40, help="lines per chunk")
+    args = parser.parse_args()
+
+    probe = LocalEmbeddingProvider(args.model, backend=args.backend)
+    if not probe.available:
+        raise SystemExit(
+            "No local embedding backend: pip install sentence-transformers, or pip install onnxruntime tokenizers "
+            "and point LOCAL_EMBEDDING_MODEL at a directory with model.onnx + tokenizer.json"
+        )
+    texts = _chunks(args.chunks, args.lines)
+    print(f"model={probe.model} backend={probe.backend} chunks={len(texts)} cpus={os.cpu_count()}")
+    print(f"{'threads':>7} {'batch':>5} {'seconds':>8} {'chunks/s':>9} {'chunks/s/core':>13}")
+    for threads in sorted({int(t) for t in args.threads.split(",") if t.strip()}):
+        for batch_size in sorted({int(b) for b in args.batch_sizes.split(",") if b.strip()}):
+            provider = LocalEmbeddingProvider(args.model, backend=args.backend, threads=threads, batch_size=batch_size)
+            provider.embed(texts[:batch_size])
+            started = time.perf_counter()
+            provider.embed(texts)
+            seconds = time.perf_counter() - started
+            rate = len(texts) / seconds
+            print(f"{threads:>7} {batch_size:>5} {seconds:>8.2f} {rate:>9.1f} {rate / threads:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
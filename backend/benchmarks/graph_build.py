@@ -0,0 +1,128 @@
+"""Dependency graph build time (ingestion/graph.py) on synthetic or real repos.
+
+Synthetic mode generates `--files` Python modules with `--defs` functions (a
+third of them methods of one class per module) and `--calls` calls per body:
+half bare calls to names imported from other modules, half `self.`/module
+qualified. Real mode (`--path`) reads a checkout with the ingestion file reader.
+
+Per size it reports the symbol extraction time (the per-file parse ingestion
+already does for summaries), the graph build from the extracted rows, the
+.npz size, the load time, and the cost of one retriever expansion lookup.
+
+Run from `backend/`:
+
+    python -m benchmarks.graph_build [--files 1000,5000,20000] [--defs 12] [--calls 6]
+    python -m benchmarks.graph_build --path /path/to/checkout
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from ingestion.file_reader import read_code_files
+from ingestion.graph import build_graph, graph_arrays
+from ingestion.outline import extract_symbols
+
+
+def _synthetic(files: int, defs: int, calls: int, seed: int = 0) -> List[Tuple[str, str, str]]:
+    rng = random.Random(seed)
+    names = [[f"f{m}_{d}" for d in range(defs)] for m in range(files)]
+    out = []
+    for m in range(files):
+        imported = [rng.randrange(files) for _ in range(3)]
+        lines = [f'"""Module {m}."""']
+        lines += [f"from pkg.mod{j} import {names[j][0]}" for j in imported]
+        lines += [f"import pkg.mod{j} as mod{j}" for j in imported]
+        for d in range(defs):
+            method = d >= defs * 2 // 3
+            if method and d == defs * 2 // 3:
+                lines.append(f"class C{m}:")
+            indent = "    " if method else ""
+            lines.append(f"{indent}def {names[m][d]}({'self, ' if method else ''}x):")
+            for _ in range(calls):
+                j = rng.choice(imported)
+                kind = rng.random()
+                if kind < 0.5:
+                    lines.append(f"{indent}    x = {names[j][0]}(x)")
+                elif kind < 0.75 and method:
+                    lines.append(f"{indent}    x = self.{names[m][rng.randrange(defs * 2 // 3, defs)]}(x)")
+                else:
+                    lines.append(f"{indent}    x = mod{j}.{names[j][rng.randrange(defs)]}(x)")
+            lines.append(f"{indent}    return x")
+        out.append((f"pkg/mod{m}.py", "py", "\n".join(lines) + "\n"))
+    return out
+
+
+def _measure(label: str, sources: List[Tuple[str, str, str]]) -> None:
+    started = time.perf_counter()
+    symbols, references, files = [], [], []
+    for file_id, (path, language, text) in enumerate(sources, start=1):
+        files.append((file_id, path))
+        definitions, refs = extract_symbols(text, language)
+        line_starts = [0]
+        for line in text.splitlines(keepends=True):
+            line_starts.append(line_starts[-1] + len(line))
+        for d in definitions:
+            end = line_starts[min(d.end_line, len(line_starts) - 1)]
+            symbols.append(
+                (len(symbols) + 1, file_id, d.name, d.kind, d.parent, d.start_line, d.end_line, line_starts[d.start_line - 1], end)
+            )
+        references.extend((file_id, r.name, r.line, r.qualifier) for r in refs)
+    parse_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    graph = build_graph(symbols, references, files)
+    build_s = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "graph.npz"
+        np.savez(path, **graph_arrays(graph))
+        size_mb = path.stat().st_size / 1e6
+        started = time.perf_counter()
+        with np.load(path) as data:
+            for key in data.files:
+                data[key]
+        load_ms = (time.perf_counter() - started) * 1000
+
+    rng = random.Random(1)
+    probes = [rng.randrange(len(symbols)) for _ in range(200)] if symbols else []
+    started = time.perf_counter()
+    for i in probes:
+        _, file_id, _, _, _, _, _, start, end = symbols[i]
+        for node in graph.symbols_in_span(file_id, start, end):
+            graph.calls.row(int(node))
+            graph.called_by.row(int(node))
+    lookup_ms = (time.perf_counter() - started) * 1000 / max(1, len(probes))
+
+    print(
+        f"{label:>10} {len(sources):>7} {len(symbols):>8} {len(references):>9} {graph.calls.edge_count:>8} "
+        f"{graph.imports.edge_count:>8} {parse_s:>8.2f} {build_s:>8.2f} {size_mb:>7.1f} {load_ms:>7.1f} {lookup_ms:>9.3f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", default="1000,5000,20000")
+    parser.add_argument("--defs", type=int, default=12, help="definitions per synthetic module")
+    parser.add_argument("--calls", type=int, default=6, help="calls per synthetic function body")
+    parser.add_argument("--path", help="measure a real checkout instead")
+    args = parser.parse_args()
+
+    print(
+        f"{'repo':>10} {'files':>7} {'symbols':>8} {'refs':>9} {'calls':>8} {'imports':>8} "
+        f"{'parse s':>8} {'build s':>8} {'npz MB':>7} {'load ms':>7} {'lookup ms':>9}"
+    )
+    if args.path:
+        _measure(Path(args.path).name[:10], read_code_files(Path(args.path)))
+        return
+    for files in (int(f) for f in args.files.split(",") if f.strip()):
+        _measure("synthetic", _synthetic(files, args.defs, args.calls))
+
+
+if __name__ == "__main__":
+    main()
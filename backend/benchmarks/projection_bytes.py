@@ -0,0 +1,174 @@
+"""Bytes read from the database per endpoint query, before vs. after projection.
+
+Seeds a throwaway SQLite database with one repository in the legacy layout
+(file and chunk text stored inline, i.e. a database that has not been moved to
+the blob store yet) and compares the old full-entity queries with the current
+`crud` projections. "Bytes" is the size of the column values the driver hands
+back for every statement the query emits.
+
+Run from `backend/`:
+
+    python -m benchmarks.projection_bytes [--files 2000] [--file-kb 8]
+"""
+
+import argparse
+import random
+import statistics
+import string
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, undefer
+
+from database import crud
+from database.db import Base
+from database.models import CodeChunk, CodeFile, Repository, User
+
+
+class _StatementRecorder:
+    """Collects every statement an engine executes so results can be measured."""
+
+    def __init__(self, engine) -> None:
+        self.engine = engine
+        self.statements: list[tuple[str, object]] = []
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements.append((statement, parameters))
+
+    def bytes_read(self) -> int:
+        total = 0
+        raw = self.engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            for statement, parameters in self.statements:
+                cursor.execute(statement, parameters)
+                for row in cursor.fetchall():
+                    for value in row:
+                        if value is None:
+                            continue
+                        if isinstance(value, (bytes, str)):
+                            total += len(value.encode("utf-8") if isinstance(value, str) else value)
+                        else:
+                            total += 8
+        finally:
+            raw.close()
+        return total
+
+
+def _random_source(size: int, rnd: random.Random) -> str:
+    words = ["def", "return", "class", "self", "import", "value", "items", "for", "in", "if", "else", "None"]
+    lines = []
+    length = 0
+    while length < size:
+        line = "    " + " ".join(rnd.choice(words) for _ in range(8)) + " " + "".join(rnd.choices(string.ascii_lowercase, k=12))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def _seed(engine, *, files: int, file_kb: int) -> tuple[int, list[int], list[int]]:
+    rnd = random.Random(7)
+    with Session(engine) as db:
+        user = User(email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        repo = Repository(user_id=user.id, repo_url="https://github.com/bench/bench", repo_name="bench", status="indexed")
+        db.add(repo)
+        db.flush()
+        file_rows = []
+        for i in range(files):
+            content = _random_source(file_kb * 1024, rnd)
+            file_rows.append(
+                CodeFile(repo_id=repo.id, file_path=f"src/module_{i}.py", language="python", raw_content=content)
+            )
+        db.add_all(file_rows)
+        db.flush()
+        chunk_rows = []
+        for f in file_rows:
+            text = f.raw_content
+            step = max(1, len(text) // 3)
+            for idx in range(3):
+                chunk_rows.append(
+                    CodeChunk(
+                        file_id=f.id,
+                        chunk_index=idx,
+                        chunk_content=text[max(0, idx * step - 200) : (idx + 1) * step],
+                        token_count=step // 4,
+                    )
+                )
+        db.add_all(chunk_rows)
+        db.commit()
+        return int(repo.id), [int(f.id) for f in file_rows], [int(c.id) for c in chunk_rows]
+
+
+def _measure(engine, fn: Callable[[Session], object], repeats: int) -> tuple[int, float]:
+    timings = []
+    for _ in range(repeats):
+        with Session(engine) as db:
+            start = time.perf_counter()
+            fn(db)
+            timings.append((time.perf_counter() - start) * 1000)
+    recorder = _StatementRecorder(engine)
+    with Session(engine) as db:
+        fn(db)
+    event.remove(engine, "before_cursor_execute", recorder._record)
+    return recorder.bytes_read(), statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-kb", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="codelens-bench-")
+    engine = create_engine(f"sqlite:///{Path(tmpdir) / 'bench.db'}")
+    Base.metadata.create_all(bind=engine)
+    repo_id, file_ids, chunk_ids = _seed(engine, files=args.files, file_kb=args.file_kb)
+    rnd = random.Random(11)
+    file_id = rnd.choice(file_ids)
+    top_chunk_ids = rnd.sample(chunk_ids, 8)
+
+    scenarios = [
+        (
+            "ownership check (every repo endpoint)",
+            lambda db: db.query(Repository).filter(Repository.id == repo_id).first().user_id,
+            lambda db: crud.get_repo_owner_id(db, repo_id),
+        ),
+        (
+            "GET /repos/{id}/files",
+            lambda db: [(f.id, f.file_path, f.language) for f in db.query(CodeFile).options(undefer(CodeFile.raw_content)).filter(CodeFile.repo_id == repo_id).all()],
+            lambda db: crud.list_files_by_repo(db, repo_id),
+        ),
+        (
+            "file lookup (explain/metrics/content)",
+            lambda db: db.query(CodeFile).options(undefer(CodeFile.raw_content)).filter(CodeFile.repo_id == repo_id, CodeFile.id == file_id).first(),
+            lambda db: crud.get_file_by_id(db, repo_id, file_id),
+        ),
+        (
+            "file chunk list (explain file)",
+            lambda db: db.query(CodeChunk).options(undefer(CodeChunk.chunk_content)).filter(CodeChunk.file_id == file_id).all(),
+            lambda db: crud.list_chunks_by_file(db, file_id),
+        ),
+        (
+            "retriever chunk fetch (top 8)",
+            lambda db: {c.id: c.chunk_content for c in db.query(CodeChunk).options(undefer(CodeChunk.chunk_content)).filter(CodeChunk.id.in_(top_chunk_ids)).all()},
+            lambda db: crud.get_chunk_texts_by_ids(db, top_chunk_ids),
+        ),
+    ]
+
+    print(f"{args.files} files x {args.file_kb} KB, 3 chunks/file (legacy inline layout)\n")
+    print(f"{'query':<40} {'before bytes':>14} {'after bytes':>12} {'before ms':>10} {'after ms':>9}")
+    for name, before, after in scenarios:
+        before_bytes, before_ms = _measure(engine, before, args.repeats)
+        after_bytes, after_ms = _measure(engine, after, args.repeats)
+        print(f"{name:<40} {before_bytes:>14,} {after_bytes:>12,} {before_ms:>10.2f} {after_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
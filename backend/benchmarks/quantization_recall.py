@@ -0,0 +1,86 @@
+"""Memory vs. recall@k for the FAISS index types (flat, fp16, sq8, pq).
+
+Builds one index per type through `vectorstore.faiss_index` (the ingestion
+path) over clustered synthetic vectors, then reports RAM held by the vector
+codes, the float32 file kept on disk for re-ranking, recall@k against exact
+search, and per-query latency, with and without exact re-ranking. Use it to
+choose FAISS_INDEX_TYPE / FAISS_INDEX_TYPE_BY_REPO for a repo size.
+
+Run from `backend/`:
+
+    python -m benchmarks.quantization_recall [--vectors 20000] [--dim 256] [--k 10]
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from settings import settings
+from vectorstore import faiss_index
+from vectorstore.quantization import INDEX_TYPES, index_memory_bytes
+
+
+def _dataset(vectors: int, dim: int, queries: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, vectors // 100), dim)).astype("float32")
+    data = centers[rng.integers(0, len(centers), vectors)] + 0.35 * rng.normal(size=(vectors, dim)).astype("float32")
+    picks = rng.integers(0, vectors, queries)
+    query = data[picks] + 0.1 * rng.normal(size=(queries, dim)).astype("float32")
+    return data.astype("float32"), query.astype("float32")
+
+
+def _exact_top_k(data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    norms = (data**2).sum(axis=1)
+    out = []
+    for offset in range(0, len(queries), 64):
+        block = queries[offset : offset + 64]
+        dists = norms[None, :] - 2 * block @ data.T
+        out.append(np.argsort(dists, axis=1)[:, :k])
+    return np.vstack(out) + 1  # chunk ids are row + 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    if not faiss_index._FAISS_AVAILABLE:
+        raise SystemExit("faiss is not installed")
+
+    data, queries = _dataset(args.vectors, args.dim, args.queries)
+    truth = _exact_top_k(data, queries, args.k)
+    base_dir = Path(tempfile.mkdtemp(prefix="codelens-quant-"))
+    settings.faiss_train_min_vectors = 0
+
+    print(f"vectors={args.vectors} dim={args.dim} queries={args.queries} k={args.k} pq_m={settings.faiss_pq_m}")
+    print(f"{'type':>5} {'rerank':>6} {'RAM MB':>8} {'disk MB':>8} {'recall@k':>9} {'ms/query':>9}")
+    for repo_id, index_type in enumerate(INDEX_TYPES, start=1):
+        settings.faiss_index_type_by_repo = {repo_id: index_type}
+        metadata = [{"chunk_id": i + 1, "file_path": f"f{i % 100}.py", "token_count": 1} for i in range(args.vectors)]
+        faiss_index.add_embeddings(base_dir, repo_id, data, metadata)
+        index = faiss_index.INDEXES[repo_id]
+        ram_mb = index_memory_bytes(index) / 1e6
+        raw_path = base_dir / f"repo_{repo_id}.vectors"
+        disk_mb = raw_path.stat().st_size / 1e6 if raw_path.exists() else 0.0
+
+        for factor in ([0, args.rerank_factor] if index_type != "flat" else [0]):
+            settings.faiss_rerank_factor = factor
+            started = time.perf_counter()
+            ids, _ = faiss_index.search_batch(repo_id, queries, args.k)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+            hits = sum(len(set(row) & set(expected.tolist())) for row, expected in zip(ids, truth))
+            recall = hits / (len(queries) * args.k)
+            label = f"x{factor}" if factor else "-"
+            print(f"{index_type:>5} {label:>6} {ram_mb:>8.1f} {disk_mb:>8.1f} {recall:>9.3f} {elapsed_ms:>9.2f}")
+        faiss_index.delete_index(base_dir, repo_id)
+
+
+if __name__ == "__main__":
+    main()
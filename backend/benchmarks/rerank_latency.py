@@ -0,0 +1,101 @@
+"""Re-ranking stage latency and hit rate per scorer.
+
+Builds labelled queries from this backend's own source: each function with a
+docstring gives a query (the docstring's first line) whose answer is the chunk
+holding that function. Every query gets `--candidates` candidates (the answer
+plus random other chunks) in shuffled order, standing in for a weak first
+stage. For each scorer the tool reports hit@k (answer kept in the top k) and
+per-query latency percentiles, to compare against RERANK_BUDGET_MS.
+
+The cross-encoder row needs `pip install sentence-transformers`.
+
+Run from `backend/`:
+
+    python -m benchmarks.rerank_latency [--candidates 50] [--k 4] [--queries 200]
+"""
+
+import argparse
+import ast
+import random
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from rag import reranker
+from rag.reranker import RetrievedChunk
+from settings import settings
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _dataset(lines_per_chunk: int) -> Tuple[List[RetrievedChunk], List[Tuple[str, int]]]:
+    chunks: List[RetrievedChunk] = []
+    queries: List[Tuple[str, int]] = []  # (question, answer chunk position)
+    for path in sorted(BACKEND_DIR.rglob("*.py")):
+        source = path.read_text(encoding="utf-8", errors="ignore")
+        lines = source.splitlines()
+        rel = str(path.relative_to(BACKEND_DIR))
+        first_chunk = len(chunks)
+        for start in range(0, len(lines), lines_per_chunk):
+            text = "\n".join(lines[start : start + lines_per_chunk])
+            chunks.append(RetrievedChunk(text, 1, rel, len(chunks)))
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                doc = ast.get_docstring(node)
+                if doc and len(doc.split()) >= 4:
+                    queries.append((doc.splitlines()[0], first_chunk + (node.lineno - 1) // lines_per_chunk))
+    return chunks, queries
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=50)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=40, help="lines per chunk")
+    args = parser.parse_args()
+
+    chunks, queries = _dataset(args.lines)
+    rng = random.Random(0)
+    rng.shuffle(queries)
+    queries = queries[: args.queries]
+    trials = []
+    for question, answer in queries:
+        others = rng.sample([i for i in range(len(chunks)) if i != answer], args.candidates - 1)
+        positions = others + [answer]
+        rng.shuffle(positions)
+        trials.append((question, answer, [chunks[i] for i in positions]))
+
+    scorers = ["none", "lexical"]
+    if reranker._CROSS_ENCODER_AVAILABLE:
+        scorers.append("cross-encoder")
+    print(f"chunks={len(chunks)} queries={len(trials)} candidates={args.candidates} k={args.k}")
+    print(f"{'scorer':>13} {f'hit@{args.k}':>7} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}")
+    for scorer in scorers:
+        settings.reranker = scorer
+        if scorer == "cross-encoder":
+            reranker.rerank(trials[0][0], trials[0][2], args.k)  # load the model outside the timing
+        hits = 0
+        latencies: List[float] = []
+        for question, answer, candidates in trials:
+            started = time.perf_counter()
+            top = reranker.rerank(question, candidates, args.k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += any(c.chunk_id == answer for c in top)
+        print(
+            f"{scorer:>13} {hits / len(trials):>7.3f} {_percentile(latencies, 0.5):>7.2f} "
+            f"{_percentile(latencies, 0.95):>7.2f} {max(latencies):>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
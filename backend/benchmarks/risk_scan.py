@@ -0,0 +1,194 @@
+"""Risk radar scan time on pathological files, current vs. the former regexes.
+
+The corpus is built in memory at `--size-kb` (default 512, the MAX_FILE_SIZE_KB
+limit): minified one-line code that defeats the old `.*` / `[\\s\\S]{0,2000}`
+patterns, plus long unterminated strings and whitespace runs for the patterns
+that stayed regexes. Per case it reports `ingestion.risk.scan_file` time without
+a budget and with RISK_SCAN_BUDGET_MS, and the former implementation's time at
+each `--legacy-kb` size in a subprocess killed after `--legacy-timeout`
+seconds. `--fuzz` compares both implementations on random token soup and
+exits non-zero on any difference.
+
+Run from `backend/`:
+
+    python -m benchmarks.risk_scan [--size-kb 512] [--legacy-kb 8,32,128] [--legacy-timeout 10] [--fuzz 3000]
+"""
+
+import argparse
+import multiprocessing
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+from ingestion.risk import scan_file
+from settings import settings
+
+
+def legacy_scan(raw: str) -> Dict[str, List[str]]:
+    """The per-request heuristics `risk_radar_file` ran before the ingest-time scan."""
+
+    security, perf, maintain = [], [], []
+    secret_re = re.compile(r"(api[_-]?key|secret|token|password)\s*[:=]\s*['\"][^'\"]{8,}['\"]", re.IGNORECASE)
+    type_suppress_re = re.compile(
+        r"(#\s*type:\s*ignore\b|@ts-ignore\b|@ts-expect-error\b|\bas\s+any\b|:\s*any\b|<any>\b)",
+        re.IGNORECASE,
+    )
+    if raw:
+        if secret_re.search(raw):
+            security.append("possible hardcoded secret-like value")
+        if re.search(r"\b(eval|exec)\s*\(", raw):
+            security.append("uses eval/exec")
+        if re.search(r"shell\s*=\s*True", raw):
+            security.append("uses shell=True")
+        if re.search(r"dangerouslySetInnerHTML", raw):
+            security.append("uses dangerouslySetInnerHTML")
+        if re.search(r"\bSELECT\b|\bINSERT\b|\bUPDATE\b|\bDELETE\b", raw, re.IGNORECASE) and re.search(
+            r"execute\(.*\+|f\".*(SELECT|INSERT|UPDATE|DELETE)", raw, re.IGNORECASE
+        ):
+            security.append("possible dynamic SQL construction")
+        if len(raw) > 300_000:
+            perf.append(f"very large file ({len(raw)} chars)")
+        if re.search(r"for\s*\(.*\)\s*\{[\s\S]{0,2000}for\s*\(", raw):
+            perf.append("nested loops pattern")
+        if re.search(r"\.map\(.*\.map\(", raw):
+            perf.append("nested map pattern")
+        lines = raw.splitlines()
+        if len(lines) > 1200:
+            maintain.append(f"very long file ({len(lines)} lines)")
+        if re.search(r"TODO|FIXME", raw):
+            maintain.append("contains TODO/FIXME")
+        if type_suppress_re.search(raw):
+            maintain.append("suppresses type checking")
+    return {"security": security, "performance": perf, "maintainability": maintain}
+
+
+def _fill(head: str, unit: str, size: int, tail: str = "") -> str:
+    return head + unit * max(0, (size - len(head) - len(tail)) // len(unit)) + tail
+
+
+# name -> text of about `size` characters
+CORPUS: Dict[str, Callable[[int], str]] = {
+    # One loop header, then block openings with no inner loop anywhere after:
+    # the old pattern tried a 2000-character window at every `){`.
+    "loop_openings": lambda n: _fill("for(i=0;i<n;i++){", "a(x){", n),
+    # Many headers on the line, block openings only far away.
+    "loop_headers": lambda n: _fill("", "for(x;", n // 2) + _fill("", "y){", n // 2),
+    "map_one_line": lambda n: _fill("a.map(f)", "x.ma(", n),
+    "execute_no_plus": lambda n: _fill("SELECT 1;\n", "db.execute(q);", n),
+    "fstring_no_sql": lambda n: _fill("SELECT 1;\n", 'f"x";', n),
+    "unterminated_secret": lambda n: _fill('token = "', "a", n),
+    "whitespace_runs": lambda n: _fill("eval", " ", n // 2, "x\n") + _fill("#", " ", n // 2, "x"),
+    "minified_bundle": lambda n: _minified(n),
+}
+
+
+def _minified(size: int) -> str:
+    rng = random.Random(7)
+    parts = [
+        "function(e,t){",
+        "for(var n=0;n<e.length;n++)",
+        "e.map(function(r){return r*2})",
+        "if(t){",
+        "return t}",
+        "var a=b+c;",
+        "})",
+        'x.execute("q")',
+        'f"y"',
+        "SELECT",
+    ]
+    out = []
+    total = 0
+    while total < size:
+        part = rng.choice(parts)
+        out.append(part)
+        total += len(part)
+    return "".join(out)
+
+
+def _legacy_worker(text: str, queue) -> None:
+    started = time.perf_counter()
+    legacy_scan(text)
+    queue.put((time.perf_counter() - started) * 1000)
+
+
+def _legacy_ms(text: str, timeout: float) -> str:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_legacy_worker, args=(text, queue))
+    proc.start()
+    proc.join(timeout)
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+        return f">{timeout:g}s"
+    return f"{queue.get():.1f}"
+
+
+def _timed(text: str, budget_ms: float) -> tuple[float, Dict[str, List[str]]]:
+    started = time.perf_counter()
+    findings = scan_file(text, budget_ms=budget_ms)
+    return (time.perf_counter() - started) * 1000, findings
+
+
+def _fuzz(samples: int) -> int:
+    rng = random.Random(11)
+    tokens = [
+        "for", "for (", "for(", "(", ")", ") {", "){", "{", "}", " ", "\n", "\t", ".map(", "map(", "x",
+        "execute(", "EXECUTE(", "+", 'f"', 'F"', "select", "SELECT", " DELETE ", "token=", '"', "'",
+        "secret: 'abcdefghij'", "eval (", "shell = True", "TODO", "# type: ignore", " as any", ": any", "<any>",
+    ]
+    mismatches = 0
+    for i in range(samples):
+        text = "".join(rng.choice(tokens) for _ in range(rng.randrange(1, 400)))
+        if i % 5 == 0:
+            # Push some loop pairs past the 2000-character window.
+            text = text.replace("{", "{" + " " * rng.randrange(1900, 2100), 1)
+        expected = legacy_scan(text)
+        got = scan_file(text, budget_ms=0)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 3:
+                print(f"mismatch: {text[:120]!r}... expected {expected} got {got}")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--legacy-kb", default="8,32,128", help="sizes to run the former regexes at ('' skips)")
+    parser.add_argument("--legacy-timeout", type=float, default=10.0)
+    parser.add_argument("--fuzz", type=int, default=3000, help="random texts to compare both implementations on")
+    args = parser.parse_args()
+
+    legacy_sizes = [int(s) for s in args.legacy_kb.split(",") if s.strip()]
+    budget = settings.risk_scan_budget_ms
+    print(
+        f"{'case':>20} {'new ms':>8} {f'budget {budget}':>11} {'same':>5}  "
+        + " ".join(f"{f'old {kb}KB':>10}" for kb in legacy_sizes)
+    )
+    worst = 0.0
+    for name, build in CORPUS.items():
+        text = build(args.size_kb * 1024)
+        unlimited_ms, findings = _timed(text, 0)
+        budget_ms, _ = _timed(text, budget)
+        worst = max(worst, unlimited_ms)
+        small = build(8 * 1024)
+        same = "yes" if scan_file(small, budget_ms=0) == legacy_scan(small) else "NO"
+        legacy = [_legacy_ms(build(kb * 1024), args.legacy_timeout) for kb in legacy_sizes]
+        print(
+            f"{name:>20} {unlimited_ms:>8.1f} {budget_ms:>11.1f} {same:>5}  " + " ".join(f"{ms:>10}" for ms in legacy)
+        )
+        print(f"{'':>20} {sum(len(v) for v in findings.values())} finding(s) at {args.size_kb}KB: {findings}")
+    print(f"worst current scan: {worst:.1f} ms at {args.size_kb}KB")
+
+    if args.fuzz:
+        mismatches = _fuzz(args.fuzz)
+        print(f"fuzz: {mismatches} mismatch(es) in {args.fuzz} random texts")
+        if mismatches:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
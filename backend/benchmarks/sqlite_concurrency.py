@@ -0,0 +1,148 @@
+"""Concurrent read/write throughput on SQLite: default engine vs. tuned profile.
+
+Writer threads mimic ingestion batch commits and chat-message inserts; reader
+threads run the API's read queries. "default" is a bare `create_engine` (the
+previous `init_db`), "tuned" is `database.db.create_db_engine` with WAL,
+synchronous=NORMAL, busy_timeout, cache/mmap pragmas and a separate
+query_only read pool.
+
+Run from `backend/`:
+
+    python -m benchmarks.sqlite_concurrency [--writers 4] [--readers 8] [--seconds 10]
+"""
+
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import crud
+from database.db import Base, create_db_engine
+from database.models import ChatMessage, CodeChunk, CodeFile, Repository, User
+
+
+def _seed(session_factory) -> tuple[int, int, int]:
+    with session_factory() as db:
+        user = User(email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        repo = Repository(user_id=user.id, repo_url="https://github.com/bench/bench", repo_name="bench", status="indexed")
+        db.add(repo)
+        db.flush()
+        files = [CodeFile(repo_id=repo.id, file_path=f"src/f{i}.py", language="python", raw_content="") for i in range(500)]
+        db.add_all(files)
+        db.commit()
+        return int(user.id), int(repo.id), int(files[0].id)
+
+
+def _run(label: str, write_factory, read_factory, *, writers: int, readers: int, seconds: float) -> None:
+    user_id, repo_id, file_id = _seed(write_factory)
+    stop = threading.Event()
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def _bump(key: str) -> None:
+        with lock:
+            counts[key] += 1
+
+    def writer(index: int) -> None:
+        n = 0
+        while not stop.is_set():
+            db = write_factory()
+            try:
+                if n % 2:
+                    db.add(
+                        ChatMessage(
+                            user_id=user_id,
+                            repo_id=repo_id,
+                            question=f"q{index}-{n}",
+                            question_normalized=f"q{index}-{n}",
+                            answer="a" * 500,
+                        )
+                    )
+                else:
+                    db.add_all(
+                        [
+                            CodeChunk(file_id=file_id, chunk_index=i, chunk_content="x" * 400, token_count=100)
+                            for i in range(50)
+                        ]
+                    )
+                db.commit()
+                _bump("writes")
+            except OperationalError:
+                db.rollback()
+                _bump("locked")
+            finally:
+                db.close()
+            n += 1
+
+    def reader(index: int) -> None:
+        n = 0
+        while not stop.is_set():
+            db = read_factory()
+            try:
+                if n % 3 == 0:
+                    crud.list_files_by_repo(db, repo_id)
+                elif n % 3 == 1:
+                    crud.get_dashboard_overview(db, user_id)
+                else:
+                    crud.list_chat_messages_by_repo(db, user_id=user_id, repo_id=repo_id, limit=50)
+                _bump("reads")
+            except OperationalError:
+                _bump("locked")
+            finally:
+                db.close()
+            n += 1
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<8} writes/s={counts['writes'] / elapsed:>8.1f} reads/s={counts['reads'] / elapsed:>8.1f} "
+        f"locked_errors={counts['locked']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    tmpdir = Path(tempfile.mkdtemp(prefix="codelens-bench-"))
+
+    default_url = f"sqlite:///{tmpdir / 'default.db'}"
+    default_engine = create_engine(default_url, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=default_engine)
+    default_sessions = sessionmaker(bind=default_engine, autoflush=False)
+    _run("default", default_sessions, default_sessions, writers=args.writers, readers=args.readers, seconds=args.seconds)
+
+    tuned_url = f"sqlite:///{tmpdir / 'tuned.db'}"
+    tuned_engine = create_db_engine(tuned_url)
+    Base.metadata.create_all(bind=tuned_engine)
+    read_engine = create_db_engine(tuned_url, read_only=True)
+    _run(
+        "tuned",
+        sessionmaker(bind=tuned_engine, autoflush=False),
+        sessionmaker(bind=read_engine, autoflush=False),
+        writers=args.writers,
+        readers=args.readers,
+        seconds=args.seconds,
+    )
+
+
+if __name__ == "__main__":
+    main()
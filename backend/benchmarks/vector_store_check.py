@@ -0,0 +1,89 @@
+"""End-to-end check of the configured vector store (FAISS or pgvector).
+
+Loads random vectors for two repos, then verifies self-retrieval, file-path
+filtering, repo isolation, resume bookkeeping and deletion, and reports add and
+search latency. For pgvector, point it at a local Postgres with the `vector`
+extension:
+
+    VECTOR_STORE=pgvector PGVECTOR_DATABASE_URL=postgresql://localhost/codelens \
+        python -m benchmarks.vector_store_check
+
+Uses repo ids far above real ones and deletes them afterwards.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import settings as settings_module
+from settings import settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if (settings.vector_store or "faiss").strip().lower() == "faiss":
+        # Keep FAISS files out of the real data directory.
+        settings_module.DATA_DIR = Path(tempfile.mkdtemp(prefix="codelens-vec-"))
+
+    from vectorstore.base import get_vector_store
+
+    store = get_vector_store()
+    if not store.available:
+        raise SystemExit(f"{store.name} vector store is not available in this environment")
+    store.load()
+
+    rng = np.random.default_rng(5)
+    repo_a, repo_b = 900_000_001, 900_000_002
+    vectors = rng.standard_normal((args.vectors, args.dim)).astype("float32")
+    metadata = [
+        {"chunk_id": 900_000_000 + i, "file_path": f"src/file_{i % 50}.py", "token_count": 100}
+        for i in range(args.vectors)
+    ]
+    half = args.vectors // 2
+    for repo_id in (repo_a, repo_b):
+        store.delete_repo(repo_id)
+
+    try:
+        start = time.perf_counter()
+        store.add(repo_a, vectors[:half].tolist(), metadata[:half])
+        store.add(repo_b, vectors[half:].tolist(), metadata[half:])
+        add_ms = (time.perf_counter() - start) * 1000
+
+        latencies = []
+        self_hits = 0
+        for i in rng.choice(half, size=min(args.queries, half), replace=False):
+            start = time.perf_counter()
+            hits = store.search(repo_a, vectors[i].tolist(), 5)
+            latencies.append((time.perf_counter() - start) * 1000)
+            self_hits += int(bool(hits) and hits[0].chunk_id == metadata[i]["chunk_id"])
+            assert all(h.chunk_id < 900_000_000 + half for h in hits), "search leaked vectors from another repo"
+
+        filtered = store.search(repo_a, vectors[0].tolist(), 5, file_paths=["src/file_7.py"])
+        assert filtered and all(h.file_path == "src/file_7.py" for h in filtered), "file filter not applied"
+        assert len(store.indexed_chunk_ids(repo_a)) == half, "indexed_chunk_ids mismatch"
+
+        print(f"store={store.name} vectors={args.vectors} dim={args.dim}")
+        print(f"add_ms={add_ms:.0f} ({args.vectors / max(add_ms / 1000, 1e-9):.0f} vectors/s)")
+        print(
+            f"search p50={statistics.median(latencies):.2f}ms "
+            f"p95={sorted(latencies)[int(len(latencies) * 0.95) - 1]:.2f}ms "
+            f"self_recall@1={self_hits / len(latencies):.3f}"
+        )
+    finally:
+        for repo_id in (repo_a, repo_b):
+            store.delete_repo(repo_id)
+    assert not store.indexed_chunk_ids(repo_a), "delete_repo left vectors behind"
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,8 @@ from auth.routes import router as auth_router
 from ingestion.repo_loader import router as repo_router
 from rag.pipeline import router as rag_router
 from database.db import init_db
-from vectorstore.faiss_index import load_indexes_from_disk
+from ingestion.worker import start_embedded_workers, stop_embedded_workers
+from vectorstore.base import get_vector_store
 
 
 def build_app() -> FastAPI:
@@ -66,6 +67,11 @@ def build_app() -> FastAPI:
     def on_startup() -> None:
         init_db(settings.database_url)
         DATA_DIR.mkdir(parents=True, exist_ok=True)
-        load_indexes_from_disk(DATA_DIR)
+        get_vector_store().load()
+        start_embedded_workers()
+
+    @app.on_event("shutdown")
+    def on_shutdown() -> None:
+        stop_embedded_workers()
 
     return app
@@ -0,0 +1,249 @@
+"""Content-addressed blob store for file contents.
+
+File text lives on disk under `DATA_DIR/blobs/<aa>/<bb>/<sha256>.zst` instead of
+in SQLite rows. Blobs are keyed by the SHA-256 of the UTF-8 text, so the same
+file in several repos/branches is stored once. Chunks reference their file's
+blob by character offsets.
+
+zstd is used when the optional `zstandard` package is installed; otherwise
+blobs are zlib-compressed (`.z`). Both formats are readable either way as long
+as the matching codec is available.
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+try:
+    import zstandard  # type: ignore
+    _ZSTD_AVAILABLE = True
+except Exception:  # pragma: no cover
+    zstandard = None  # type: ignore
+    _ZSTD_AVAILABLE = False
+
+from settings import DATA_DIR, settings
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = DATA_DIR / "blobs"
+
+# Blobs touched more recently than this are never garbage-collected, so a
+# concurrent ingest that deduplicated against a blob (but has not committed its
+# rows yet) cannot lose it. The worker's periodic sweep removes them later.
+_GC_GRACE_SECONDS = 3600
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 hex digest of the UTF-8 encoded text."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def _blob_path(digest: str, suffix: str) -> Path:
+    return BLOB_DIR / digest[:2] / digest[2:4] / f"{digest}{suffix}"
+
+
+def _existing_path(digest: str) -> Optional[Path]:
+    for suffix in (".zst", ".z"):
+        path = _blob_path(digest, suffix)
+        if path.exists():
+            return path
+    return None
+
+
+def _compress(data: bytes) -> Tuple[bytes, str]:
+    if _ZSTD_AVAILABLE:
+        level = int(settings.blob_zstd_level)
+        return zstandard.ZstdCompressor(level=level).compress(data), ".zst"
+    return zlib.compress(data, 6), ".z"
+
+
+def _decompress(path: Path) -> bytes:
+    raw = path.read_bytes()
+    if path.suffix == ".zst":
+        if not _ZSTD_AVAILABLE:
+            raise RuntimeError("zstandard is required to read .zst blobs (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompress(raw)
+    return zlib.decompress(raw)
+
+
+def _cache_put(digest: str, text: str) -> None:
+    global _cache_bytes
+    limit = max(0, int(settings.blob_cache_mb)) * 1024 * 1024
+    size = len(text)
+    if size > limit:
+        return
+    with _cache_lock:
+        if digest in _cache:
+            _cache.move_to_end(digest)
+            return
+        _cache[digest] = text
+        _cache_bytes += size
+        while _cache_bytes > limit and _cache:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+
+def put_text(text: str) -> Tuple[str, int]:
+    """Store text (deduplicated by hash) and return (content_hash, utf-8 size)."""
+
+    data = (text or "").encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    existing = _existing_path(digest)
+    if existing is not None:
+        # Refresh mtime so garbage collection treats the blob as live.
+        try:
+            os.utime(existing, None)
+        except OSError:
+            pass
+        return digest, len(data)
+
+    payload, suffix = _compress(data)
+    path = _blob_path(digest, suffix)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_bytes(payload)
+    os.replace(tmp_path, path)
+    return digest, len(data)
+
+
+def read_text(digest: str) -> str:
+    """Return the text for a content hash (LRU-cached, bounded by BLOB_CACHE_MB)."""
+
+    with _cache_lock:
+        cached = _cache.get(digest)
+        if cached is not None:
+            _cache.move_to_end(digest)
+            return cached
+
+    path = _existing_path(digest)
+    if path is None:
+        raise FileNotFoundError(f"Blob not found: {digest}")
+    text = _decompress(path).decode("utf-8")
+    _cache_put(digest, text)
+    return text
+
+
+def read_slice(digest: str, start: int, end: int) -> str:
+    """Return text[start:end] for a blob (character offsets)."""
+    return read_text(digest)[int(start) : int(end)]
+
+
+def delete_blobs(digests: Iterable[str]) -> int:
+    """Delete blobs that are no longer referenced; returns the number removed."""
+
+    global _cache_bytes
+    removed = 0
+    cutoff = time.time() - _GC_GRACE_SECONDS
+    for digest in set(digests):
+        path = _existing_path(digest)
+        if path is None:
+            continue
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+            path.unlink()
+            removed += 1
+        except OSError:
+            logger.warning("Failed to delete blob %s", digest)
+        with _cache_lock:
+            evicted = _cache.pop(digest, None)
+            if evicted is not None:
+                _cache_bytes -= len(evicted)
+    return removed
+
+
+def sweep_unreferenced(referenced: Iterable[str]) -> int:
+    """Delete every stored blob not in `referenced` (subject to the grace period).
+
+    Catches blobs whose targeted deletion was skipped because they were still
+    within the grace period when their repository was deleted.
+    """
+
+    if not BLOB_DIR.exists():
+        return 0
+    live = set(referenced)
+    orphans = []
+    for path in BLOB_DIR.glob("*/*/*"):
+        if path.name.startswith("."):
+            continue
+        digest = path.name.split(".", 1)[0]
+        if digest not in live:
+            orphans.append(digest)
+    return delete_blobs(orphans)
+
+
+def migrate_inline_content(database_url: str, *, batch_size: int = 200) -> Tuple[int, int]:
+    """Move legacy inline `raw_content`/`chunk_content` into blobs + offsets.
+
+    Returns (files_migrated, chunks_migrated). Chunks are located in their file
+    text by search from the previous chunk's start (chunks overlap), falling
+    back to keeping the inline copy when the text cannot be found.
+    """
+
+    from sqlalchemy import create_engine, text as sql_text
+
+    engine = create_engine(database_url)
+    files_migrated = 0
+    chunks_migrated = 0
+    with engine.connect() as conn:
+        while True:
+            rows = conn.execute(
+                sql_text(
+                    "SELECT id, raw_content FROM code_files "
+                    "WHERE content_hash IS NULL AND raw_content IS NOT NULL AND raw_content != '' LIMIT :n"
+                ),
+                {"n": batch_size},
+            ).all()
+            if not rows:
+                break
+            for file_id, raw in rows:
+                digest, size = put_text(raw)
+                chunks = conn.execute(
+                    sql_text("SELECT id, chunk_content FROM code_chunks WHERE file_id = :f ORDER BY chunk_index"),
+                    {"f": file_id},
+                ).all()
+                cursor = 0
+                for chunk_id, chunk_content in chunks:
+                    pos = raw.find(chunk_content or "", cursor)
+                    if pos < 0 or not chunk_content:
+                        continue
+                    conn.execute(
+                        sql_text(
+                            "UPDATE code_chunks SET start_offset = :s, end_offset = :e, chunk_content = '' WHERE id = :id"
+                        ),
+                        {"s": pos, "e": pos + len(chunk_content), "id": chunk_id},
+                    )
+                    cursor = pos
+                    chunks_migrated += 1
+                conn.execute(
+                    sql_text(
+                        "UPDATE code_files SET content_hash = :h, content_size = :n, raw_content = '' WHERE id = :id"
+                    ),
+                    {"h": digest, "n": size, "id": file_id},
+                )
+                files_migrated += 1
+            conn.commit()
+    if database_url.startswith("sqlite"):
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+    return files_migrated, chunks_migrated
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m database.blob_store migrate
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        files, chunks = migrate_inline_content(settings.database_url)
+        print(f"Migrated {files} files and {chunks} chunks to {BLOB_DIR}")
+    else:
+        print("Usage: python -m database.blob_store migrate")
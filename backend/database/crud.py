@@ -1,12 +1,25 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import re
-from typing import Iterable, List, Optional, Sequence
-
-from sqlalchemy import func, or_
-from sqlalchemy.orm import Session
-
-from .models import ChatMessage, CodeChunk, CodeFile, Repository, User
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import exists, func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased, load_only
+
+from . import blob_store
+from .models import (
+    ChatMessage,
+    CodeChunk,
+    CodeFile,
+    CodeSymbol,
+    FileExplanation,
+    FileRisk,
+    IngestionJob,
+    Repository,
+    SymbolReference,
+    User,
+)
 
 
 def normalize_question(question: str, *, explain_level: str | None = None) -> str:
@@ -97,6 +110,124 @@ def list_chat_messages_by_repo(
     return list(rows or [])
 
 
+def get_file_explanation(
+    db: Session,
+    repo_id: int,
+    file_path: str,
+    content_hash: str,
+    *,
+    endpoint: str,
+    level: str,
+    start_line: int,
+    end_line: int,
+    model: str,
+    count_hit: bool = True,
+) -> Optional[tuple[str, List[int]]]:
+    """Return (explanation, referenced_chunks) cached for this exact key and count the hit."""
+
+    row = (
+        db.query(FileExplanation.id, FileExplanation.explanation, FileExplanation.referenced_chunks_json)
+        .filter(
+            FileExplanation.repo_id == repo_id,
+            FileExplanation.file_path == file_path,
+            FileExplanation.content_hash == content_hash,
+            FileExplanation.endpoint == endpoint,
+            FileExplanation.level == level,
+            FileExplanation.start_line == int(start_line),
+            FileExplanation.end_line == int(end_line),
+            FileExplanation.model == model,
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    entry_id, explanation, referenced_json = row
+    if not count_hit:
+        return explanation, json.loads(referenced_json or "[]")
+    db.query(FileExplanation).filter(FileExplanation.id == entry_id).update(
+        {FileExplanation.hits: FileExplanation.hits + 1}, synchronize_session=False
+    )
+    db.commit()
+    return explanation, json.loads(referenced_json or "[]")
+
+
+def save_file_explanation(
+    db: Session,
+    repo_id: int,
+    file_path: str,
+    content_hash: str,
+    *,
+    endpoint: str,
+    level: str,
+    start_line: int,
+    end_line: int,
+    model: str,
+    explanation: str,
+    referenced_chunks: List[int],
+    hits: int = 1,
+) -> None:
+    """Store an explanation; a concurrent request that stored the same key first wins."""
+
+    db.add(
+        FileExplanation(
+            repo_id=repo_id,
+            file_path=file_path,
+            content_hash=content_hash,
+            endpoint=endpoint,
+            level=level,
+            start_line=int(start_line),
+            end_line=int(end_line),
+            model=model,
+            explanation=explanation,
+            referenced_chunks_json=json.dumps([int(i) for i in referenced_chunks or []]),
+            hits=int(hits),
+        )
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
+
+def list_top_file_explanations(db: Session, repo_id: int, limit: int) -> List[tuple[str, str, int]]:
+    """(file_path, level, hits) of whole-file explanations, hits summed across all versions, most first."""
+
+    if limit <= 0:
+        return []
+    total = func.sum(FileExplanation.hits)
+    rows = (
+        db.query(FileExplanation.file_path, FileExplanation.level, total)
+        .filter(FileExplanation.repo_id == repo_id, FileExplanation.endpoint == "explain")
+        .group_by(FileExplanation.file_path, FileExplanation.level)
+        .order_by(total.desc(), FileExplanation.file_path)
+        .limit(int(limit))
+        .all()
+    )
+    return [(path, level, int(hits or 0)) for path, level, hits in rows]
+
+
+def prune_file_explanations(db: Session, repo_id: int) -> int:
+    """Delete cached explanations whose file was removed or changed; returns the count."""
+
+    current = exists().where(
+        CodeFile.repo_id == FileExplanation.repo_id,
+        CodeFile.file_path == FileExplanation.file_path,
+        CodeFile.content_hash == FileExplanation.content_hash,
+    )
+    removed = (
+        db.query(FileExplanation)
+        .filter(FileExplanation.repo_id == repo_id, ~current)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return int(removed or 0)
+
+
+def delete_file_explanations_by_repo(db: Session, repo_id: int) -> None:
+    """Delete a repository's cached explanations without committing."""
+    db.query(FileExplanation).filter(FileExplanation.repo_id == repo_id).delete(synchronize_session=False)
+
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """Fetch a user by email."""
     return db.query(User).filter(User.email == email).first()
@@ -127,13 +258,83 @@ def update_user_profile_image(db: Session, user_id: int, profile_image_url: str)
 
 
 def list_repos_by_user(db: Session, user_id: int) -> List[Repository]:
-    """List repositories for a user."""
-    return db.query(Repository).filter(Repository.user_id == user_id).all()
+    """List repositories for a user (counters are on the row, so this is one query)."""
+    return db.query(Repository).filter(Repository.user_id == user_id).order_by(Repository.id.asc()).all()
 
 
-def count_files_by_repo(db: Session, repo_id: int) -> int:
-    """Count files in a repository."""
-    return int(db.query(func.count(CodeFile.id)).filter(CodeFile.repo_id == repo_id).scalar() or 0)
+def parse_repo_languages(repo: Repository) -> dict[str, int]:
+    """Decode the denormalized language histogram stored on a repository row."""
+    try:
+        data = json.loads(repo.languages_json or "{}")
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k): int(v or 0) for k, v in data.items()}
+
+
+def recompute_repo_counters(
+    db: Session,
+    repo_id: int,
+    *,
+    status: Optional[str] = None,
+    ingestion_time_ms: Optional[int] = None,
+) -> Optional[Repository]:
+    """Refresh repository counters from the per-file counters and commit.
+
+    Aggregates over `code_files` only (indexed by repo_id); per-file chunk
+    counters are written at ingest time so chunk rows are never scanned here.
+    """
+
+    repo = db.query(Repository).filter(Repository.id == repo_id).first()
+    if not repo:
+        return None
+
+    file_count, chunk_count, total_tokens = (
+        db.query(
+            func.count(CodeFile.id),
+            func.coalesce(func.sum(CodeFile.chunk_count), 0),
+            func.coalesce(func.sum(CodeFile.total_tokens), 0),
+        )
+        .filter(CodeFile.repo_id == repo_id)
+        .one()
+    )
+    languages: dict[str, int] = {}
+    for lang, count in (
+        db.query(CodeFile.language, func.count(CodeFile.id))
+        .filter(CodeFile.repo_id == repo_id)
+        .group_by(CodeFile.language)
+        .all()
+    ):
+        key = (lang or "unknown").strip() or "unknown"
+        languages[key] = languages.get(key, 0) + int(count or 0)
+
+    repo.file_count = int(file_count or 0)
+    repo.chunk_count = int(chunk_count or 0)
+    repo.total_tokens = int(total_tokens or 0)
+    repo.languages_json = json.dumps(languages)
+    if status is not None:
+        repo.status = status
+    if ingestion_time_ms is not None:
+        repo.ingestion_time_ms = int(ingestion_time_ms)
+    db.commit()
+    db.refresh(repo)
+    return repo
+
+
+def reset_repo_counters(db: Session, repo_id: int, *, status: str = "processing") -> None:
+    """Zero repository counters (used before re-ingestion) without committing."""
+    db.query(Repository).filter(Repository.id == repo_id).update(
+        {
+            Repository.status: status,
+            Repository.file_count: 0,
+            Repository.chunk_count: 0,
+            Repository.total_tokens: 0,
+            Repository.languages_json: "{}",
+            Repository.ingestion_time_ms: 0,
+        },
+        synchronize_session=False,
+    )
 
 
 def get_repo_by_id(db: Session, repo_id: int, user_id: int) -> Optional[Repository]:
@@ -150,6 +351,39 @@ def get_repo_by_id_any(db: Session, repo_id: int) -> Optional[Repository]:
     return db.query(Repository).filter(Repository.id == repo_id).first()
 
 
+def get_repo_owner_id(db: Session, repo_id: int) -> Optional[int]:
+    """Return the owning user id of a repository (None if missing).
+
+    Used for per-request ownership checks instead of loading the whole row.
+    The (id, user_id) index makes this an index-only scan on Postgres; SQLite
+    answers it with a single rowid probe.
+    """
+    owner_id = db.query(Repository.user_id).filter(Repository.id == repo_id).scalar()
+    return int(owner_id) if owner_id is not None else None
+
+
+def get_repo_owner_ids(db: Session, repo_ids: Sequence[int]) -> dict[int, int]:
+    """Return {repo_id: user_id} for the repositories that exist (one query)."""
+    if not repo_ids:
+        return {}
+    rows = db.query(Repository.id, Repository.user_id).filter(Repository.id.in_(list(repo_ids))).all()
+    return {int(repo_id): int(user_id) for repo_id, user_id in rows}
+
+
+def list_repo_ids_by_user(db: Session, user_id: int) -> List[int]:
+    """Return the ids of a user's repositories, oldest first."""
+    rows = db.query(Repository.id).filter(Repository.user_id == user_id).order_by(Repository.id.asc()).all()
+    return [int(row[0]) for row in rows]
+
+
+def get_repo_names(db: Session, repo_ids: Sequence[int]) -> dict[int, str]:
+    """Return {repo_id: repo_name} for the given repositories."""
+    if not repo_ids:
+        return {}
+    rows = db.query(Repository.id, Repository.repo_name).filter(Repository.id.in_(list(repo_ids))).all()
+    return {int(repo_id): str(name) for repo_id, name in rows}
+
+
 def create_repo(db: Session, user_id: int, repo_url: str, repo_name: str) -> Repository:
     """Create a repository record."""
     repo = Repository(user_id=user_id, repo_url=repo_url, repo_name=repo_name)
@@ -164,17 +398,23 @@ def delete_repo(db: Session, repo_id: int) -> None:
     repo = db.query(Repository).filter(Repository.id == repo_id).first()
     if not repo:
         return
+    delete_symbols_by_repo(db, repo_id)
+    delete_file_risks_by_repo(db, repo_id)
+    delete_file_explanations_by_repo(db, repo_id)
     db.delete(repo)
     db.commit()
 
 
 def create_code_file(db: Session, repo_id: int, file_path: str, language: str, raw_content: str) -> CodeFile:
-    """Persist a code file for a repository."""
+    """Persist a code file for a repository (content goes to the blob store)."""
+    digest, size = blob_store.put_text(raw_content)
     code_file = CodeFile(
         repo_id=repo_id,
         file_path=file_path,
         language=language,
-        raw_content=raw_content,
+        raw_content="",
+        content_hash=digest,
+        content_size=size,
     )
     db.add(code_file)
     db.commit()
@@ -202,10 +442,44 @@ def create_code_chunk(
     return chunk
 
 
-def list_files_by_repo(db: Session, repo_id: int) -> List[CodeFile]:
-    """List code files for a repository."""
+# Columns needed to locate and describe a file; content is read from the blob store.
+_FILE_META_COLUMNS = (
+    CodeFile.id,
+    CodeFile.repo_id,
+    CodeFile.file_path,
+    CodeFile.language,
+    CodeFile.content_hash,
+    CodeFile.content_size,
+)
+
+
+def bulk_insert_chunks(db: Session, rows: List[dict]) -> List[int]:
+    """Insert chunk rows with Core executemany and return their ids in input order.
+
+    On SQLite ids are pre-allocated as one contiguous range after MAX(id); the
+    caller must already have written in the current transaction (ingestion
+    inserts the batch's files first), so the write lock is held and no other
+    writer can take the same range. Other backends use INSERT ... RETURNING.
+    The caller commits.
+    """
+
+    if not rows:
+        return []
+    table = CodeChunk.__table__
+    if db.get_bind().dialect.name == "sqlite":
+        start = int(db.query(func.coalesce(func.max(CodeChunk.id), 0)).scalar() or 0) + 1
+        ids = list(range(start, start + len(rows)))
+        db.execute(insert(table), [dict(row, id=chunk_id) for row, chunk_id in zip(rows, ids)])
+        return ids
+
+    result = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+    return [int(row[0]) for row in result]
+
+
+def list_files_by_repo(db: Session, repo_id: int) -> List[tuple[int, str, Optional[str]]]:
+    """List (id, file_path, language) rows for a repository's file tree."""
     return (
-        db.query(CodeFile)
+        db.query(CodeFile.id, CodeFile.file_path, CodeFile.language)
         .filter(CodeFile.repo_id == repo_id)
         .order_by(CodeFile.id.asc())
         .all()
@@ -213,9 +487,10 @@ def list_files_by_repo(db: Session, repo_id: int) -> List[CodeFile]:
 
 
 def get_file_by_id(db: Session, repo_id: int, file_id: int) -> Optional[CodeFile]:
-    """Fetch a code file by id within a repository."""
+    """Fetch a code file by id within a repository (metadata only; see `get_file_text`)."""
     return (
         db.query(CodeFile)
+        .options(load_only(*_FILE_META_COLUMNS))
         .filter(CodeFile.repo_id == repo_id, CodeFile.id == file_id)
         .first()
     )
@@ -228,66 +503,144 @@ def get_files_by_paths(db: Session, repo_id: int, file_paths: List[str]) -> List
     if not paths:
         return []
 
-    # Keep deterministic ordering: return rows in file id order.
+    # Keep deterministic ordering: return rows in file id order. Sorting the few
+    # matches here lets SQLite use the (repo_id, file_path) index for the lookup.
     rows = (
         db.query(CodeFile)
+        .options(load_only(*_FILE_META_COLUMNS))
         .filter(CodeFile.repo_id == repo_id, CodeFile.file_path.in_(paths))
-        .order_by(CodeFile.id.asc())
         .all()
     )
-    return list(rows or [])
+    return sorted(rows or [], key=lambda row: row.id)
 
 
-def list_chunks_by_file(db: Session, file_id: int) -> List[CodeChunk]:
-    """List chunks for a specific file, ordered by chunk_index."""
-    return db.query(CodeChunk).filter(CodeChunk.file_id == file_id).order_by(CodeChunk.chunk_index.asc()).all()
-
+def get_file_metrics(db: Session, repo_id: int, file_id: int) -> Optional[tuple[int, int, int]]:
+    """Return (line_count, chunk_count, avg_chunk_tokens) for a file without loading its content."""
+    row = (
+        db.query(CodeFile.line_count, CodeFile.chunk_count, CodeFile.avg_chunk_tokens)
+        .filter(CodeFile.repo_id == repo_id, CodeFile.id == file_id)
+        .first()
+    )
+    if row is None:
+        return None
+    return int(row[0] or 0), int(row[1] or 0), int(row[2] or 0)
 
-def count_chunks_by_file(db: Session, file_id: int) -> int:
-    """Count chunks for a specific file."""
-    return int(db.query(func.count(CodeChunk.id)).filter(CodeChunk.file_id == file_id).scalar() or 0)
 
+class FileSummaryRow(NamedTuple):
+    file_id: int
+    file_path: str
+    language: Optional[str]
+    summary: Optional[str]  # None for files ingested before summaries existed
 
-def avg_chunk_size_by_file(db: Session, file_id: int) -> int:
-    """Average chunk token count for a specific file."""
-    avg_val = db.query(func.avg(CodeChunk.token_count)).filter(CodeChunk.file_id == file_id).scalar()
-    return int(avg_val or 0)
 
+def get_file_summaries(db: Session, repo_id: int, file_paths: List[str]) -> dict[str, FileSummaryRow]:
+    """Return {file_path: FileSummaryRow} without loading file content."""
 
-def get_repo_analytics(db: Session, repo_id: int) -> dict:
-    """Deterministic per-repo analytics (no AI)."""
-    file_count = int(db.query(func.count(CodeFile.id)).filter(CodeFile.repo_id == repo_id).scalar() or 0)
-    chunk_count = (
-        db.query(func.count(CodeChunk.id))
-        .join(CodeFile, CodeChunk.file_id == CodeFile.id)
-        .filter(CodeFile.repo_id == repo_id)
-        .scalar()
-        or 0
-    )
-    avg_chunk = (
-        db.query(func.avg(CodeChunk.token_count))
-        .join(CodeFile, CodeChunk.file_id == CodeFile.id)
-        .filter(CodeFile.repo_id == repo_id)
-        .scalar()
-        or 0
+    paths = [p for p in (file_paths or []) if (p or "").strip()]
+    if not paths:
+        return {}
+    rows = (
+        db.query(CodeFile.id, CodeFile.file_path, CodeFile.language, CodeFile.summary)
+        .filter(CodeFile.repo_id == repo_id, CodeFile.file_path.in_(paths))
+        .all()
     )
+    return {path: FileSummaryRow(int(file_id), path, language, summary) for file_id, path, language, summary in rows}
 
-    lang_rows = (
-        db.query(CodeFile.language, func.count(CodeFile.id))
-        .filter(CodeFile.repo_id == repo_id)
-        .group_by(CodeFile.language)
+
+def set_file_summaries(db: Session, summaries: dict[int, str]) -> None:
+    """Store summaries by file id (backfill for rows ingested before 0009)."""
+    if not summaries:
+        return
+    db.bulk_update_mappings(CodeFile, [{"id": file_id, "summary": text} for file_id, text in summaries.items()])
+    db.commit()
+
+
+def get_file_text(code_file: CodeFile) -> str:
+    """Return a file's text from the blob store (or the legacy inline column)."""
+    if code_file.content_hash:
+        return blob_store.read_text(code_file.content_hash)
+    return code_file.raw_content or ""
+
+
+def _resolve_chunk_text(
+    content_hash: Optional[str],
+    start_offset: Optional[int],
+    end_offset: Optional[int],
+    inline_content: Optional[str],
+) -> str:
+    if content_hash and start_offset is not None and end_offset is not None:
+        return blob_store.read_slice(content_hash, start_offset, end_offset)
+    return inline_content or ""
+
+
+def get_chunk_text(code_file: CodeFile, chunk: CodeChunk) -> str:
+    """Return a chunk's text by slicing its file blob (or the legacy inline column)."""
+    if code_file.content_hash and chunk.start_offset is not None and chunk.end_offset is not None:
+        return blob_store.read_slice(code_file.content_hash, chunk.start_offset, chunk.end_offset)
+    return chunk.chunk_content or ""
+
+
+def list_content_hashes_by_repo(db: Session, repo_id: int) -> set[str]:
+    """Blob hashes referenced by a repository's files."""
+    return {
+        row[0]
+        for row in db.query(CodeFile.content_hash)
+        .filter(CodeFile.repo_id == repo_id, CodeFile.content_hash.isnot(None))
+        .distinct()
+        .all()
+    }
+
+
+def list_all_content_hashes(db: Session) -> set[str]:
+    """Every blob hash referenced by any file (input to the blob sweep)."""
+    return {row[0] for row in db.query(CodeFile.content_hash).filter(CodeFile.content_hash.isnot(None)).distinct().all()}
+
+
+def filter_unreferenced_hashes(db: Session, hashes: Iterable[str]) -> set[str]:
+    """Return the subset of `hashes` no longer referenced by any file (safe to delete)."""
+    candidates = set(hashes or [])
+    if not candidates:
+        return set()
+    referenced = {
+        row[0]
+        for row in db.query(CodeFile.content_hash).filter(CodeFile.content_hash.in_(candidates)).distinct().all()
+    }
+    return candidates - referenced
+
+
+def list_chunks_by_file(db: Session, file_id: int) -> List[CodeChunk]:
+    """List chunks for a specific file, ordered by chunk_index (offsets only; see `get_chunk_text`)."""
+    return (
+        db.query(CodeChunk)
+        .options(
+            load_only(
+                CodeChunk.id,
+                CodeChunk.file_id,
+                CodeChunk.chunk_index,
+                CodeChunk.token_count,
+                CodeChunk.start_offset,
+                CodeChunk.end_offset,
+            )
+        )
+        .filter(CodeChunk.file_id == file_id)
+        .order_by(CodeChunk.chunk_index.asc())
         .all()
     )
-    languages: dict[str, int] = {}
-    for lang, count in lang_rows:
-        key = (lang or "unknown").strip() or "unknown"
-        languages[key] = int(count or 0)
 
+
+def get_repo_analytics(db: Session, repo_id: int) -> dict:
+    """Deterministic per-repo analytics (no AI), read from the repo counters."""
+    repo = db.query(Repository).filter(Repository.id == repo_id).first()
+    if not repo:
+        return {"files": 0, "chunks": 0, "languages": {}, "avg_chunk_size": 0, "ingestion_time_ms": 0}
+
+    chunk_count = int(repo.chunk_count or 0)
     return {
-        "files": file_count,
-        "chunks": int(chunk_count),
-        "languages": languages,
-        "avg_chunk_size": int(avg_chunk),
+        "files": int(repo.file_count or 0),
+        "chunks": chunk_count,
+        "languages": parse_repo_languages(repo),
+        "avg_chunk_size": int((repo.total_tokens or 0) / chunk_count) if chunk_count else 0,
+        "ingestion_time_ms": int(repo.ingestion_time_ms or 0),
     }
 
 
@@ -301,74 +654,679 @@ def list_chunks_by_repo(db: Session, repo_id: int) -> List[CodeChunk]:
     )
 
 
-def list_chunks_with_file_paths(db: Session, repo_id: int) -> List[tuple[str, str]]:
-    """Return (chunk_content, file_path) rows for a repository."""
+class ChunkRow(NamedTuple):
+    """A chunk with the position data needed to merge neighbours when packing context."""
+
+    chunk_id: int
+    file_id: int
+    chunk_index: int
+    file_path: str
+    text: str
+    token_count: int
+    start_offset: Optional[int]
+    end_offset: Optional[int]
+
+
+def _chunk_text_rows(db: Session, repo_id: int):
     return (
-        db.query(CodeChunk.chunk_content, CodeFile.file_path)
+        db.query(
+            CodeChunk.chunk_content,
+            CodeChunk.start_offset,
+            CodeChunk.end_offset,
+            CodeFile.content_hash,
+            CodeFile.file_path,
+            CodeChunk.id,
+            CodeChunk.file_id,
+            CodeChunk.chunk_index,
+            CodeChunk.token_count,
+        )
         .join(CodeFile, CodeChunk.file_id == CodeFile.id)
         .filter(CodeFile.repo_id == repo_id)
-        .all()
+        .order_by(CodeFile.id.asc(), CodeChunk.chunk_index.asc())
     )
 
 
-def search_chunks_lexical(db: Session, repo_id: int, question: str, limit: int = 200) -> List[tuple[str, str]]:
-    """Lexical retrieval via SQL LIKE, returning (chunk_content, file_path).
+def chunk_search_terms(text: str) -> str:
+    """`CodeChunk.search_terms` for a chunk's text.
 
-    This is the no-embeddings fallback. It narrows candidates in SQL, then the retriever can score in Python.
+    Question terms are runs of word characters, so a term occurs in the
+    lowercased text exactly when it occurs in one of these words.
     """
+    return " ".join(sorted({word for word in re.findall(r"\w+", (text or "").lower()) if len(word) >= 3}))
 
-    terms = [t for t in re.split(r"\W+", (question or "").lower()) if len(t) >= 3]
-    q = (
-        db.query(CodeChunk.chunk_content, CodeFile.file_path)
+
+def search_chunk_rows_lexical(db: Session, repo_id: int, question: str, limit: int = 200) -> List[ChunkRow]:
+    """Lexical retrieval returning chunk rows that contain any question term.
+
+    This is the no-embeddings fallback. Candidates are narrowed in SQL with
+    LIKE over `search_terms`, so only matching chunks are read from the blob
+    store; rows without search terms (ingested before the column existed) are
+    matched against their text. The retriever then scores the rows.
+    """
+
+    terms = [t for t in re.split(r"\W+", (question or "").lower()) if len(t) >= 3][:12]
+    limit_val = max(1, int(limit))
+    query = _chunk_text_rows(db, repo_id).add_columns(CodeChunk.search_terms.is_(None))
+    if terms:
+        query = query.filter(
+            or_(
+                CodeChunk.search_terms.is_(None),
+                *[CodeChunk.search_terms.contains(term, autoescape=True) for term in terms],
+            )
+        )
+    out: List[ChunkRow] = []
+    for row in query.yield_per(1000):
+        inline, start, end, content_hash, file_path, chunk_id, file_id, chunk_index, token_count, unindexed = row
+        try:
+            text = _resolve_chunk_text(content_hash, start, end, inline)
+        except FileNotFoundError:
+            continue
+        if terms and unindexed:
+            lowered = text.lower()
+            if not any(term in lowered for term in terms):
+                continue
+        out.append(ChunkRow(chunk_id, file_id, chunk_index, file_path, text, int(token_count or 0), start, end))
+        if len(out) >= limit_val:
+            break
+    return out
+
+
+def get_chunk_texts_by_ids(db: Session, chunk_ids: Sequence[int]) -> dict[int, str]:
+    """Return {chunk_id: chunk_text} for the given ids, resolving blob offsets."""
+    if not chunk_ids:
+        return {}
+    rows = (
+        db.query(
+            CodeChunk.id,
+            CodeChunk.chunk_content,
+            CodeChunk.start_offset,
+            CodeChunk.end_offset,
+            CodeFile.content_hash,
+        )
         .join(CodeFile, CodeChunk.file_id == CodeFile.id)
-        .filter(CodeFile.repo_id == repo_id)
+        .filter(CodeChunk.id.in_(chunk_ids))
+        .all()
     )
-    if terms:
-        conditions = [func.lower(CodeChunk.chunk_content).like(f"%{term}%") for term in terms[:12]]
-        q = q.filter(or_(*conditions))
-    return q.limit(max(1, int(limit))).all()
+    return {
+        int(chunk_id): _resolve_chunk_text(content_hash, start, end, inline)
+        for chunk_id, inline, start, end, content_hash in rows
+    }
 
 
-def get_chunks_by_ids(db: Session, chunk_ids: Sequence[int]) -> List[CodeChunk]:
-    """Fetch chunks by id list."""
+def get_chunk_rows_by_ids(db: Session, chunk_ids: Sequence[int]) -> dict[int, ChunkRow]:
+    """Return {chunk_id: ChunkRow} for the given ids (text, position and stored token count)."""
     if not chunk_ids:
+        return {}
+    rows = (
+        db.query(
+            CodeChunk.id,
+            CodeChunk.file_id,
+            CodeChunk.chunk_index,
+            CodeChunk.token_count,
+            CodeChunk.chunk_content,
+            CodeChunk.start_offset,
+            CodeChunk.end_offset,
+            CodeFile.content_hash,
+            CodeFile.file_path,
+        )
+        .join(CodeFile, CodeChunk.file_id == CodeFile.id)
+        .filter(CodeChunk.id.in_(chunk_ids))
+        .all()
+    )
+    out: dict[int, ChunkRow] = {}
+    for chunk_id, file_id, chunk_index, token_count, inline, start, end, content_hash, file_path in rows:
+        try:
+            text = _resolve_chunk_text(content_hash, start, end, inline)
+        except FileNotFoundError:
+            continue
+        out[int(chunk_id)] = ChunkRow(
+            int(chunk_id), int(file_id), int(chunk_index), file_path, text, int(token_count or 0), start, end
+        )
+    return out
+
+
+def get_chunk_rows_by_span(db: Session, file_id: int, start_offset: int, end_offset: int, limit: int = 2) -> List[ChunkRow]:
+    """First chunks of a file overlapping the character span [start_offset, end_offset)."""
+    rows = (
+        db.query(CodeChunk.id)
+        .filter(
+            CodeChunk.file_id == file_id,
+            CodeChunk.start_offset < end_offset,
+            CodeChunk.end_offset > start_offset,
+        )
+        .order_by(CodeChunk.chunk_index.asc())
+        .limit(max(1, int(limit)))
+        .all()
+    )
+    by_id = get_chunk_rows_by_ids(db, [int(row[0]) for row in rows])
+    return [by_id[int(row[0])] for row in rows if int(row[0]) in by_id]
+
+
+class SymbolRow(NamedTuple):
+    repo_id: int
+    file_id: int
+    file_path: str
+    name: str
+    kind: str
+    parent: Optional[str]
+    signature: str
+    start_line: int
+    end_line: int
+    start_offset: int
+    end_offset: int
+
+
+_SYMBOL_COLUMNS = (
+    CodeSymbol.repo_id,
+    CodeSymbol.file_id,
+    CodeFile.file_path,
+    CodeSymbol.name,
+    CodeSymbol.kind,
+    CodeSymbol.parent,
+    CodeSymbol.signature,
+    CodeSymbol.start_line,
+    CodeSymbol.end_line,
+    CodeSymbol.start_offset,
+    CodeSymbol.end_offset,
+)
+
+
+def bulk_insert_symbols(db: Session, definitions: List[dict], references: List[dict]) -> None:
+    """Insert symbol index rows with Core executemany (caller commits)."""
+    if definitions:
+        db.execute(insert(CodeSymbol.__table__), definitions)
+    if references:
+        db.execute(insert(SymbolReference.__table__), references)
+
+
+def delete_symbols_by_files(db: Session, file_ids: List[int]) -> None:
+    """Delete the symbol index rows of the given files without committing."""
+    if not file_ids:
+        return
+    db.query(CodeSymbol).filter(CodeSymbol.file_id.in_(file_ids)).delete(synchronize_session=False)
+    db.query(SymbolReference).filter(SymbolReference.file_id.in_(file_ids)).delete(synchronize_session=False)
+
+
+def delete_symbols_by_repo(db: Session, repo_id: int) -> None:
+    """Delete a repository's symbol index rows without committing."""
+    db.query(CodeSymbol).filter(CodeSymbol.repo_id == repo_id).delete(synchronize_session=False)
+    db.query(SymbolReference).filter(SymbolReference.repo_id == repo_id).delete(synchronize_session=False)
+
+
+def bulk_insert_file_risks(db: Session, rows: List[dict]) -> None:
+    """Insert file_risks rows (file_id, repo_id, findings) with Core executemany (caller commits)."""
+    if not rows:
+        return
+    db.execute(
+        insert(FileRisk.__table__),
+        [
+            {
+                "file_id": row["file_id"],
+                "repo_id": row["repo_id"],
+                "finding_count": sum(len(items) for items in row["findings"].values()),
+                "findings_json": json.dumps(row["findings"]),
+            }
+            for row in rows
+        ],
+    )
+
+
+def save_file_risks(db: Session, rows: List[dict]) -> None:
+    """Insert file_risks rows outside ingestion and commit.
+
+    Concurrent requests may backfill the same legacy files; rows another
+    request stored first are kept and the rest are inserted.
+    """
+    if not rows:
+        return
+    try:
+        bulk_insert_file_risks(db, rows)
+        db.commit()
+        return
+    except IntegrityError:
+        db.rollback()
+    stored = {
+        file_id
+        for (file_id,) in db.query(FileRisk.file_id).filter(FileRisk.file_id.in_([row["file_id"] for row in rows]))
+    }
+    bulk_insert_file_risks(db, [row for row in rows if row["file_id"] not in stored])
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+
+
+def delete_file_risks_by_files(db: Session, file_ids: List[int]) -> None:
+    """Delete the risk findings of the given files without committing."""
+    if file_ids:
+        db.query(FileRisk).filter(FileRisk.file_id.in_(file_ids)).delete(synchronize_session=False)
+
+
+def delete_file_risks_by_repo(db: Session, repo_id: int) -> None:
+    """Delete a repository's risk findings without committing."""
+    db.query(FileRisk).filter(FileRisk.repo_id == repo_id).delete(synchronize_session=False)
+
+
+def get_file_risk(db: Session, file_id: int) -> Optional[dict[str, List[str]]]:
+    """Stored findings of a file, or None when it was ingested before risk scanning."""
+    row = db.query(FileRisk.findings_json).filter(FileRisk.file_id == file_id).first()
+    return json.loads(row[0] or "{}") if row else None
+
+
+def list_unscanned_files(db: Session, repo_id: int, limit: int) -> tuple[int, List[CodeFile]]:
+    """(count, first `limit` by id) of a repo's files without a file_risks row, metadata only.
+
+    These were ingested before risk scanning existed.
+    """
+    scanned = exists().where(FileRisk.file_id == CodeFile.id)
+    query = db.query(CodeFile).filter(CodeFile.repo_id == repo_id, ~scanned)
+    count = query.count()
+    if not count:
+        return 0, []
+    files = query.options(load_only(*_FILE_META_COLUMNS)).order_by(CodeFile.id).limit(max(0, int(limit))).all()
+    return int(count), files
+
+
+def list_flagged_file_risks(db: Session, repo_id: int) -> tuple[int, List[tuple[str, dict[str, List[str]]]]]:
+    """(files scanned, [(file_path, findings)] of files with findings in path order)."""
+    scanned = db.query(func.count(FileRisk.file_id)).filter(FileRisk.repo_id == repo_id).scalar() or 0
+    rows = (
+        db.query(CodeFile.file_path, FileRisk.findings_json)
+        .join(CodeFile, CodeFile.id == FileRisk.file_id)
+        .filter(FileRisk.repo_id == repo_id, FileRisk.finding_count > 0)
+        .order_by(CodeFile.file_path)
+        .all()
+    )
+    return int(scanned), [(path, json.loads(findings or "{}")) for path, findings in rows]
+
+
+def find_symbol_definitions(db: Session, repo_ids: Sequence[int], names: Sequence[str], limit: int = 50) -> List[SymbolRow]:
+    """Definitions with exactly these names in the given repos (index lookup on (repo_id, name))."""
+    if not repo_ids or not names:
         return []
-    return db.query(CodeChunk).filter(CodeChunk.id.in_(chunk_ids)).all()
+    rows = (
+        db.query(*_SYMBOL_COLUMNS)
+        .join(CodeFile, CodeSymbol.file_id == CodeFile.id)
+        .filter(CodeSymbol.repo_id.in_(list(repo_ids)), CodeSymbol.name.in_(list(names)))
+        .limit(limit)
+        .all()
+    )
+    return [SymbolRow(*row) for row in rows]
 
 
-def get_dashboard_overview(db: Session, user_id: int) -> dict:
-    """Aggregate dashboard metrics for the given user."""
-    repo_count = db.query(func.count(Repository.id)).filter(Repository.user_id == user_id).scalar() or 0
-    file_count = (
-        db.query(func.count(CodeFile.id))
-        .join(Repository, CodeFile.repo_id == Repository.id)
-        .filter(Repository.user_id == user_id)
-        .scalar()
-        or 0
+def get_file_symbol(db: Session, file_id: int, name: str, parent: Optional[str] = None) -> Optional[SymbolRow]:
+    """First definition of `name` in a file (optionally inside `parent`), by line."""
+    query = (
+        db.query(*_SYMBOL_COLUMNS)
+        .join(CodeFile, CodeSymbol.file_id == CodeFile.id)
+        .filter(CodeSymbol.file_id == file_id, CodeSymbol.name == name)
     )
-    chunk_count = (
-        db.query(func.count(CodeChunk.id))
-        .join(CodeFile, CodeChunk.file_id == CodeFile.id)
-        .join(Repository, CodeFile.repo_id == Repository.id)
-        .filter(Repository.user_id == user_id)
-        .scalar()
-        or 0
+    if parent:
+        query = query.filter(CodeSymbol.parent == parent)
+    row = query.order_by(CodeSymbol.start_line.asc()).first()
+    return SymbolRow(*row) if row else None
+
+
+def find_symbol_references(db: Session, repo_id: int, name: str, limit: int = 200) -> List[tuple[int, str, int]]:
+    """(file_id, file_path, line) of call sites and imports of `name` in a repository."""
+    return [
+        (int(file_id), file_path, int(line))
+        for file_id, file_path, line in db.query(SymbolReference.file_id, CodeFile.file_path, SymbolReference.line)
+        .join(CodeFile, SymbolReference.file_id == CodeFile.id)
+        .filter(SymbolReference.repo_id == repo_id, SymbolReference.name == name)
+        .limit(limit)
+        .all()
+    ]
+
+
+def list_symbols_by_repo(db: Session, repo_id: int) -> List[tuple]:
+    """(id, file_id, name, kind, parent, start_line, end_line, start_offset, end_offset) of a repository's definitions."""
+    return [
+        tuple(row)
+        for row in db.query(
+            CodeSymbol.id,
+            CodeSymbol.file_id,
+            CodeSymbol.name,
+            CodeSymbol.kind,
+            CodeSymbol.parent,
+            CodeSymbol.start_line,
+            CodeSymbol.end_line,
+            CodeSymbol.start_offset,
+            CodeSymbol.end_offset,
+        )
+        .filter(CodeSymbol.repo_id == repo_id)
+        .order_by(CodeSymbol.id.asc())
+        .all()
+    ]
+
+
+def list_symbol_references_by_repo(db: Session, repo_id: int) -> List[tuple[int, str, int, Optional[str]]]:
+    """(file_id, name, line, qualifier) of a repository's references."""
+    return [
+        tuple(row)
+        for row in db.query(
+            SymbolReference.file_id, SymbolReference.name, SymbolReference.line, SymbolReference.qualifier
+        ).filter(SymbolReference.repo_id == repo_id)
+    ]
+
+
+def get_symbols_by_ids(db: Session, symbol_ids: Sequence[int]) -> dict[int, SymbolRow]:
+    """Return {symbol_id: SymbolRow} for the given code_symbols ids."""
+    if not symbol_ids:
+        return {}
+    rows = (
+        db.query(CodeSymbol.id, *_SYMBOL_COLUMNS)
+        .join(CodeFile, CodeSymbol.file_id == CodeFile.id)
+        .filter(CodeSymbol.id.in_(list(symbol_ids)))
+        .all()
     )
-    last_ingestion = (
-        db.query(func.max(Repository.created_at))
+    return {int(row[0]): SymbolRow(*row[1:]) for row in rows}
+
+
+def get_dashboard_overview(db: Session, user_id: int) -> dict:
+    """Aggregate dashboard metrics for the given user."""
+    repo_count, file_count, chunk_count, last_ingestion = (
+        db.query(
+            func.count(Repository.id),
+            func.coalesce(func.sum(Repository.file_count), 0),
+            func.coalesce(func.sum(Repository.chunk_count), 0),
+            func.max(Repository.created_at),
+        )
         .filter(Repository.user_id == user_id)
-        .scalar()
+        .one()
     )
 
     return {
-        "total_repos": repo_count,
-        "total_files": file_count,
-        "total_chunks": chunk_count,
+        "total_repos": int(repo_count or 0),
+        "total_files": int(file_count or 0),
+        "total_chunks": int(chunk_count or 0),
         "last_ingestion_time": last_ingestion.isoformat() if last_ingestion else None,
     }
 
 
 def get_repo_languages(db: Session, repo_id: int) -> List[str]:
     """Return detected languages for a repository."""
-    rows = db.query(CodeFile.language).filter(CodeFile.repo_id == repo_id).all()
-    return [row[0] for row in rows if row[0]]
+    repo = db.query(Repository).filter(Repository.id == repo_id).first()
+    if not repo:
+        return []
+    return [lang for lang in parse_repo_languages(repo) if lang != "unknown"]
+
+
+
+ACTIVE_INGESTION_STATES = ("queued", "running")
+
+
+def create_ingestion_job(db: Session, *, repo_id: int, user_id: int, repo_url: str, branch: str) -> IngestionJob:
+    """Create a queued ingestion job."""
+    job = IngestionJob(repo_id=repo_id, user_id=user_id, repo_url=repo_url, branch=branch or "main")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_ingestion_job(db: Session, job_id: int) -> Optional[IngestionJob]:
+    """Fetch an ingestion job by id."""
+    return db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+
+def get_latest_ingestion_job(db: Session, repo_id: int) -> Optional[IngestionJob]:
+    """Return the most recent ingestion job for a repository."""
+    return (
+        db.query(IngestionJob)
+        .filter(IngestionJob.repo_id == repo_id)
+        .order_by(IngestionJob.id.desc())
+        .first()
+    )
+
+
+def get_active_ingestion_job(db: Session, repo_id: int) -> Optional[IngestionJob]:
+    """Return the queued/running job for a repository, if any."""
+    return (
+        db.query(IngestionJob)
+        .filter(IngestionJob.repo_id == repo_id, IngestionJob.state.in_(ACTIVE_INGESTION_STATES))
+        .order_by(IngestionJob.id.desc())
+        .first()
+    )
+
+
+def count_running_ingestion_jobs(db: Session) -> int:
+    """Number of jobs currently running across all workers."""
+    return int(db.query(func.count(IngestionJob.id)).filter(IngestionJob.state == "running").scalar() or 0)
+
+
+def set_ingestion_job_size_estimate(db: Session, job_id: int, size_kb: int) -> None:
+    """Store a job's repo size estimate unless one is already set (heartbeat untouched)."""
+    db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.estimated_size_kb.is_(None)).update(
+        {IngestionJob.estimated_size_kb: int(size_kb)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def _ordered_queue(
+    db: Session,
+    *,
+    default_size_kb: int,
+    aging_seconds: int,
+) -> tuple[list[tuple[int, int]], dict[int, int]]:
+    """Return queued (job_id, user_id) in scheduling order plus running counts per user.
+
+    Order: users with the fewest running jobs first (fairness), then smallest
+    effective size. Effective size shrinks as a job waits (aging), so large
+    repos are delayed but never starved.
+    """
+
+    running_by_user = {
+        int(user_id): int(count)
+        for user_id, count in db.query(IngestionJob.user_id, func.count(IngestionJob.id))
+        .filter(IngestionJob.state == "running")
+        .group_by(IngestionJob.user_id)
+        .all()
+    }
+    rows = (
+        db.query(IngestionJob.id, IngestionJob.user_id, IngestionJob.estimated_size_kb, IngestionJob.created_at)
+        .filter(IngestionJob.state == "queued")
+        .order_by(IngestionJob.id.asc())
+        .all()
+    )
+
+    now = datetime.utcnow()
+    aging = max(1, int(aging_seconds))
+
+    def _key(row) -> tuple[int, float, int]:
+        job_id, user_id, size_kb, created_at = row
+        size = float(size_kb) if size_kb is not None and size_kb >= 0 else float(default_size_kb)
+        waited = max(0.0, (now - created_at).total_seconds()) if created_at else 0.0
+        return running_by_user.get(int(user_id), 0), size / (1.0 + waited / aging), int(job_id)
+
+    ordered = sorted(rows, key=_key)
+    return [(int(r[0]), int(r[1])) for r in ordered], running_by_user
+
+
+def claim_next_ingestion_job(
+    db: Session,
+    worker_id: str,
+    *,
+    max_running: int,
+    max_per_user: int,
+    default_size_kb: int,
+    aging_seconds: int,
+) -> Optional[int]:
+    """Atomically claim the next schedulable queued job and return its id.
+
+    Respects the global and per-user running-job caps; see `_ordered_queue` for
+    ordering. The counts read for ordering may be stale by the time of the claim,
+    so the UPDATE re-checks both caps against the running jobs in its WHERE
+    clause; the claim and the caps are then safe across worker processes.
+    """
+
+    queue, running_by_user = _ordered_queue(db, default_size_kb=default_size_kb, aging_seconds=aging_seconds)
+    if not queue:
+        return None
+    if max_running > 0 and sum(running_by_user.values()) >= max_running:
+        return None
+
+    running = aliased(IngestionJob)
+    for job_id, user_id in queue:
+        if max_per_user > 0 and running_by_user.get(user_id, 0) >= max_per_user:
+            continue
+        conditions = [IngestionJob.id == job_id, IngestionJob.state == "queued"]
+        if max_running > 0:
+            total_running = select(func.count(running.id)).where(running.state == "running")
+            conditions.append(total_running.scalar_subquery() < max_running)
+        if max_per_user > 0:
+            user_running = select(func.count(running.id)).where(running.state == "running", running.user_id == user_id)
+            conditions.append(user_running.scalar_subquery() < max_per_user)
+        claimed = (
+            db.query(IngestionJob)
+            .filter(*conditions)
+            .update(
+                {
+                    IngestionJob.state: "running",
+                    IngestionJob.worker_id: worker_id,
+                    IngestionJob.updated_at: datetime.utcnow(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if claimed:
+            return int(job_id)
+    return None
+
+
+def get_ingestion_queue_position(
+    db: Session,
+    job_id: int,
+    *,
+    default_size_kb: int,
+    aging_seconds: int,
+) -> Optional[int]:
+    """1-based position of a queued job in scheduling order (None if not queued)."""
+    queue, _ = _ordered_queue(db, default_size_kb=default_size_kb, aging_seconds=aging_seconds)
+    for position, (queued_id, _user_id) in enumerate(queue, start=1):
+        if queued_id == job_id:
+            return position
+    return None
+
+
+def touch_ingestion_job(db: Session, job_id: int) -> None:
+    """Bump a running job's heartbeat."""
+    db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.state == "running").update(
+        {IngestionJob.updated_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def requeue_stale_ingestion_jobs(db: Session, *, lease_seconds: int) -> int:
+    """Return running jobs whose heartbeat expired to the queue; they resume from their checkpoint."""
+    cutoff = datetime.utcnow() - timedelta(seconds=max(1, int(lease_seconds)))
+    count = (
+        db.query(IngestionJob)
+        .filter(IngestionJob.state == "running", IngestionJob.updated_at < cutoff)
+        .update(
+            {IngestionJob.state: "queued", IngestionJob.worker_id: None},
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return int(count or 0)
+
+
+def update_ingestion_job(db: Session, job: IngestionJob, *, commit: bool = True, **fields) -> IngestionJob:
+    """Apply field updates to a job and bump its heartbeat.
+
+    With commit=False the caller commits, e.g. together with a batch of file
+    and chunk rows so progress and data land atomically.
+    """
+    for key, value in fields.items():
+        setattr(job, key, value)
+    job.updated_at = datetime.utcnow()
+    if commit:
+        db.commit()
+        db.refresh(job)
+    return job
+
+
+def list_file_hashes_by_repo(db: Session, repo_id: int) -> dict[str, Optional[str]]:
+    """Return {file_path: content_hash} for the files already stored for a repository."""
+    return {
+        path: digest
+        for path, digest in db.query(CodeFile.file_path, CodeFile.content_hash).filter(CodeFile.repo_id == repo_id)
+    }
+
+
+def delete_files_by_paths(db: Session, repo_id: int, file_paths: List[str]) -> set[str]:
+    """Delete files (with their chunks and symbols) by path without committing; returns their content hashes."""
+    if not file_paths:
+        return set()
+    content_hashes: set[str] = set()
+    for offset in range(0, len(file_paths), 500):
+        paths = file_paths[offset : offset + 500]
+        rows = (
+            db.query(CodeFile.id, CodeFile.content_hash)
+            .filter(CodeFile.repo_id == repo_id, CodeFile.file_path.in_(paths))
+            .all()
+        )
+        file_ids = [file_id for file_id, _ in rows]
+        content_hashes.update(digest for _, digest in rows if digest)
+        if file_ids:
+            delete_symbols_by_files(db, file_ids)
+            delete_file_risks_by_files(db, file_ids)
+            db.query(CodeChunk).filter(CodeChunk.file_id.in_(file_ids)).delete(synchronize_session=False)
+            db.query(CodeFile).filter(CodeFile.id.in_(file_ids)).delete(synchronize_session=False)
+    return content_hashes
+
+
+def count_chunks_by_repo(db: Session, repo_id: int) -> int:
+    """Total chunks stored for a repository, from the per-file counters."""
+    total = db.query(func.coalesce(func.sum(CodeFile.chunk_count), 0)).filter(CodeFile.repo_id == repo_id).scalar()
+    return int(total or 0)
+
+
+def list_chunk_refs_by_repo(
+    db: Session, repo_id: int, exclude_ids: Iterable[int] = ()
+) -> List[tuple[int, str, str, int]]:
+    """Return (chunk_id, file_path, chunk_content, token_count) rows for a repository.
+
+    Chunk ids are diffed against `exclude_ids` before any text is read, so only
+    the remaining chunks touch the blob store; chunks whose blob is missing are
+    skipped.
+    """
+
+    excluded = {int(chunk_id) for chunk_id in exclude_ids}
+    chunk_ids = [
+        int(row[0])
+        for row in db.query(CodeChunk.id)
+        .join(CodeFile, CodeChunk.file_id == CodeFile.id)
+        .filter(CodeFile.repo_id == repo_id)
+        .order_by(CodeChunk.id.asc())
+        .all()
+        if int(row[0]) not in excluded
+    ]
+    out: List[tuple[int, str, str, int]] = []
+    for offset in range(0, len(chunk_ids), 500):
+        rows = (
+            db.query(
+                CodeChunk.id,
+                CodeFile.file_path,
+                CodeChunk.chunk_content,
+                CodeChunk.start_offset,
+                CodeChunk.end_offset,
+                CodeFile.content_hash,
+                CodeChunk.token_count,
+            )
+            .join(CodeFile, CodeChunk.file_id == CodeFile.id)
+            .filter(CodeChunk.id.in_(chunk_ids[offset : offset + 500]))
+            .order_by(CodeChunk.id.asc())
+            .all()
+        )
+        for chunk_id, file_path, inline, start, end, content_hash, token_count in rows:
+            try:
+                text = _resolve_chunk_text(content_hash, start, end, inline)
+            except FileNotFoundError:
+                continue
+            out.append((int(chunk_id), file_path, text, int(token_count)))
+    return out
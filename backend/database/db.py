@@ -1,70 +1,98 @@
-from sqlalchemy import create_engine, inspect, text
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from settings import settings
+from .migrations import run_migrations
+
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# Sessions for read-only query paths; bound to a separate connection pool so
+# API reads never queue behind ingestion writers for a pooled connection.
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 
-def _ensure_user_profile_image_column(engine) -> None:
-    """Ensure the users.profile_image_url column exists for existing SQLite DBs.
-
-    When we added the profile_image_url field to the User model, existing SQLite
-    databases created before that change do not automatically gain the new
-    column. This helper performs a minimal, safe migration by adding the column
-    if it's missing.
-    """
-
-    try:
-        inspector = inspect(engine)
-        if "users" not in inspector.get_table_names():
-            return
+def _is_sqlite_file(database_url: str) -> bool:
+    return database_url.startswith("sqlite") and ":memory:" not in database_url and database_url not in {"sqlite://", "sqlite:///"}
 
-        columns = [col["name"] for col in inspector.get_columns("users")]
-        if "profile_image_url" in columns:
-            return
 
-        with engine.connect() as conn:
-            conn.execute(text("ALTER TABLE users ADD COLUMN profile_image_url VARCHAR"))
-            conn.commit()
-    except Exception:
-        # If anything goes wrong here, we don't want to block app startup;
-        # the underlying error will surface on first query instead.
-        return
+def _apply_sqlite_pragmas(engine: Engine, *, read_only: bool) -> None:
+    """Apply the tuning profile on every new SQLite connection.
 
+    WAL lets readers proceed while a writer commits; synchronous=NORMAL is
+    durable across application crashes in WAL mode; busy_timeout makes
+    concurrent writers wait for the lock instead of failing immediately.
+    """
 
-def _ensure_user_username_column(engine) -> None:
-    """Ensure the users.username column exists for existing SQLite DBs."""
+    pragmas = [
+        f"PRAGMA busy_timeout={max(0, int(settings.sqlite_busy_timeout_ms))}",
+        f"PRAGMA synchronous={settings.sqlite_synchronous}",
+        f"PRAGMA cache_size=-{max(0, int(settings.sqlite_cache_size_kb))}",
+        f"PRAGMA mmap_size={max(0, int(settings.sqlite_mmap_size_mb)) * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if not read_only:
+        # journal_mode is persistent in the file; only the writer pool sets it.
+        pragmas.insert(0, f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    else:
+        pragmas.append("PRAGMA query_only=ON")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def create_db_engine(database_url: str, *, read_only: bool = False) -> Engine:
+    """Create an engine with the tuned connection profile for `database_url`.
+
+    Pool size follows DB_POOL_SIZE/DB_MAX_OVERFLOW (defaults scale with the
+    ingestion worker concurrency). File-backed SQLite gets the pragma profile.
+    """
 
-    try:
-        inspector = inspect(engine)
-        if "users" not in inspector.get_table_names():
-            return
+    if not database_url.startswith("sqlite"):
+        return create_engine(
+            database_url,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_pre_ping=True,
+        )
 
-        columns = [col["name"] for col in inspector.get_columns("users")]
-        if "username" in columns:
-            return
+    connect_args = {"check_same_thread": False, "timeout": max(0, int(settings.sqlite_busy_timeout_ms)) / 1000.0}
+    if not _is_sqlite_file(database_url):
+        return create_engine(database_url, connect_args=connect_args)
 
-        with engine.connect() as conn:
-            conn.execute(text("ALTER TABLE users ADD COLUMN username VARCHAR"))
-            conn.commit()
-    except Exception:
-        return
+    engine = create_engine(
+        database_url,
+        connect_args=connect_args,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
+    _apply_sqlite_pragmas(engine, read_only=read_only)
+    return engine
 
 
 def init_db(database_url: str) -> None:
-    """Initialize the database engine, apply lightweight migrations, and create tables."""
+    """Initialize the database engines, apply lightweight migrations, and create tables."""
 
-    connect_args = {"check_same_thread": False} if database_url.startswith("sqlite") else {}
-    engine = create_engine(database_url, connect_args=connect_args)
+    engine = create_db_engine(database_url)
 
-    # Apply a minimal migration for the new profile_image_url column when
-    # using an existing SQLite database.
-    if database_url.startswith("sqlite"):
-        _ensure_user_profile_image_column(engine)
-        _ensure_user_username_column(engine)
-
-    SessionLocal.configure(bind=engine)
+    # New tables come from the models; existing tables are brought up to date
+    # by the numbered migrations (recorded in schema_migrations).
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    SessionLocal.configure(bind=engine)
+
+    # Read pool: DATABASE_READ_URL (e.g. a replica) or a query_only pool on the same database.
+    read_url = settings.database_read_url or database_url
+    if read_url == database_url and not _is_sqlite_file(database_url):
+        ReadSessionLocal.configure(bind=engine)
+    else:
+        ReadSessionLocal.configure(bind=create_db_engine(read_url, read_only=True))
 
 
 def get_db():
@@ -75,3 +103,13 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Yield a session from the read-only pool (for endpoints that never write)."""
+
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,286 @@
+"""Numbered schema migrations for existing databases.
+
+`init_db` creates missing tables from the models, then `run_migrations` applies
+every migration not yet recorded in `schema_migrations`, in order. Migrations
+must be idempotent (a fresh database already has the columns/indexes from the
+models and simply records them as applied).
+
+To change the schema: update the model, then append a migration here with the
+next number. Never edit or reorder a migration that has shipped.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    id: str
+    apply: Callable[[Engine], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(migration_id: str):
+    """Register a migration function under `migration_id` (applied in definition order)."""
+
+    def register(fn: Callable[[Engine], None]) -> Callable[[Engine], None]:
+        MIGRATIONS.append(Migration(migration_id, fn))
+        return fn
+
+    return register
+
+
+def _table_exists(engine: Engine, table: str) -> bool:
+    return table in inspect(engine).get_table_names()
+
+
+def _add_missing_columns(engine: Engine, table: str, columns: dict[str, str]) -> list[str]:
+    """Add any of `columns` (name -> SQL type/default) missing from `table`.
+
+    Returns the names of the columns that were added so callers can backfill.
+    """
+
+    if not _table_exists(engine, table):
+        return []
+
+    existing = {col["name"] for col in inspect(engine).get_columns(table)}
+    missing = [name for name in columns if name not in existing]
+    if not missing:
+        return []
+
+    with engine.connect() as conn:
+        for name in missing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}"))
+        conn.commit()
+    return missing
+
+
+def _create_indexes(engine: Engine, statements: List[str]) -> None:
+    with engine.connect() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+        conn.commit()
+
+
+@migration("0001_users_profile_image_url")
+def _users_profile_image_url(engine: Engine) -> None:
+    _add_missing_columns(engine, "users", {"profile_image_url": "VARCHAR"})
+
+
+@migration("0002_users_username")
+def _users_username(engine: Engine) -> None:
+    _add_missing_columns(engine, "users", {"username": "VARCHAR"})
+
+
+@migration("0003_code_file_counters")
+def _code_file_counters(engine: Engine) -> None:
+    """Per-file counter columns, backfilled from chunk rows."""
+
+    added = _add_missing_columns(
+        engine,
+        "code_files",
+        {
+            "line_count": "INTEGER NOT NULL DEFAULT 0",
+            "chunk_count": "INTEGER NOT NULL DEFAULT 0",
+            "total_tokens": "INTEGER NOT NULL DEFAULT 0",
+            "avg_chunk_tokens": "INTEGER NOT NULL DEFAULT 0",
+        },
+    )
+    if not added:
+        return
+
+    with engine.connect() as conn:
+        conn.execute(
+            text(
+                """
+                UPDATE code_files SET
+                    chunk_count = (SELECT COUNT(*) FROM code_chunks WHERE code_chunks.file_id = code_files.id),
+                    total_tokens = COALESCE(
+                        (SELECT SUM(token_count) FROM code_chunks WHERE code_chunks.file_id = code_files.id),
+                        0
+                    ),
+                    avg_chunk_tokens = COALESCE(
+                        (SELECT CAST(AVG(token_count) AS INTEGER) FROM code_chunks WHERE code_chunks.file_id = code_files.id),
+                        0
+                    )
+                """
+            )
+        )
+        # Line counts use str.splitlines() like ingestion ("\r\n" and "\r" included).
+        last_id = 0
+        while True:
+            batch = conn.execute(
+                text(
+                    "SELECT id, raw_content FROM code_files WHERE id > :last_id AND raw_content IS NOT NULL "
+                    "ORDER BY id LIMIT 500"
+                ),
+                {"last_id": last_id},
+            ).all()
+            if not batch:
+                break
+            conn.execute(
+                text("UPDATE code_files SET line_count = :line_count WHERE id = :id"),
+                [{"id": file_id, "line_count": len(content.splitlines())} for file_id, content in batch],
+            )
+            last_id = batch[-1][0]
+        conn.commit()
+
+
+@migration("0004_repository_counters")
+def _repository_counters(engine: Engine) -> None:
+    """Repository counter/status columns, backfilled from the per-file counters (0003)."""
+
+    added = _add_missing_columns(
+        engine,
+        "repositories",
+        {
+            "status": "VARCHAR NOT NULL DEFAULT 'processing'",
+            "file_count": "INTEGER NOT NULL DEFAULT 0",
+            "chunk_count": "INTEGER NOT NULL DEFAULT 0",
+            "total_tokens": "INTEGER NOT NULL DEFAULT 0",
+            "languages_json": "TEXT NOT NULL DEFAULT '{}'",
+            "ingestion_time_ms": "INTEGER NOT NULL DEFAULT 0",
+        },
+    )
+    if not added:
+        return
+
+    with engine.connect() as conn:
+        repo_ids = [row[0] for row in conn.execute(text("SELECT id FROM repositories"))]
+        for repo_id in repo_ids:
+            file_count, chunk_count, total_tokens = conn.execute(
+                text(
+                    "SELECT COUNT(*), COALESCE(SUM(chunk_count), 0), COALESCE(SUM(total_tokens), 0) "
+                    "FROM code_files WHERE repo_id = :repo_id"
+                ),
+                {"repo_id": repo_id},
+            ).one()
+            languages: dict[str, int] = {}
+            for lang, count in conn.execute(
+                text("SELECT language, COUNT(*) FROM code_files WHERE repo_id = :repo_id GROUP BY language"),
+                {"repo_id": repo_id},
+            ):
+                key = (lang or "unknown").strip() or "unknown"
+                languages[key] = languages.get(key, 0) + int(count or 0)
+            conn.execute(
+                text(
+                    "UPDATE repositories SET status = :status, file_count = :file_count, "
+                    "chunk_count = :chunk_count, total_tokens = :total_tokens, "
+                    "languages_json = :languages_json WHERE id = :repo_id"
+                ),
+                {
+                    "status": "indexed" if file_count else "processing",
+                    "file_count": int(file_count or 0),
+                    "chunk_count": int(chunk_count or 0),
+                    "total_tokens": int(total_tokens or 0),
+                    "languages_json": json.dumps(languages),
+                    "repo_id": repo_id,
+                },
+            )
+        conn.commit()
+
+
+@migration("0005_ingestion_job_scheduling")
+def _ingestion_job_scheduling(engine: Engine) -> None:
+    _add_missing_columns(engine, "ingestion_jobs", {"worker_id": "VARCHAR", "estimated_size_kb": "INTEGER"})
+
+
+@migration("0006_blob_references")
+def _blob_references(engine: Engine) -> None:
+    """Blob-store reference columns; old rows keep inline content until `python -m database.blob_store migrate`."""
+
+    _add_missing_columns(
+        engine,
+        "code_files",
+        {"content_hash": "VARCHAR(64)", "content_size": "INTEGER NOT NULL DEFAULT 0"},
+    )
+    _add_missing_columns(engine, "code_chunks", {"start_offset": "INTEGER", "end_offset": "INTEGER"})
+    _create_indexes(engine, ["CREATE INDEX IF NOT EXISTS ix_code_files_content_hash ON code_files (content_hash)"])
+
+
+@migration("0007_repository_owner_index")
+def _repository_owner_index(engine: Engine) -> None:
+    _create_indexes(engine, ["CREATE INDEX IF NOT EXISTS ix_repositories_id_user_id ON repositories (id, user_id)"])
+
+
+@migration("0008_hot_path_composite_indexes")
+def _hot_path_composite_indexes(engine: Engine) -> None:
+    """Composite indexes for the crud lookups checked by benchmarks/check_query_plans.py."""
+
+    _create_indexes(
+        engine,
+        [
+            "CREATE INDEX IF NOT EXISTS ix_code_files_repo_id_file_path ON code_files (repo_id, file_path)",
+            "CREATE INDEX IF NOT EXISTS ix_code_chunks_file_id_chunk_index ON code_chunks (file_id, chunk_index)",
+            "CREATE INDEX IF NOT EXISTS ix_chat_messages_cache_lookup "
+            "ON chat_messages (user_id, repo_id, question_normalized, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_chat_messages_history ON chat_messages (user_id, repo_id, created_at)",
+        ],
+    )
+
+
+@migration("0009_code_file_summaries")
+def _code_file_summaries(engine: Engine) -> None:
+    """Ingest-time file summaries; rows ingested earlier are filled in lazily on first query."""
+
+    _add_missing_columns(engine, "code_files", {"summary": "TEXT"})
+
+
+@migration("0010_symbol_reference_qualifier")
+def _symbol_reference_qualifier(engine: Engine) -> None:
+    """Call receivers for dependency-graph resolution; older rows resolve as bare names."""
+
+    _add_missing_columns(engine, "symbol_references", {"qualifier": "VARCHAR"})
+
+
+@migration("0011_chunk_search_terms")
+def _chunk_search_terms(engine: Engine) -> None:
+    """Lexical search words per chunk; older rows stay NULL and are matched against their text until re-ingested."""
+
+    _add_missing_columns(engine, "code_chunks", {"search_terms": "TEXT"})
+
+
+def _applied_migrations(engine: Engine) -> set[str]:
+    with engine.connect() as conn:
+        conn.execute(
+            text("CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL)")
+        )
+        conn.commit()
+        return {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """Apply pending migrations in order and return the ids that ran.
+
+    Stops at the first failure (later migrations may depend on it) without
+    blocking startup; the error is logged and the migration retried next start.
+    """
+
+    applied = _applied_migrations(engine)
+    ran: List[str] = []
+    for item in MIGRATIONS:
+        if item.id in applied:
+            continue
+        try:
+            item.apply(engine)
+            with engine.connect() as conn:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :applied_at)"),
+                    {"id": item.id, "applied_at": datetime.utcnow()},
+                )
+                conn.commit()
+        except Exception:
+            logger.exception("Schema migration failed id=%s; remaining migrations skipped", item.id)
+            break
+        ran.append(item.id)
+        logger.info("Applied schema migration %s", item.id)
+    return ran
+
@@ -1,7 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import deferred, relationship
 
 from .db import Base
 
@@ -25,6 +25,8 @@ class User(Base):
 
 class Repository(Base):
     __tablename__ = "repositories"
+    # Covering index for per-request ownership checks (crud.get_repo_owner_id).
+    __table_args__ = (Index("ix_repositories_id_user_id", "id", "user_id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -32,22 +34,50 @@ class Repository(Base):
     repo_name = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Denormalized counters maintained by ingestion so list/analytics endpoints
+    # are single-row reads instead of COUNT/AVG scans over files and chunks.
+    status = Column(String, nullable=False, default="processing")
+    file_count = Column(Integer, nullable=False, default=0)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    languages_json = Column(Text, nullable=False, default="{}")
+    ingestion_time_ms = Column(Integer, nullable=False, default=0)
+
     user = relationship("User", back_populates="repositories")
     files = relationship(
         "CodeFile",
         back_populates="repository",
         cascade="all, delete-orphan",
     )
+    ingestion_jobs = relationship(
+        "IngestionJob",
+        back_populates="repository",
+        cascade="all, delete-orphan",
+    )
 
 
 class CodeFile(Base):
     __tablename__ = "code_files"
+    __table_args__ = (Index("ix_code_files_repo_id_file_path", "repo_id", "file_path"),)
 
     id = Column(Integer, primary_key=True, index=True)
     repo_id = Column(Integer, ForeignKey("repositories.id"), nullable=False, index=True)
     file_path = Column(String, nullable=False)
     language = Column(String, nullable=True)
-    raw_content = Column(Text, nullable=False)
+    # Content lives in the blob store keyed by content_hash; raw_content is only
+    # populated for rows ingested before the blob store existed (empty otherwise).
+    raw_content = deferred(Column(Text, nullable=False, default=""))
+    content_hash = Column(String(64), nullable=True, index=True)
+    content_size = Column(Integer, nullable=False, default=0)
+
+    # Per-file counters written at ingest time (see Repository counters).
+    line_count = Column(Integer, nullable=False, default=0)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    avg_chunk_tokens = Column(Integer, nullable=False, default=0)
+    # Outline (description, imports, definition signatures) built at ingest
+    # time and sent as file context instead of a raw prefix (ingestion/outline.py).
+    summary = deferred(Column(Text, nullable=True))
 
     repository = relationship("Repository", back_populates="files")
     chunks = relationship(
@@ -59,18 +89,83 @@ class CodeFile(Base):
 
 class CodeChunk(Base):
     __tablename__ = "code_chunks"
+    __table_args__ = (Index("ix_code_chunks_file_id_chunk_index", "file_id", "chunk_index"),)
 
     id = Column(Integer, primary_key=True, index=True)
     file_id = Column(Integer, ForeignKey("code_files.id"), nullable=False, index=True)
     chunk_index = Column(Integer, nullable=False)
-    chunk_content = Column(Text, nullable=False)
+    # Character offsets into the file's blob; chunk_content is only populated
+    # for legacy rows (see CodeFile.raw_content).
+    chunk_content = deferred(Column(Text, nullable=False, default=""))
+    start_offset = Column(Integer, nullable=True)
+    end_offset = Column(Integer, nullable=True)
     token_count = Column(Integer, nullable=False)
+    # Distinct lowercase words (3+ characters) of the chunk, space-separated, so
+    # the lexical fallback filters in SQL before reading blobs; NULL for rows
+    # ingested before it existed (crud.chunk_search_terms).
+    search_terms = deferred(Column(Text, nullable=True))
 
     file = relationship("CodeFile", back_populates="chunks")
 
 
+class CodeSymbol(Base):
+    """A class/function/method definition found at ingest time (ingestion/outline.py)."""
+
+    __tablename__ = "code_symbols"
+    __table_args__ = (
+        Index("ix_code_symbols_repo_id_name", "repo_id", "name"),
+        Index("ix_code_symbols_file_id_name", "file_id", "name", "start_line"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    repo_id = Column(Integer, ForeignKey("repositories.id"), nullable=False)
+    file_id = Column(Integer, ForeignKey("code_files.id"), nullable=False)
+    name = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # class | type | function | method
+    parent = Column(String, nullable=True)  # enclosing class/function name
+    signature = Column(Text, nullable=False, default="")
+    start_line = Column(Integer, nullable=False)
+    end_line = Column(Integer, nullable=False)
+    # Character offsets of the definition in the file text (chunk offsets use the same scale).
+    start_offset = Column(Integer, nullable=False)
+    end_offset = Column(Integer, nullable=False)
+
+
+class SymbolReference(Base):
+    """A call site or imported name, by line, for find-references."""
+
+    __tablename__ = "symbol_references"
+    __table_args__ = (Index("ix_symbol_references_repo_id_name", "repo_id", "name"),)
+
+    id = Column(Integer, primary_key=True)
+    repo_id = Column(Integer, ForeignKey("repositories.id"), nullable=False)
+    file_id = Column(Integer, ForeignKey("code_files.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    line = Column(Integer, nullable=False)
+    # Receiver of an attribute call (`crud` in `crud.f()`); NULL for bare names.
+    qualifier = Column(String, nullable=True)
+
+
+class FileRisk(Base):
+    """Risk radar findings of one file, scanned at ingest time (ingestion/risk.py)."""
+
+    __tablename__ = "file_risks"
+
+    file_id = Column(Integer, ForeignKey("code_files.id"), primary_key=True)
+    repo_id = Column(Integer, ForeignKey("repositories.id"), nullable=False, index=True)
+    # Number of findings; the repo-wide scan only reads flagged files.
+    finding_count = Column(Integer, nullable=False, default=0)
+    # {"security": [...], "performance": [...], "maintainability": [...]}
+    findings_json = Column(Text, nullable=False, default="{}")
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Answer cache lookup (get_cached_chat_message) and history listing.
+        Index("ix_chat_messages_cache_lookup", "user_id", "repo_id", "question_normalized", "created_at"),
+        Index("ix_chat_messages_history", "user_id", "repo_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -88,3 +183,90 @@ class ChatMessage(Base):
 
     user = relationship("User")
     repository = relationship("Repository")
+
+
+class FileExplanation(Base):
+    """Cached LLM output of explain / explain_symbol / why_written for one file version.
+
+    Keyed by content hash rather than file id, so unchanged files keep their
+    entries across re-ingests; ingestion prunes entries whose hash is stale.
+    """
+
+    __tablename__ = "file_explanations"
+    __table_args__ = (
+        Index(
+            "ix_file_explanations_key",
+            "repo_id",
+            "file_path",
+            "content_hash",
+            "endpoint",
+            "level",
+            "start_line",
+            "end_line",
+            "model",
+            unique=True,
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    repo_id = Column(Integer, ForeignKey("repositories.id"), nullable=False)
+    file_path = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    endpoint = Column(String, nullable=False)  # explain | explain_symbol | why_written
+    level = Column(String, nullable=False)
+    # Explained line range; 0/0 for whole-file entries.
+    start_line = Column(Integer, nullable=False, default=0)
+    end_line = Column(Integer, nullable=False, default=0)
+    model = Column(String, nullable=False)
+
+    explanation = Column(Text, nullable=False)
+    referenced_chunks_json = Column(Text, nullable=False, default="[]")
+    # Requests served by this entry (including the one that created it); picks
+    # the files whose explanations are regenerated after a re-ingest. A
+    # regenerated entry starts with the total of the versions it replaces.
+    hits = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IngestionJob(Base):
+    """One ingestion run for a repository, with progress and resume checkpoints.
+
+    Files are committed in batches together with the job's progress counters,
+    so the rows already present for the repo are the checkpoint a restarted
+    worker resumes from.
+    """
+
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    repo_id = Column(Integer, ForeignKey("repositories.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    repo_url = Column(String, nullable=False)
+    branch = Column(String, nullable=False, default="main")
+
+    # state: queued | running | succeeded | failed | cancelled
+    state = Column(String, nullable=False, default="queued", index=True)
+    # stage: queued | cloning | reading | chunking | embedding | finalizing | done
+    stage = Column(String, nullable=False, default="queued")
+
+    files_total = Column(Integer, nullable=False, default=0)
+    files_done = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    embeddings_total = Column(Integer, nullable=False, default=0)
+    embeddings_done = Column(Integer, nullable=False, default=0)
+
+    # Scheduling: smaller repos (GitHub size estimate, KB; -1 = unknown) run first.
+    estimated_size_kb = Column(Integer, nullable=True)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    timings_json = Column(Text, nullable=False, default="{}")
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Heartbeat: a running job whose updated_at is older than the lease is requeued.
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    repository = relationship("Repository", back_populates="ingestion_jobs")
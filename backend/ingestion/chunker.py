@@ -12,8 +12,21 @@ logger = logging.getLogger(__name__)
 def chunk_text(text: str) -> List[Tuple[str, int]]:
     """Chunk text into token-limited segments with overlap."""
 
+    return [(text[start:end], token_count) for start, end, token_count in chunk_spans(text)]
+
+
+def chunk_spans(text: str) -> List[Tuple[int, int, int]]:
+    """Chunk text into token-limited segments with overlap.
+
+    Returns (start_char, end_char, token_count) spans into `text`, so chunks can
+    be stored as offsets into the file's blob instead of as copies.
+    """
+
     encoder = tiktoken.get_encoding("cl100k_base")
     tokens = encoder.encode(text)
+    if not tokens:
+        return []
+    _, offsets = encoder.decode_with_offsets(tokens)
     chunks = []
     start = 0
     chunk_size = settings.chunk_size_tokens
@@ -42,9 +55,9 @@ def chunk_text(text: str) -> List[Tuple[str, int]]:
             logger.warning("Max chunks per file reached (%s); truncating chunking", max_chunks)
             break
         end = min(start + chunk_size, len(tokens))
-        chunk_tokens = tokens[start:end]
-        chunk_text = encoder.decode(chunk_tokens)
-        chunks.append((chunk_text, len(chunk_tokens)))
+        start_char = offsets[start]
+        end_char = offsets[end] if end < len(tokens) else len(text)
+        chunks.append((start_char, end_char, end - start))
 
         next_start = end - overlap
         # Ensure forward progress even in pathological settings.
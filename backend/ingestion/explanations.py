@@ -0,0 +1,212 @@
+"""Explanation cache for the file viewer (explain, explain_symbol, why_written).
+
+LLM output is stored in `file_explanations` keyed by (repo, file path, content
+hash, endpoint, level, line range, model). A file unchanged by a re-ingest keeps
+its entries; ingestion prunes the entries of changed or removed files and can
+regenerate the most-requested file explanations right away
+(EXPLAIN_PREGENERATE_FILES).
+"""
+
+import logging
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from settings import settings
+from database import crud
+from database.models import CodeFile
+from rag.llm import generate_answer
+from schemas.api_models import FileExplainResponse
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ("beginner", "intermediate", "expert")
+
+
+def normalize_level(level: Optional[str]) -> str:
+    raw = (level or "").strip().lower()
+    return raw if raw in LEVELS else "intermediate"
+
+
+def _model() -> str:
+    # rag.llm.generate_answer is Groq-only.
+    return settings.groq_model
+
+
+def get_cached(
+    db: Session,
+    code_file: CodeFile,
+    endpoint: str,
+    level: str,
+    start_line: int = 0,
+    end_line: int = 0,
+    *,
+    count_hit: bool = True,
+) -> Optional[FileExplainResponse]:
+    """Cached response for this file version, or None (legacy rows without a hash are never cached)."""
+
+    if not code_file.content_hash:
+        return None
+    hit = crud.get_file_explanation(
+        db,
+        code_file.repo_id,
+        code_file.file_path,
+        code_file.content_hash,
+        endpoint=endpoint,
+        level=level,
+        start_line=start_line,
+        end_line=end_line,
+        model=_model(),
+        count_hit=count_hit,
+    )
+    if hit is None:
+        return None
+    explanation, referenced = hit
+    return FileExplainResponse(explanation=explanation, referenced_chunks=referenced, cached=True)
+
+
+def store(
+    db: Session,
+    code_file: CodeFile,
+    endpoint: str,
+    level: str,
+    response: FileExplainResponse,
+    start_line: int = 0,
+    end_line: int = 0,
+    *,
+    hits: int = 1,
+) -> None:
+    """Cache a generated explanation; error messages and empty answers are not cached."""
+
+    if not code_file.content_hash or response.message or not (response.explanation or "").strip():
+        return
+    crud.save_file_explanation(
+        db,
+        code_file.repo_id,
+        code_file.file_path,
+        code_file.content_hash,
+        endpoint=endpoint,
+        level=level,
+        start_line=start_line,
+        end_line=end_line,
+        model=_model(),
+        explanation=response.explanation,
+        referenced_chunks=response.referenced_chunks,
+        hits=hits,
+    )
+
+
+def generate_file_explanation(db: Session, code_file: CodeFile, level: str) -> FileExplainResponse:
+    """Explain a file from ONLY its indexed chunks (strict file-scoped RAG)."""
+
+    chunks = crud.list_chunks_by_file(db, code_file.id)
+    if not chunks:
+        return FileExplainResponse(message="No indexed code found for this file", referenced_chunks=[])
+
+    # Build a context strictly from this file's chunks.
+    max_tokens = max(200, int(settings.max_context_tokens or 1800))
+    selected_chunks = []
+    token_budget = 0
+    for ch in chunks:
+        if token_budget + int(ch.token_count) > max_tokens:
+            break
+        selected_chunks.append(ch)
+        token_budget += int(ch.token_count)
+
+    if not selected_chunks:
+        # If first chunk is too big, still include it.
+        selected_chunks = [chunks[0]]
+
+    context = "\n\n".join(
+        [f"[chunk_index={c.chunk_index}]\n{crud.get_chunk_text(code_file, c)}" for c in selected_chunks]
+    )
+
+    if level == "beginner":
+        fmt = (
+            "Output format (plain text):\n"
+            "- 6 to 9 bullet points (use '-' bullets).\n"
+            "- Each bullet must be one sentence.\n"
+            "- No preamble, no code blocks.\n"
+            "Style: explain for a new engineer; define acronyms briefly; keep it concrete."
+        )
+    elif level == "expert":
+        fmt = (
+            "Output format (plain text):\n"
+            "- 4 to 7 bullet points (use '-' bullets).\n"
+            "- Each bullet must be one sentence.\n"
+            "- No preamble, no code blocks.\n"
+            "Style: expert concise; focus on invariants, edge cases, and interfaces."
+        )
+    else:
+        fmt = (
+            "Output format (plain text):\n"
+            "- 6 to 9 bullet points (use '-' bullets).\n"
+            "- Each bullet must be one sentence.\n"
+            "- No preamble, no code blocks.\n"
+            "Style: concise but meaningfully informative."
+        )
+
+    system_prompt = (
+        "You are CodeLens AI. Explain the given file using ONLY the provided code context. "
+        "Do not speculate. If the code context is insufficient, say so briefly and only describe what is supported.\n\n"
+        f"{fmt}\n"
+        "Coverage requirements (include what applies): purpose, key responsibilities, important inputs/outputs, "
+        "notable dependencies/integrations, and any important edge cases/assumptions visible in the code."
+    )
+    user_prompt = (
+        f"File: {code_file.file_path}\nLanguage: {code_file.language}\n\n"
+        f"Indexed code context (from this file only):\n{context}\n\n"
+        "Task: Provide the minimal explanation in the required bullet format."
+    )
+
+    try:
+        explanation, _token_usage = generate_answer(
+            system_prompt,
+            user_prompt,
+            max_tokens=512 if level != "expert" else 384,
+            temperature=0.15,
+        )
+    except HTTPException as exc:
+        # Convert provider configuration errors into a safe message payload.
+        return FileExplainResponse(message=str(exc.detail), referenced_chunks=[])
+
+    explanation = (explanation or "").strip()
+    referenced = [int(c.chunk_index) for c in selected_chunks]
+    return FileExplainResponse(explanation=explanation, referenced_chunks=referenced)
+
+
+def refresh_repo_explanations(db: Session, repo_id: int) -> int:
+    """Drop stale cache entries after an ingestion and pre-generate popular ones.
+
+    The EXPLAIN_PREGENERATE_FILES most-requested (file, level) pairs are read
+    before pruning, so files whose content changed keep their place; those
+    without an entry for the new version are explained now and carry over the
+    pair's total hits, which pruning drops with the old versions. Returns the
+    number of explanations generated. Stops at the first LLM error.
+    """
+
+    top = crud.list_top_file_explanations(db, repo_id, settings.explain_pregenerate_files)
+    removed = crud.prune_file_explanations(db, repo_id)
+    if removed:
+        logger.info("Pruned %s stale explanation(s) repo_id=%s", removed, repo_id)
+    if not top:
+        return 0
+
+    files = {f.file_path: f for f in crud.get_files_by_paths(db, repo_id, sorted({path for path, _, _ in top}))}
+    generated = 0
+    for path, level, hits in top:
+        code_file = files.get(path)
+        if code_file is None or get_cached(db, code_file, "explain", level, count_hit=False) is not None:
+            continue
+        try:
+            response = generate_file_explanation(db, code_file, level)
+        except Exception:
+            logger.exception("Explanation pre-generation failed repo_id=%s path=%s", repo_id, path)
+            break
+        if response.message:
+            logger.info("Explanation pre-generation stopped repo_id=%s: %s", repo_id, response.message)
+            break
+        store(db, code_file, "explain", level, response, hits=hits)
+        generated += 1
+    return generated
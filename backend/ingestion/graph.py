@@ -0,0 +1,296 @@
+"""Repository dependency graph (module -> module, function -> function).
+
+Built once per ingestion from the symbol index (`code_symbols` +
+`symbol_references`): a reference to `name` on line L of file F is an edge
+from the innermost definition around L (or from F itself, for module-level
+code) to the definitions `name` can mean given the call's receiver (see
+`_resolver`). References that could mean more than `_MAX_TARGETS`
+definitions (`__init__`, `get`, ...) are too ambiguous and are dropped.
+Module edges are references collapsed to files.
+
+Both graphs are stored as CSR arrays (`indptr`, `indices`, `weights`, edge
+weight = number of references) in `DATA_DIR/repo_<id>.graph.npz`, together
+with the node tables and a PageRank centrality per node. The retriever loads
+the file (cached per mtime) for one-hop expansion of its top hits.
+
+`python -m benchmarks.graph_build` times the build on synthetic repos.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from settings import DATA_DIR
+from database import crud
+
+logger = logging.getLogger(__name__)
+
+_MAX_TARGETS = 3
+_SELF = frozenset({"self", "cls", "this", "super"})
+_PAGERANK_DAMPING = 0.85
+_PAGERANK_ITERATIONS = 30
+
+
+class Csr(NamedTuple):
+    """Adjacency in compressed sparse row form: row i's targets are indices[indptr[i]:indptr[i + 1]]."""
+
+    indptr: np.ndarray
+    indices: np.ndarray
+    weights: np.ndarray
+
+    def row(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    @property
+    def edge_count(self) -> int:
+        return int(self.indices.shape[0])
+
+
+class RepoGraph(NamedTuple):
+    # Function level: node i is code_symbols row symbol_ids[i].
+    symbol_ids: np.ndarray
+    symbol_files: np.ndarray  # index into file_ids (ascending: nodes are grouped by file)
+    symbol_offsets: np.ndarray  # (n, 2) character span in the file
+    calls: Csr  # caller -> callee
+    called_by: Csr  # callee -> caller
+    symbol_rank: np.ndarray
+    # Module level: node j is code_files row file_ids[j].
+    file_ids: np.ndarray
+    imports: Csr  # file -> file it references
+    imported_by: Csr
+    file_rank: np.ndarray
+
+    def symbols_in_span(self, file_id: int, start: int, end: int) -> np.ndarray:
+        """Function nodes of a file whose definition overlaps [start, end)."""
+        j = int(np.searchsorted(self.file_ids, file_id))
+        if j >= len(self.file_ids) or self.file_ids[j] != file_id:
+            return np.zeros(0, dtype=np.int64)
+        lo, hi = np.searchsorted(self.symbol_files, [j, j + 1])
+        spans = self.symbol_offsets[lo:hi]
+        return lo + np.nonzero((spans[:, 0] < end) & (spans[:, 1] > start))[0]
+
+
+def _csr(src: np.ndarray, dst: np.ndarray, n: int) -> Csr:
+    """Deduplicate (src, dst) pairs into a CSR matrix weighted by multiplicity."""
+    if not src.size:
+        return Csr(np.zeros(n + 1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+    keys, counts = np.unique(src.astype(np.int64) * n + dst, return_counts=True)
+    rows = keys // n
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n)))).astype(np.int64)
+    return Csr(indptr, (keys % n).astype(np.int32), counts.astype(np.float32))
+
+
+def _transpose(matrix: Csr, n: int) -> Csr:
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.indptr))
+    order = np.lexsort((rows, matrix.indices))
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(matrix.indices, minlength=n)))).astype(np.int64)
+    return Csr(indptr, rows[order].astype(np.int32), matrix.weights[order])
+
+
+def pagerank(matrix: Csr, n: int) -> np.ndarray:
+    """Weighted PageRank by power iteration (dangling nodes spread uniformly)."""
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.indptr))
+    out_weight = np.bincount(rows, weights=matrix.weights, minlength=n)
+    row_weight = out_weight[rows]
+    share = np.divide(matrix.weights, row_weight, out=np.zeros(len(rows)), where=row_weight > 0)
+    dangling = out_weight == 0
+    rank = np.full(n, 1.0 / n)
+    for _ in range(_PAGERANK_ITERATIONS):
+        spread = np.bincount(matrix.indices, weights=rank[rows] * share, minlength=n)
+        rank = (1 - _PAGERANK_DAMPING) / n + _PAGERANK_DAMPING * (spread + rank[dangling].sum() / n)
+    return (rank / rank.max()).astype(np.float32)
+
+
+def _resolver(symbols: Sequence[tuple], stems: Dict[int, str]):
+    """Map a reference (name, qualifier, source file) to the definitions it can mean.
+
+    A bare name (`f()`) means a function/class, or a method of the same file
+    (Java/JS call their own methods unqualified). `self.f()` / `this.f()` and
+    unknown receivers mean methods; a receiver naming a module (`crud.f()`,
+    `from crud import f`) or a class (`Foo.make()`) means its definitions.
+    """
+
+    by_name: Dict[str, List[int]] = {}
+    for i, symbol in enumerate(symbols):
+        by_name.setdefault(symbol[2], []).append(i)
+    cache: Dict[tuple, Tuple[int, ...]] = {}
+
+    def resolve(name: str, qualifier: Optional[str], file_id: int) -> Tuple[int, ...]:
+        key = (name, qualifier, file_id)
+        found = cache.get(key)
+        if found is not None:
+            return found
+        found = ()
+        candidates = by_name.get(name, ())
+        if candidates:
+            if qualifier is None:
+                matches = [i for i in candidates if symbols[i][3] != "method" or symbols[i][1] == file_id]
+            elif qualifier in _SELF:
+                matches = [i for i in candidates if symbols[i][3] == "method" and symbols[i][1] == file_id]
+                matches = matches or [i for i in candidates if symbols[i][3] == "method"]
+            else:
+                matches = [i for i in candidates if qualifier and (stems.get(symbols[i][1]) == qualifier or symbols[i][4] == qualifier)]
+                matches = matches or [i for i in candidates if symbols[i][3] == "method"]
+            if len(matches) <= _MAX_TARGETS:
+                found = tuple(matches)
+        cache[key] = found
+        return found
+
+    return resolve
+
+
+def build_graph(symbols: Sequence[tuple], references: Sequence[tuple], files: Sequence[tuple]) -> RepoGraph:
+    """Build both graphs from symbol index rows.
+
+    `symbols`: (symbol_id, file_id, name, kind, parent, start_line, end_line, start_offset, end_offset)
+    `references`: (file_id, name, line, qualifier); `files`: (file_id, file_path) of every file.
+    """
+
+    symbols = sorted(symbols, key=lambda s: (int(s[1]), s[5], s[0]))
+    file_ids_arr = np.asarray(sorted({int(f[0]) for f in files} | {int(s[1]) for s in symbols}), dtype=np.int64)
+    file_index = {int(f): i for i, f in enumerate(file_ids_arr)}
+    stems = {int(file_id): PurePosixPath(path).stem for file_id, path, *_ in files}
+    n_files = len(file_ids_arr)
+    n_symbols = len(symbols)
+    resolve = _resolver(symbols, stems)
+
+    symbol_files = np.asarray([file_index[int(s[1])] for s in symbols], dtype=np.int32)
+    # Innermost enclosing definition per (file, line): paint each file's line
+    # table outer-first, so nested definitions overwrite their parents.
+    owners: Dict[int, np.ndarray] = {}
+    per_file: Dict[int, List[int]] = {}
+    for i, symbol in enumerate(symbols):
+        per_file.setdefault(int(symbol[1]), []).append(i)
+    for file_id, idx in per_file.items():
+        idx.sort(key=lambda i: (symbols[i][5], -symbols[i][6]))
+        table = np.full(max(int(symbols[i][6]) for i in idx) + 2, -1, dtype=np.int32)
+        for i in idx:
+            table[int(symbols[i][5]) : int(symbols[i][6]) + 1] = i
+        owners[file_id] = table
+
+    call_src: List[int] = []
+    call_dst: List[int] = []
+    import_src: List[int] = []
+    import_dst: List[int] = []
+    for file_id, name, line, qualifier in references:
+        file_id = int(file_id)
+        found = resolve(name, qualifier, file_id)
+        source_file = file_index.get(file_id)
+        if not found or source_file is None:
+            continue
+        table = owners.get(file_id)
+        caller = int(table[line]) if table is not None and line < len(table) else -1
+        for callee in found:
+            if callee == caller:
+                continue  # recursion
+            target_file = int(symbol_files[callee])
+            if target_file != source_file:
+                import_src.append(source_file)
+                import_dst.append(target_file)
+            if caller >= 0:
+                call_src.append(caller)
+                call_dst.append(callee)
+
+    calls = _csr(np.asarray(call_src, dtype=np.int64), np.asarray(call_dst, dtype=np.int64), n_symbols)
+    imports = _csr(np.asarray(import_src, dtype=np.int64), np.asarray(import_dst, dtype=np.int64), n_files)
+    return RepoGraph(
+        symbol_ids=np.asarray([int(s[0]) for s in symbols], dtype=np.int64),
+        symbol_files=symbol_files,
+        symbol_offsets=np.asarray([(int(s[7]), int(s[8])) for s in symbols], dtype=np.int64).reshape(-1, 2),
+        calls=calls,
+        called_by=_transpose(calls, n_symbols),
+        symbol_rank=pagerank(calls, n_symbols),
+        file_ids=file_ids_arr,
+        imports=imports,
+        imported_by=_transpose(imports, n_files),
+        file_rank=pagerank(imports, n_files),
+    )
+
+
+def graph_path(repo_id: int) -> Path:
+    return DATA_DIR / f"repo_{repo_id}.graph.npz"
+
+
+def graph_arrays(graph: RepoGraph) -> Dict[str, np.ndarray]:
+    """Flat name -> array mapping stored in the .npz file."""
+    arrays = {}
+    for field, value in graph._asdict().items():
+        if isinstance(value, Csr):
+            arrays.update({f"{field}_{part}": array for part, array in value._asdict().items()})
+        else:
+            arrays[field] = value
+    return arrays
+
+
+def save_graph(repo_id: int, graph: RepoGraph) -> Path:
+    """Write the graph atomically (readers never see a partial file)."""
+    path = graph_path(repo_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez(tmp, **graph_arrays(graph))
+    tmp.replace(path)
+    with _cache_lock:
+        _cache.pop(repo_id, None)
+    return path
+
+
+def delete_graph(repo_id: int) -> None:
+    with _cache_lock:
+        _cache.pop(repo_id, None)
+    graph_path(repo_id).unlink(missing_ok=True)
+
+
+_cache: Dict[int, Tuple[float, RepoGraph]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_graph(repo_id: int) -> Optional[RepoGraph]:
+    """The stored graph of a repo (None before its first ingestion with graphs)."""
+    path = graph_path(repo_id)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(repo_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with np.load(path) as data:
+        fields = {}
+        for field in RepoGraph._fields:
+            if f"{field}_indptr" in data:
+                fields[field] = Csr(*(data[f"{field}_{part}"] for part in Csr._fields))
+            else:
+                fields[field] = data[field]
+    graph = RepoGraph(**fields)
+    with _cache_lock:
+        _cache[repo_id] = (mtime, graph)
+    return graph
+
+
+def build_repo_graph(db: Session, repo_id: int) -> RepoGraph:
+    """Build and store a repository's graph from its symbol index."""
+    started = time.perf_counter()
+    symbols = crud.list_symbols_by_repo(db, repo_id)
+    references = crud.list_symbol_references_by_repo(db, repo_id)
+    files = crud.list_files_by_repo(db, repo_id)
+    graph = build_graph(symbols, references, files)
+    save_graph(repo_id, graph)
+    logger.info(
+        "Built graph repo_id=%s symbols=%s calls=%s files=%s imports=%s in %.0fms",
+        repo_id,
+        len(symbols),
+        graph.calls.edge_count,
+        len(files),
+        graph.imports.edge_count,
+        (time.perf_counter() - started) * 1000,
+    )
+    return graph
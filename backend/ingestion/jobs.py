@@ -0,0 +1,495 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from settings import settings
+from database import blob_store, crud
+from database.db import SessionLocal
+from database.models import CodeFile, IngestionJob
+from vectorstore.base import get_vector_store
+from vectorstore.embeddings import embeddings_available
+from .chunker import chunk_spans
+from .explanations import refresh_repo_explanations
+from .file_reader import read_code_files
+from .graph import build_repo_graph
+from .outline import outline_file
+from .risk import RiskScanner
+from .scheduler import EmbeddingBudget
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionError(Exception):
+    """Expected ingestion failure; the message is stored on the job for the UI."""
+
+
+# Ingests with fewer pending files scan risks in-process; starting the
+# pool's interpreters costs more than it saves on them.
+_RISK_POOL_MIN_FILES = 200
+# Vectors are added in memory and the store is saved every this many file
+# batches (and when the stage ends); a crash before a save only loses vectors
+# the resume backfill re-embeds.
+_VECTOR_FLUSH_BATCHES = 10
+
+
+def _elapsed_ms(start: float) -> int:
+    return int((time.perf_counter() - start) * 1000)
+
+
+def _load_timings(job: IngestionJob) -> dict[str, int]:
+    try:
+        data = json.loads(job.timings_json or "{}")
+    except (TypeError, ValueError):
+        return {}
+    return {str(k): int(v or 0) for k, v in data.items()} if isinstance(data, dict) else {}
+
+
+def _add_timing(timings: dict[str, int], key: str, start: float) -> None:
+    timings[key] = timings.get(key, 0) + _elapsed_ms(start)
+
+
+def _set_stage(db: Session, job: IngestionJob, stage: str, timings: dict[str, int]) -> None:
+    crud.update_ingestion_job(db, job, stage=stage, timings_json=json.dumps(timings))
+    logger.info("Ingestion stage job_id=%s repo_id=%s stage=%s", job.id, job.repo_id, stage)
+
+
+def _embeddings_enabled() -> bool:
+    # Embeddings are always optional and must never block ingestion.
+    return embeddings_available()
+
+
+def _clone_repo(repo_url: str, branch: str, dest: Path) -> None:
+    """Shallow-clone a single branch with a timeout and no interactive prompts."""
+
+    cmd = ["git", "clone", "--depth", "1", "--single-branch", "--branch", branch, repo_url, str(dest)]
+    env = dict(os.environ)
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    try:
+        subprocess.run(
+            cmd,
+            check=True,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=int(os.getenv("GIT_CLONE_TIMEOUT_SECONDS", "60")),
+        )
+    except subprocess.TimeoutExpired as exc:
+        raise IngestionError("Repository clone timed out") from exc
+    except subprocess.CalledProcessError as exc:
+        stderr = (exc.stderr or "").strip()
+        logger.error("Repo clone failed rc=%s stderr=%s", exc.returncode, stderr[:5000])
+        # Surface git's own error lines, not progress chatter like "Cloning into ...".
+        reason = " ".join(line for line in stderr.splitlines() if line.startswith(("fatal:", "error:")))
+        raise IngestionError(f"Repository clone failed: {reason[:500] or f'git exit code {exc.returncode}'}") from exc
+
+
+def _embed_and_index(repo_id: int, refs: List[tuple[int, str, str, int]], budget: EmbeddingBudget) -> int:
+    """Embed (chunk_id, file_path, content, token_count) refs and add them to the vector store.
+
+    Each provider batch first takes its token cost from the job's share of the
+    embedding budget. The vectors are added in one unsaved call; the caller
+    flushes the store (a FAISS save rewrites the repo's index and metadata).
+    """
+
+    if not refs:
+        return 0
+
+    from vectorstore.embeddings import embed_texts, get_embedding_provider
+
+    store = get_vector_store()
+    batch_size = max(1, int(settings.embeddings_batch_size))
+    # The token budget caps API spend; an on-box model has nothing to meter.
+    metered = get_embedding_provider().name != "local"
+    usable_vectors: list[list[float]] = []
+    metadata_batch: list[dict] = []
+    for i in range(0, len(refs), batch_size):
+        batch = refs[i : i + batch_size]
+        waited = budget.acquire(sum(int(token_count) for _, _, _, token_count in batch)) if metered else 0.0
+        if waited >= 1.0:
+            logger.info("Embedding budget wait repo_id=%s waited_ms=%s", repo_id, int(waited * 1000))
+
+        vectors = embed_texts([content for _, _, content, _ in batch])
+        for vec, (chunk_id, file_path, _content, token_count) in zip(vectors, batch):
+            usable_vectors.append(vec)
+            metadata_batch.append({"chunk_id": int(chunk_id), "file_path": file_path, "token_count": int(token_count)})
+    if usable_vectors:
+        store.add(repo_id, usable_vectors, metadata_batch, persist=False)
+    return len(usable_vectors)
+
+
+def _flush_vectors(repo_id: int) -> None:
+    try:
+        get_vector_store().flush(repo_id)
+    except Exception:
+        logger.exception("Vector store save failed repo_id=%s", repo_id)
+
+
+def _index_file(relative_path: str, language: str, content: str) -> tuple[Optional[str], list, list]:
+    """Summary, definitions and references of one file (empty on failure)."""
+    try:
+        return outline_file(content, language)
+    except Exception:
+        logger.exception("Symbol extraction failed path=%s", relative_path)
+        return None, [], []
+
+
+def _symbol_rows(repo_id: int, file_id: int, content: str, definitions: list, references: list) -> tuple[list, list]:
+    """Rows for crud.bulk_insert_symbols; definition lines become character offsets."""
+    line_starts = [0] + [match.end() for match in re.finditer("\n", content)]
+    n = len(line_starts)
+    definition_rows = [
+        {
+            "repo_id": repo_id,
+            "file_id": file_id,
+            "name": d.name,
+            "kind": d.kind,
+            "parent": d.parent,
+            "signature": d.signature,
+            "start_line": d.start_line,
+            "end_line": d.end_line,
+            "start_offset": line_starts[min(d.start_line, n) - 1],
+            "end_offset": line_starts[d.end_line] if d.end_line < n else len(content),
+        }
+        for d in definitions
+    ]
+    reference_rows = [
+        {"repo_id": repo_id, "file_id": file_id, "name": r.name, "line": r.line, "qualifier": r.qualifier}
+        for r in references
+    ]
+    return definition_rows, reference_rows
+
+
+def _insert_file_batch(
+    db: Session,
+    repo_id: int,
+    batch: List[tuple[str, str, str]],
+    scanner: RiskScanner,
+) -> List[tuple[int, str, str, int]]:
+    """Chunk a batch of files and stage file, chunk, symbol and risk rows (caller commits).
+
+    File text goes to the blob store; rows keep only the content hash and chunk
+    offsets. The file summary (RAG file context) and the symbol index are built
+    from one parse per file (`outline_file`); risk findings come back from
+    `scanner`. Per-file counters are computed here so metrics endpoints never
+    rescan chunks. Chunks go through the Core bulk insert, which hands back
+    their ids without per-row round trips. Returns (chunk_id, file_path,
+    chunk_text, token_count) refs, ready for embedding.
+    """
+
+    collect_risks = scanner.submit([content for _, _, content in batch])
+    file_rows: List[CodeFile] = []
+    file_chunks: List[List[tuple[int, int, int]]] = []
+    file_texts: List[str] = []
+    file_symbols: List[tuple[list, list]] = []
+    for relative_path, language, content in batch:
+        try:
+            spans = chunk_spans(content)
+        except Exception:
+            logger.exception("Chunking failed repo_id=%s path=%s", repo_id, relative_path)
+            spans = []
+
+        digest, size = blob_store.put_text(content)
+        file_tokens = sum(token_count for _, _, token_count in spans)
+        summary, definitions, references = _index_file(relative_path, language, content)
+        file_chunks.append(spans)
+        file_texts.append(content)
+        file_symbols.append((definitions, references))
+        file_rows.append(
+            CodeFile(
+                repo_id=repo_id,
+                file_path=relative_path,
+                language=language,
+                raw_content="",
+                content_hash=digest,
+                content_size=size,
+                line_count=len(content.splitlines()),
+                chunk_count=len(spans),
+                total_tokens=file_tokens,
+                avg_chunk_tokens=int(file_tokens / len(spans)) if spans else 0,
+                summary=summary,
+            )
+        )
+
+    db.add_all(file_rows)
+    db.flush()  # assign file IDs (and take the write lock for chunk id allocation)
+
+    chunk_rows: List[dict] = []
+    chunk_refs: List[tuple[str, str, int]] = []
+    definition_rows: List[dict] = []
+    reference_rows: List[dict] = []
+    for db_file, spans, content, (definitions, references) in zip(file_rows, file_chunks, file_texts, file_symbols):
+        for idx, (start, end, token_count) in enumerate(spans):
+            chunk_rows.append(
+                {
+                    "file_id": int(db_file.id),
+                    "chunk_index": idx,
+                    "chunk_content": "",
+                    "start_offset": start,
+                    "end_offset": end,
+                    "token_count": token_count,
+                    "search_terms": crud.chunk_search_terms(content[start:end]),
+                }
+            )
+            chunk_refs.append((db_file.file_path, content[start:end], token_count))
+        defs, refs = _symbol_rows(repo_id, int(db_file.id), content, definitions, references)
+        definition_rows.extend(defs)
+        reference_rows.extend(refs)
+
+    chunk_ids = crud.bulk_insert_chunks(db, chunk_rows)
+    crud.bulk_insert_symbols(db, definition_rows, reference_rows)
+    crud.bulk_insert_file_risks(
+        db,
+        [
+            {"file_id": int(db_file.id), "repo_id": repo_id, "findings": findings}
+            for db_file, findings in zip(file_rows, collect_risks())
+        ],
+    )
+    return [
+        (chunk_id, file_path, chunk_text, token_count)
+        for chunk_id, (file_path, chunk_text, token_count) in zip(chunk_ids, chunk_refs)
+    ]
+
+
+def _execute_job(db: Session, job: IngestionJob) -> None:
+    repo_id = int(job.repo_id)
+    attempt_start = time.perf_counter()
+    timings = _load_timings(job)
+    embeddings_enabled = _embeddings_enabled()
+    budget = EmbeddingBudget(settings.embedding_tokens_per_minute)
+    batch_size = max(1, int(settings.ingest_batch_files))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+
+        # 1) Clone repository
+        _set_stage(db, job, "cloning", timings)
+        stage_start = time.perf_counter()
+        _clone_repo(job.repo_url, job.branch, root)
+        _add_timing(timings, "clone_ms", stage_start)
+
+        # 2) Reject large repos
+        repo_size_mb = sum(p.stat().st_size for p in root.rglob("*") if p.is_file()) / (1024 * 1024)
+        if repo_size_mb > settings.max_repo_size_mb:
+            raise IngestionError(
+                f"Repository too large ({repo_size_mb:.1f} MB > {settings.max_repo_size_mb} MB limit)"
+            )
+
+        # 3) Read files (sorted so batches are stable across attempts)
+        _set_stage(db, job, "reading", timings)
+        stage_start = time.perf_counter()
+        code_files = sorted(read_code_files(root), key=lambda item: item[0])
+        _add_timing(timings, "read_ms", stage_start)
+        if not code_files:
+            raise IngestionError("No readable source files found")
+
+    # Stored files whose content is unchanged are kept (resume checkpoint and
+    # incremental re-ingestion); changed or vanished files are dropped along
+    # with their vectors, then re-chunked below.
+    stored = crud.list_file_hashes_by_repo(db, repo_id)
+    current = {path: blob_store.content_hash(content) for path, _, content in code_files}
+    stale = [path for path, digest in stored.items() if current.get(path) != digest]
+    if stale:
+        try:
+            stale_hashes = crud.delete_files_by_paths(db, repo_id, stale)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        try:
+            get_vector_store().delete_files(repo_id, stale)
+        except Exception:
+            logger.warning("Failed to delete vectors for changed files repo_id=%s", repo_id)
+        try:
+            blob_store.delete_blobs(crud.filter_unreferenced_hashes(db, stale_hashes))
+        except Exception:
+            logger.warning("Failed to delete unreferenced blobs repo_id=%s", repo_id)
+    stale_paths = set(stale)
+    committed_paths = {path for path in stored if path not in stale_paths}
+    pending = [item for item in code_files if item[0] not in committed_paths]
+    if committed_paths or stale:
+        logger.info(
+            "Ingestion incremental job_id=%s repo_id=%s unchanged_files=%s dropped_files=%s pending_files=%s",
+            job.id,
+            repo_id,
+            len(committed_paths),
+            len(stale),
+            len(pending),
+        )
+    crud.update_ingestion_job(
+        db,
+        job,
+        files_total=len(code_files),
+        files_done=len(code_files) - len(pending),
+        chunks_done=crud.count_chunks_by_repo(db, repo_id),
+    )
+
+    # Vectors for chunks committed before a crash may never have reached the vector store.
+    if embeddings_enabled and committed_paths:
+        indexed_ids = get_vector_store().indexed_chunk_ids(repo_id)
+        missing = crud.list_chunk_refs_by_repo(db, repo_id, exclude_ids=indexed_ids)
+        if missing:
+            _set_stage(db, job, "embedding", timings)
+            stage_start = time.perf_counter()
+            try:
+                done = _embed_and_index(repo_id, missing, budget)
+                get_vector_store().flush(repo_id)
+                crud.update_ingestion_job(
+                    db,
+                    job,
+                    embeddings_total=len(indexed_ids) + len(missing),
+                    embeddings_done=len(indexed_ids) + done,
+                )
+            except Exception:
+                logger.exception("Embeddings backfill failed repo_id=%s; continuing lexical-only", repo_id)
+                embeddings_enabled = False
+            _add_timing(timings, "embed_ms", stage_start)
+        else:
+            crud.update_ingestion_job(db, job, embeddings_total=len(indexed_ids), embeddings_done=len(indexed_ids))
+
+    # 4) Chunk + insert in batches; each commit is a checkpoint. Risk heuristics
+    # for a batch run in the scanner's process pool while it is chunked.
+    scanner = RiskScanner(1 if len(pending) < _RISK_POOL_MIN_FILES else None)
+    try:
+        for offset in range(0, len(pending), batch_size):
+            batch = pending[offset : offset + batch_size]
+
+            _set_stage(db, job, "chunking", timings)
+            stage_start = time.perf_counter()
+            try:
+                chunk_refs = _insert_file_batch(db, repo_id, batch, scanner)
+                crud.update_ingestion_job(
+                    db,
+                    job,
+                    commit=False,
+                    files_done=int(job.files_done or 0) + len(batch),
+                    chunks_done=int(job.chunks_done or 0) + len(chunk_refs),
+                    embeddings_total=int(job.embeddings_total or 0) + (len(chunk_refs) if embeddings_enabled else 0),
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("DB batch insert failed job_id=%s repo_id=%s", job.id, repo_id)
+                raise
+            _add_timing(timings, "chunk_ms", stage_start)
+
+            # 5) Optional embeddings generation + vector store insertion
+            if embeddings_enabled and chunk_refs:
+                _set_stage(db, job, "embedding", timings)
+                stage_start = time.perf_counter()
+                try:
+                    done = _embed_and_index(repo_id, chunk_refs, budget)
+                    if (offset // batch_size + 1) % _VECTOR_FLUSH_BATCHES == 0:
+                        get_vector_store().flush(repo_id)
+                    crud.update_ingestion_job(db, job, embeddings_done=int(job.embeddings_done or 0) + done)
+                except Exception:
+                    logger.exception("Embeddings generation failed repo_id=%s; continuing lexical-only", repo_id)
+                    embeddings_enabled = False
+                _add_timing(timings, "embed_ms", stage_start)
+    finally:
+        scanner.close()
+        _flush_vectors(repo_id)
+
+    if not int(job.chunks_done or 0):
+        raise IngestionError("No chunks produced")
+
+    if not embeddings_enabled:
+        logger.info("Embeddings disabled repo_id=%s (lexical-only)", repo_id)
+
+    # 6) Dependency graph over the whole repo's symbol index, then counters
+    _set_stage(db, job, "finalizing", timings)
+    stage_start = time.perf_counter()
+    try:
+        build_repo_graph(db, repo_id)
+    except Exception:
+        logger.exception("Graph build failed repo_id=%s; retrieval runs without expansion", repo_id)
+    _add_timing(timings, "graph_ms", stage_start)
+    _add_timing(timings, "total_ms", attempt_start)
+    crud.recompute_repo_counters(db, repo_id, status="indexed", ingestion_time_ms=timings.get("total_ms", 0))
+    crud.update_ingestion_job(
+        db,
+        job,
+        state="succeeded",
+        stage="done",
+        finished_at=datetime.utcnow(),
+        timings_json=json.dumps(timings),
+    )
+    logger.info(
+        "Ingestion complete job_id=%s repo_id=%s files=%s chunks=%s elapsed_ms=%s",
+        job.id,
+        repo_id,
+        job.files_total,
+        job.chunks_done,
+        _elapsed_ms(attempt_start),
+    )
+
+    # 7) Explanation cache: drop entries of changed files and, optionally,
+    # regenerate the most-requested ones. The job already reads as done.
+    try:
+        generated = refresh_repo_explanations(db, repo_id)
+        if generated:
+            logger.info("Pre-generated %s file explanation(s) repo_id=%s", generated, repo_id)
+    except Exception:
+        db.rollback()
+        logger.exception("Explanation cache refresh failed repo_id=%s", repo_id)
+
+
+def _fail_job(db: Session, job: IngestionJob, message: str) -> None:
+    try:
+        crud.update_ingestion_job(db, job, state="failed", error=message, finished_at=datetime.utcnow())
+        crud.recompute_repo_counters(db, int(job.repo_id), status="failed")
+    except Exception:
+        db.rollback()
+        logger.exception("Failed to record ingestion failure job_id=%s", job.id)
+
+
+def run_ingestion_job(job_id: int) -> None:
+    """Run or resume an ingestion job. Must not raise into the caller."""
+
+    db: Session = SessionLocal()
+    try:
+        job = crud.get_ingestion_job(db, job_id)
+        if not job or job.state not in crud.ACTIVE_INGESTION_STATES:
+            return
+
+        repo = crud.get_repo_by_id_any(db, job.repo_id)
+        if not repo or repo.user_id != job.user_id:
+            logger.warning("Ingestion job abort job_id=%s repo_id=%s (missing or forbidden)", job.id, job.repo_id)
+            crud.update_ingestion_job(
+                db, job, state="cancelled", error="Repository missing or not owned by user", finished_at=datetime.utcnow()
+            )
+            return
+
+        crud.update_ingestion_job(
+            db,
+            job,
+            state="running",
+            attempts=int(job.attempts or 0) + 1,
+            started_at=job.started_at or datetime.utcnow(),
+            error=None,
+        )
+        logger.info("Ingestion start job_id=%s repo_id=%s url=%s branch=%s", job.id, job.repo_id, job.repo_url, job.branch)
+
+        try:
+            _execute_job(db, job)
+        except IngestionError as exc:
+            db.rollback()
+            logger.warning("Ingestion failed job_id=%s repo_id=%s: %s", job.id, job.repo_id, exc)
+            _fail_job(db, job, str(exc))
+        except Exception as exc:
+            db.rollback()
+            logger.exception("Ingestion crashed job_id=%s repo_id=%s", job.id, job.repo_id)
+            _fail_job(db, job, f"Unexpected error: {type(exc).__name__}")
+    except Exception:
+        logger.exception("Ingestion job runner failed job_id=%s", job_id)
+    finally:
+        db.close()
@@ -0,0 +1,431 @@
+"""Definitions and file summaries computed from source text at ingest time.
+
+`extract_definitions` finds classes, functions and methods with their
+signatures and line ranges: Python through `ast`, other languages through a
+line scanner (declaration regexes plus brace or indentation matching).
+`extract_symbols` adds the call sites and imported names of a file, which
+ingestion stores as the repo's symbol index. `summarize_file` turns the
+definitions into a short outline the RAG pipeline sends instead of a raw file
+prefix. `outline_file` does both from one parse.
+"""
+
+import ast
+import re
+import tokenize
+from typing import List, NamedTuple, Optional, Tuple
+
+from settings import settings
+
+
+class Definition(NamedTuple):
+    name: str
+    kind: str  # class | type | function | method
+    signature: str
+    start_line: int  # 1-based, inclusive
+    end_line: int
+    parent: Optional[str] = None
+
+
+class Reference(NamedTuple):
+    name: str
+    line: int  # 1-based
+    # Receiver of an attribute call (`crud` in `crud.f()`), "" when it is an
+    # expression (`a().f()`), None for a bare name (`f()`, `from m import f`
+    # stores the module's last part).
+    qualifier: Optional[str] = None
+
+
+_BRACE_LANGUAGES = {
+    "js", "jsx", "mjs", "cjs", "ts", "tsx", "java", "c", "h", "cpp", "hpp", "cc", "cs",
+    "go", "rs", "swift", "kt", "kts", "scala", "php", "dart",
+}
+_INDENT_LANGUAGES = {"rb", "ex", "exs", "lua", "pl"}
+_CLASS_KEYWORDS = {"class", "object", "module"}
+
+_CLASS_DECL = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|internal\s+|abstract\s+|final\s+"
+    r"|sealed\s+|static\s+|data\s+|pub(?:\([^)]*\))?\s+)*"
+    r"(class|interface|struct|enum|trait|impl|object|module|type)\s+([A-Za-z_$][\w$]*)"
+)
+_FUNC_DECL = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:public\s+|private\s+|protected\s+|internal\s+|static\s+|async\s+"
+    r"|override\s+|abstract\s+|final\s+|inline\s+|suspend\s+|unsafe\s+|pub(?:\([^)]*\))?\s+)*"
+    r"(?:function\*?|func|fn|def|fun|sub)\s+(?:\([^)]*\)\s*)?([A-Za-z_$][\w$]*[!?]?)"
+)
+# `const name = (args) =>` / `name: function (` / `name = async (args) =>`
+_ARROW_DECL = re.compile(
+    r"^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=]+)?=\s*(?:async\s+)?"
+    r"(?:function\b|\([^)]*\)\s*(?::[^=]+)?=>|[A-Za-z_$][\w$]*\s*=>)"
+)
+_IDENT_BEFORE_PAREN = re.compile(r"([A-Za-z_]\w*)\s*$")
+_NOT_A_FUNCTION = {"if", "for", "while", "switch", "catch", "return", "else", "new", "sizeof", "do", "try"}
+_CALL = re.compile(r"(?<![\w$])([A-Za-z_$][\w$]*)\s*\(")
+_NOT_A_CALL = _NOT_A_FUNCTION | {
+    "function", "func", "fn", "def", "fun", "sub", "elif", "and", "or", "not", "in", "is", "await", "typeof",
+    "with", "assert", "print", "super", "self", "this", "lambda", "yield", "throw", "foreach", "until", "unless",
+}
+# Cap per file so generated sources cannot flood the reference table.
+_MAX_REFERENCES = 2000
+_STRING_LITERAL = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`[^`]*`")
+_LICENSE = re.compile(r"licen[cs]e|copyright|spdx|all rights reserved|\(c\)", re.IGNORECASE)
+_COMMENT_PREFIX = re.compile(r"^\s*(?://+|#+|/\*+|\*+/?|--|;+)\s?")
+_IMPORT_NAME = re.compile(
+    r"^\s*(?:import\s+(?:[\w*{}, ]+\s+from\s+)?[\"']?([\w@./-]+)|from\s+([\w.]+)\s+import\b"
+    r"|#\s*include\s+[<\"]([\w./-]+)|use\s+([\w:]+)|require\([\"']([\w@./-]+))"
+)
+
+
+def _one_line(text: str, limit: int = 160) -> str:
+    flat = " ".join(text.split())
+    return flat if len(flat) <= limit else flat[: limit - 3] + "..."
+
+
+def _typed_declaration(line: str, bare: bool = False) -> Optional[str]:
+    """Name in a Java/C#/C++ style `Type name(args) {` line, else None.
+
+    With `bare`, `name(args) {` (a JS/TS class method) also counts.
+
+    Plain string checks rather than one regex, so long lines cannot backtrack.
+    """
+    stripped = line.strip()
+    paren = stripped.find("(")
+    if paren <= 0 or not stripped.endswith(("{", ")")) or ";" in stripped:
+        return None
+    head = stripped[:paren]
+    if not head.strip() or "=" in head or "." in head:
+        return None
+    match = _IDENT_BEFORE_PAREN.search(head)
+    if not match or not (bare or head[: match.start()].strip()):
+        return None  # a call (`foo(x) {`) has no return type before the name
+    first = head.split()[0]
+    if first in _NOT_A_FUNCTION or match.group(1) in _NOT_A_FUNCTION:
+        return None
+    return match.group(1)
+
+
+_OPENING = {"(", "[", "{"}
+_CLOSING = {")", "]", "}"}
+
+
+def _header_lines(lines: List[str]) -> Optional[List[str]]:
+    """`lines` up to (not including) the header's `:`, comments removed; None if not found."""
+    depth = 0
+    cut: Optional[Tuple[int, int]] = None
+    comments: dict = {}  # line -> column where its comment starts
+    readline = iter(line + "\n" for line in lines).__next__
+    try:
+        for token in tokenize.generate_tokens(readline):
+            if token.type == tokenize.COMMENT:
+                comments[token.start[0]] = token.start[1]
+            elif token.type == tokenize.OP:
+                if token.string in _OPENING:
+                    depth += 1
+                elif token.string in _CLOSING:
+                    depth -= 1
+                elif token.string == ":" and depth == 0:
+                    cut = token.start
+                    break
+    except (tokenize.TokenError, SyntaxError):
+        return None
+    if cut is None:
+        return None
+    out = [line[: comments[row]] if row in comments else line for row, line in enumerate(lines[: cut[0]], start=1)]
+    out[-1] = out[-1][: cut[1]]
+    return out
+
+
+def _python_signature(node, lines: List[str]) -> str:
+    """Source of a def/class header up to its colon, without comments, flattened to one line."""
+    start = node.lineno - 1
+    body_start = node.body[0].lineno - 1 if node.body else start
+    header_lines = _header_lines(lines[start : max(start, body_start) + 1])
+    if header_lines is None:
+        header_lines = lines[start : max(start + 1, body_start)]
+    header = " ".join(line.strip() for line in header_lines).strip()
+    header = header.replace("( ", "(").replace(", )", ")")
+    if header.endswith(":"):
+        header = header[:-1]
+    return _one_line(header)
+
+
+def _parse_python(text: str) -> Optional[ast.Module]:
+    try:
+        return ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+
+
+def python_definitions(text: str, tree: Optional[ast.Module] = None) -> List[Definition]:
+    """Classes, functions and methods of a Python module (empty on syntax errors)."""
+    tree = tree or _parse_python(text)
+    if tree is None:
+        return []
+    lines = text.splitlines()
+    out: List[Definition] = []
+
+    def visit(body, parent: Optional[str], in_class: bool) -> None:
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                out.append(
+                    Definition(
+                        node.name, "class", _python_signature(node, lines), node.lineno, node.end_lineno or node.lineno, parent
+                    )
+                )
+                visit(node.body, node.name, True)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "method" if in_class else "function"
+                out.append(
+                    Definition(
+                        node.name, kind, _python_signature(node, lines), node.lineno, node.end_lineno or node.lineno, parent
+                    )
+                )
+                visit(node.body, node.name, False)
+
+    visit(tree.body, None, False)
+    return out
+
+
+def _brace_end(lines: List[str], start: int) -> int:
+    """Index of the line closing the block opened at/after `start` (same line if none opens)."""
+    depth = 0
+    opened = False
+    for i in range(start, len(lines)):
+        code = _STRING_LITERAL.sub("", lines[i].split("//", 1)[0])
+        for ch in code:
+            if ch == "{":
+                depth += 1
+                opened = True
+            elif ch == "}":
+                depth -= 1
+                if opened and depth <= 0:
+                    return i
+        if not opened and (code.rstrip().endswith(";") or i - start >= 3):
+            return start  # declaration without a body (prototype, abstract, type alias)
+    return len(lines) - 1
+
+
+def _indent_end(lines: List[str], start: int) -> int:
+    base = len(lines[start]) - len(lines[start].lstrip())
+    end = start
+    for i in range(start + 1, len(lines)):
+        line = lines[i]
+        if not line.strip():
+            continue
+        indent = len(line) - len(line.lstrip())
+        if indent <= base:
+            return i if line.strip() in ("end", "}") else end
+        end = i
+    return end
+
+
+def scan_definitions(text: str, language: str) -> List[Definition]:
+    """Line-scanner fallback for non-Python sources (brace or indentation languages)."""
+    brace = language in _BRACE_LANGUAGES
+    if not brace and language not in _INDENT_LANGUAGES and language != "py":
+        return []
+    lines = text.splitlines()
+    out: List[Definition] = []
+    scopes: List[tuple] = []  # (name, end_index) of enclosing classes
+    for i, line in enumerate(lines):
+        if len(line) > 1000:
+            continue  # minified or generated; not worth scanning
+        while scopes and i > scopes[-1][1]:
+            scopes.pop()
+        name = kind = None
+        match = _CLASS_DECL.match(line)
+        if match:
+            name = match.group(2)
+            kind = "class" if match.group(1) in _CLASS_KEYWORDS else "type"
+        else:
+            match = _FUNC_DECL.match(line) or _ARROW_DECL.match(line)
+            if match and match.group(1) not in _NOT_A_FUNCTION:
+                name, kind = match.group(1), "function"
+            elif brace and language not in ("go", "rs"):
+                untyped = language in ("js", "jsx", "mjs", "cjs")
+                if not untyped or scopes:
+                    name = _typed_declaration(line, bare=bool(scopes) and (untyped or language in ("ts", "tsx")))
+                    kind = "function" if name else None
+        if not name:
+            continue
+        end = _brace_end(lines, i) if brace else _indent_end(lines, i)
+        parent = scopes[-1][0] if scopes else None
+        if kind == "function" and parent:
+            kind = "method"
+        out.append(Definition(name, kind, _one_line(line.strip().rstrip("{").strip()), i + 1, end + 1, parent))
+        if kind in ("class", "type") and end > i:
+            scopes.append((name, end))
+    return out
+
+
+def python_references(tree: ast.Module) -> List[Reference]:
+    """Called names (`f(...)`, `obj.f(...)`) and names imported with `from x import f`."""
+    out = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name):
+                out.append(Reference(func.id, node.lineno))
+            elif isinstance(func, ast.Attribute):
+                receiver = func.value
+                qualifier = receiver.id if isinstance(receiver, ast.Name) else ""
+                out.append(Reference(func.attr, node.lineno, qualifier))
+        elif isinstance(node, ast.ImportFrom):
+            module = (node.module or "").rpartition(".")[2] or None
+            out.extend(Reference(alias.name, node.lineno, module) for alias in node.names if alias.name != "*")
+    return out
+
+
+def _receiver(code: str, start: int) -> Optional[str]:
+    """Qualifier of the call name at `start`: `a` in `a.f(`, `a->f(`, `A::f(`."""
+    i = start
+    while i > 0 and code[i - 1] == " ":
+        i -= 1
+    if code[i - 1 : i] == ".":
+        i -= 1
+    elif code[max(0, i - 2) : i] in ("->", "::"):
+        i -= 2
+    else:
+        return None
+    while i > 0 and code[i - 1] == " ":
+        i -= 1
+    end = i
+    while i > 0 and (code[i - 1].isalnum() or code[i - 1] in "_$"):
+        i -= 1
+    word = code[i:end]
+    return word if word.isidentifier() else ""
+
+
+def scan_references(text: str, definitions: List[Definition]) -> List[Reference]:
+    """Call sites found by the line scanner (`name(`), skipping each definition's own line."""
+    declared = {(d.start_line, d.name) for d in definitions}
+    out = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if len(line) > 1000:
+            continue
+        code = _STRING_LITERAL.sub("", line.split("//", 1)[0])
+        for match in _CALL.finditer(code):
+            name = match.group(1)
+            if name not in _NOT_A_CALL and (number, name) not in declared:
+                out.append(Reference(name, number, _receiver(code, match.start())))
+    return out
+
+
+def extract_definitions(text: str, language: str) -> List[Definition]:
+    """Definitions in a source file; `language` is the file extension (see file_reader)."""
+    return extract_symbols(text, language, references=False)[0]
+
+
+def extract_symbols(
+    text: str,
+    language: str,
+    references: bool = True,
+    tree: Optional[ast.Module] = None,
+) -> Tuple[List[Definition], List[Reference]]:
+    """Definitions and references (deduplicated by name and line, capped) of a source file.
+
+    `tree` is the already parsed module of a Python file, if any.
+    """
+    language = (language or "").lower()
+    if not text:
+        return [], []
+    if tree is None and language == "py":
+        tree = _parse_python(text)
+    if tree is not None:
+        definitions = python_definitions(text, tree)
+        found = python_references(tree) if references else []
+    elif language in _BRACE_LANGUAGES or language in _INDENT_LANGUAGES or language == "py":
+        definitions = scan_definitions(text, language)
+        found = scan_references(text, definitions) if references else []
+    else:
+        return [], []
+    unique = sorted(set(found), key=lambda ref: (ref.line, ref.name, ref.qualifier or ""))
+    return definitions, unique[:_MAX_REFERENCES]
+
+
+def _description(text: str, language: str, tree: Optional[ast.Module] = None) -> str:
+    """Module docstring or first non-license leading comment, one line."""
+    if language == "py":
+        tree = tree or _parse_python(text)
+        doc = ast.get_docstring(tree) if tree is not None else None
+        if doc:
+            return _one_line(doc.strip().split("\n\n", 1)[0], 240)
+
+    block: List[str] = []
+    for line in text.splitlines()[:60]:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#!"):
+            if block:
+                if not _LICENSE.search(" ".join(block)):
+                    break
+                block = []
+            continue
+        if not _COMMENT_PREFIX.match(line) or stripped.startswith("#include"):
+            break
+        content = _COMMENT_PREFIX.sub("", line).strip(" */")
+        if content:
+            block.append(content)
+    if block and not _LICENSE.search(" ".join(block)):
+        return _one_line(" ".join(block), 240)
+    return ""
+
+
+def _imports(text: str, limit: int = 10) -> List[str]:
+    names: List[str] = []
+    for line in text.splitlines()[:200]:
+        match = _IMPORT_NAME.match(line)
+        if match:
+            name = next(group for group in match.groups() if group)
+            if name not in names:
+                names.append(name)
+            if len(names) >= limit:
+                break
+    return names
+
+
+def summarize_file(
+    language: str,
+    text: str,
+    definitions: Optional[List[Definition]] = None,
+    max_chars: Optional[int] = None,
+    tree: Optional[ast.Module] = None,
+) -> str:
+    """Short outline of a file: description, imports and definition signatures.
+
+    The path is not repeated in the text; callers label it (`File: <path>`).
+    `tree` is the already parsed module of a Python file, if any.
+    """
+    max_chars = int(max_chars or settings.file_summary_max_chars)
+    language = (language or "").lower()
+    if definitions is None:
+        definitions = extract_definitions(text, language)
+
+    lines = [f"Language: {language or 'text'}, {len(text.splitlines())} lines"]
+    description = _description(text, language, tree)
+    if description:
+        lines.append(description)
+    imports = _imports(text)
+    if imports:
+        lines.append("Imports: " + ", ".join(imports))
+    if definitions:
+        lines.append("Defines:")
+        for definition in definitions:
+            indent = "  " if definition.parent else ""
+            lines.append(f"{indent}- {definition.signature} (L{definition.start_line}-{definition.end_line})")
+
+    out: List[str] = []
+    used = 0
+    for line in lines:
+        if used + len(line) + 1 > max_chars:
+            out.append("...")
+            break
+        out.append(line)
+        used += len(line) + 1
+    return "\n".join(out)
+
+
+def outline_file(text: str, language: str) -> Tuple[str, List[Definition], List[Reference]]:
+    """Summary, definitions and references of a file (what ingestion stores), parsing Python once."""
+    language = (language or "").lower()
+    tree = _parse_python(text) if language == "py" and text else None
+    definitions, references = extract_symbols(text, language, tree=tree)
+    return summarize_file(language, text, definitions, tree=tree), definitions, references
@@ -1,65 +1,53 @@
+import json
 import logging
 import re
-import subprocess
-import tempfile
-import time
+from datetime import datetime
 from pathlib import Path
 from typing import List
 import os
-import json
 
+import numpy as np
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from auth.dependencies import get_current_user
 from settings import DATA_DIR, settings
-from database import crud
-from database.db import get_db
-from database.db import SessionLocal
+from database import blob_store, crud
+from database.db import get_db, get_read_db
 from database.models import CodeChunk, CodeFile
 from schemas.api_models import RepoFilesResponse, RepoIngestRequest, RepoResponse, FileResponse, FileContentResponse
-from schemas.api_models import RepoIngestResponse, RepoReingestRequest
+from schemas.api_models import IngestionStatusResponse, RepoIngestResponse, RepoReingestRequest
 from schemas.api_models import (
     FileExplainRequest,
     FileExplainResponse,
     FileExplainSymbolRequest,
     FileMetricsResponse,
+    GraphEdgeResponse,
+    GraphNodeResponse,
     RepoAnalyticsResponse,
+    RepoGraphResponse,
+    SymbolDefinitionResponse,
+    SymbolLookupResponse,
+    SymbolReferenceResponse,
     WhyWrittenRequest,
 )
-from vectorstore.faiss_index import add_embeddings
-from .file_reader import read_code_files
-from .chunker import chunk_text
 from rag.llm import generate_answer
+from . import explanations, risk
+from .graph import delete_graph, load_graph
+from .outline import extract_definitions
+from .scheduler import estimate_job_size
+from vectorstore.base import get_vector_store
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/repos", tags=["repos"])
 
 
-def _cleanup_repo_record(repo_id: int) -> None:
-    """Best-effort cleanup for failed ingestions (delete repo + cascade files/chunks)."""
-    cleanup_db: Session = SessionLocal()
-    try:
-        crud.delete_repo(cleanup_db, repo_id)
-    except Exception:
-        logger.exception("Repo cleanup failed repo_id=%s", repo_id)
-    finally:
-        cleanup_db.close()
-
-
 def _stats_path(repo_id: int) -> Path:
     return DATA_DIR / f"repo_{repo_id}.stats.json"
 
 
-def _write_repo_stats(repo_id: int, stats: dict) -> None:
-    try:
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        _stats_path(repo_id).write_text(json.dumps(stats), encoding="utf-8")
-    except Exception:
-        logger.exception("Failed to write repo stats repo_id=%s", repo_id)
-
-
 def _read_repo_stats(repo_id: int) -> dict:
+    """Read the legacy per-repo stats JSON (repos ingested before counter columns)."""
     try:
         path = _stats_path(repo_id)
         if not path.exists():
@@ -70,37 +58,62 @@ def _read_repo_stats(repo_id: int) -> dict:
         return {}
 
 
+def _require_repo_owner(db: Session, repo_id: int, user_id: int) -> None:
+    """404 if the repository does not exist, 403 if it belongs to another user.
+
+    Reads only `user_id` (covered by an index) instead of loading the repo row.
+    """
+    owner_id = crud.get_repo_owner_id(db, repo_id)
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    if owner_id != user_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+def _delete_unreferenced_blobs(db: Session, content_hashes: set[str]) -> None:
+    """Best-effort removal of blobs no other file references (blobs are shared across repos)."""
+    try:
+        blob_store.delete_blobs(crud.filter_unreferenced_hashes(db, content_hashes))
+    except Exception:
+        logger.warning("Failed to delete unreferenced blobs")
+
+
 def _reset_repo_data(db: Session, repo_id: int) -> None:
-    """Delete indexed files, chunks, stats, and FAISS index for a repo.
+    """Delete indexed files, chunks, symbols, stats, and vectors for a repo.
 
     Used when re-running ingestion so we don't duplicate rows or vectors.
     """
 
-    # Delete chunks first (FK to files), then files themselves.
+    # Delete chunks first (FK to files), then files themselves, and zero the counters.
     try:
+        content_hashes = crud.list_content_hashes_by_repo(db, repo_id)
         file_ids_subq = db.query(CodeFile.id).filter(CodeFile.repo_id == repo_id).subquery()
+        crud.delete_symbols_by_repo(db, repo_id)
+        crud.delete_file_risks_by_repo(db, repo_id)
         db.query(CodeChunk).filter(CodeChunk.file_id.in_(file_ids_subq)).delete(synchronize_session=False)
         db.query(CodeFile).filter(CodeFile.repo_id == repo_id).delete(synchronize_session=False)
+        crud.reset_repo_counters(db, repo_id)
         db.commit()
     except Exception:
         db.rollback()
         logger.exception("Failed to clear existing repo data repo_id=%s", repo_id)
         raise
 
-    # Best-effort cleanup of stats file and FAISS index.
+    _delete_unreferenced_blobs(db, content_hashes)
+
+    # Best-effort cleanup of stats/graph files and vectors.
     try:
         stats_file = _stats_path(repo_id)
         if stats_file.exists():
             stats_file.unlink()
+        delete_graph(repo_id)
     except Exception:
-        logger.warning("Failed to delete stats file during reset repo_id=%s", repo_id)
+        logger.warning("Failed to delete stats/graph files during reset repo_id=%s", repo_id)
 
     try:
-        from vectorstore.faiss_index import delete_index
-
-        delete_index(DATA_DIR, repo_id)
+        get_vector_store().delete_repo(repo_id)
     except Exception:
-        logger.warning("Failed to delete FAISS index during reset repo_id=%s", repo_id)
+        logger.warning("Failed to delete vectors during reset repo_id=%s", repo_id)
 
 
 def _validate_repo_url(url: str) -> None:
@@ -122,7 +135,7 @@ def ingest_repo(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    """Start ingestion in the background and return immediately."""
+    """Enqueue an ingestion job for the worker pool and return immediately."""
     _validate_repo_url(payload.repo_url)
     repo_name = _repo_name_from_url(payload.repo_url)
 
@@ -131,17 +144,18 @@ def ingest_repo(
     # Create the repository record immediately so the UI can display it as "processing".
     try:
         repo = crud.create_repo(db, current_user.id, payload.repo_url, repo_name)
+        job = crud.create_ingestion_job(
+            db,
+            repo_id=repo.id,
+            user_id=current_user.id,
+            repo_url=payload.repo_url,
+            branch=payload.branch or "main",
+        )
     except Exception as exc:
         logger.exception("DB repo create failed")
         raise HTTPException(status_code=500, detail="Failed to create repository record") from exc
-
-    background_tasks.add_task(
-        _run_ingestion_task,
-        repo_id=repo.id,
-        repo_url=payload.repo_url,
-        branch=payload.branch,
-        user_id=current_user.id,
-    )
+    # Size probe for queue priority, after the response is sent.
+    background_tasks.add_task(estimate_job_size, job.id)
 
     # Keep response shape backward compatible, but indicate async start.
     return RepoIngestResponse(
@@ -154,6 +168,7 @@ def ingest_repo(
         created_at=repo.created_at.isoformat(),
         status="started",
         file_count=0,
+        job_id=job.id,
     )
 
 
@@ -167,8 +182,9 @@ def reingest_repo(
 ):
     """Re-run ingestion for an existing repository.
 
-    This clears previously indexed files/chunks and associated vector indexes,
-    then schedules a fresh ingestion run using the stored repo_url.
+    By default the job is incremental: files whose content is unchanged keep
+    their chunks and vectors, and only changed/new/removed files are touched.
+    With `full=true` all indexed data is cleared first.
     """
 
     repo = crud.get_repo_by_id_any(db, repo_id)
@@ -180,18 +196,24 @@ def reingest_repo(
     branch = payload.branch or "main"
     _validate_repo_url(repo.repo_url)
 
+    if crud.get_active_ingestion_job(db, repo_id):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Ingestion already in progress")
+
     try:
-        _reset_repo_data(db, repo_id)
+        if payload.full:
+            _reset_repo_data(db, repo_id)
+        else:
+            crud.recompute_repo_counters(db, repo_id, status="processing")
+        job = crud.create_ingestion_job(
+            db,
+            repo_id=repo.id,
+            user_id=current_user.id,
+            repo_url=repo.repo_url,
+            branch=branch,
+        )
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to reset repository before re-ingestion")
-
-    background_tasks.add_task(
-        _run_ingestion_task,
-        repo_id=repo.id,
-        repo_url=repo.repo_url,
-        branch=branch,
-        user_id=current_user.id,
-    )
+    background_tasks.add_task(estimate_job_size, job.id)
 
     return RepoIngestResponse(
         repo_id=repo.id,
@@ -203,290 +225,87 @@ def reingest_repo(
         created_at=repo.created_at.isoformat(),
         status="reingest_started",
         file_count=0,
+        job_id=job.id,
     )
 
 
-def _run_ingestion_task(repo_id: int, repo_url: str, branch: str, user_id: int) -> None:
-    """Background ingestion task. Must not raise into the request lifecycle."""
-
-    start_total = time.perf_counter()
-    db: Session = SessionLocal()
-    should_cleanup = False
-    ingest_success = False
-    try:
-        repo = crud.get_repo_by_id_any(db, repo_id)
-        if not repo or repo.user_id != user_id:
-            logger.warning("Ingestion task abort repo_id=%s (missing or forbidden)", repo_id)
-            return
-
-        should_cleanup = True
-
-        logger.info("Ingestion start repo_id=%s url=%s branch=%s", repo_id, repo_url, branch)
-
-        # Embeddings are always optional and must never block ingestion.
-        embeddings_enabled = (not settings.disable_embeddings) and bool(os.getenv("OPENROUTER_API_KEY"))
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            root = Path(tmpdir)
-
-            # 1) Clone repository (with timeout and no interactive prompts)
-            clone_start = time.perf_counter()
-            logger.info("Repo clone start repo_id=%s", repo_id)
-            try:
-                cmd = [
-                    "git",
-                    "clone",
-                    "--depth",
-                    "1",
-                    "--single-branch",
-                    "--branch",
-                    branch,
-                    repo_url,
-                    str(root),
-                ]
-                env = dict(os.environ)
-                env["GIT_TERMINAL_PROMPT"] = "0"
-                subprocess.run(
-                    cmd,
-                    check=True,
-                    env=env,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    timeout=int(os.getenv("GIT_CLONE_TIMEOUT_SECONDS", "60")),
-                )
-            except subprocess.TimeoutExpired:
-                logger.exception("Repo clone timeout repo_id=%s", repo_id)
-                return
-            except subprocess.CalledProcessError as exc:
-                logger.error(
-                    "Repo clone failed repo_id=%s rc=%s stderr=%s",
-                    repo_id,
-                    exc.returncode,
-                    (exc.stderr or "").strip()[:5000],
-                )
-                return
-            except Exception:
-                logger.exception("Repo clone unexpected failure repo_id=%s", repo_id)
-                return
-            finally:
-                logger.info("Repo clone end repo_id=%s elapsed_ms=%s", repo_id, int((time.perf_counter() - clone_start) * 1000))
-
-            # 2) Reject large repos
-            try:
-                repo_size_mb = sum(p.stat().st_size for p in root.rglob("*") if p.is_file()) / (1024 * 1024)
-            except Exception:
-                logger.exception("Repo size check failed repo_id=%s", repo_id)
-                return
-            if repo_size_mb > settings.max_repo_size_mb:
-                logger.warning("Repo too large repo_id=%s size_mb=%.2f", repo_id, repo_size_mb)
-                return
-
-            # 3) Read files
-            read_start = time.perf_counter()
-            try:
-                code_files = read_code_files(root)
-            except Exception:
-                logger.exception("File extraction failed repo_id=%s", repo_id)
-                return
-            logger.info(
-                "File extraction end repo_id=%s files=%s elapsed_ms=%s",
-                repo_id,
-                len(code_files),
-                int((time.perf_counter() - read_start) * 1000),
-            )
-            if not code_files:
-                logger.warning("No readable source files repo_id=%s", repo_id)
-                return
-
-            # 4) Insert files + chunks in bulk (single transaction)
-            chunk_start = time.perf_counter()
-            total_chunks = 0
-            file_rows: List[CodeFile] = []
-            language_counts: dict[str, int] = {}
-            for relative_path, language, content in code_files:
-                lang_key = (language or "unknown").strip() or "unknown"
-                language_counts[lang_key] = language_counts.get(lang_key, 0) + 1
-                file_rows.append(
-                    CodeFile(
-                        repo_id=repo_id,
-                        file_path=relative_path,
-                        language=language,
-                        raw_content=content,
-                    )
-                )
-
-            try:
-                db.add_all(file_rows)
-                db.flush()  # assign file IDs
-            except Exception:
-                db.rollback()
-                logger.exception("DB file bulk insert failed repo_id=%s", repo_id)
-                return
-
-            file_by_path = {f.file_path: f for f in file_rows}
-            chunk_rows: List[CodeChunk] = []
-            embed_text_batch: List[str] = []
-            embed_chunk_refs: List[CodeChunk] = []
-            embed_file_paths: List[str] = []
-
-            for relative_path, _language, content in code_files:
-                db_file = file_by_path.get(relative_path)
-                if not db_file or not db_file.id:
-                    continue
-                try:
-                    chunks = chunk_text(content)
-                except Exception:
-                    logger.exception("Chunking failed repo_id=%s path=%s", repo_id, relative_path)
-                    continue
-
-                total_chunks += len(chunks)
-                for idx, (chunk_text_content, token_count) in enumerate(chunks):
-                    chunk_row = CodeChunk(
-                        file_id=int(db_file.id),
-                        chunk_index=idx,
-                        chunk_content=chunk_text_content,
-                        token_count=token_count,
-                    )
-                    chunk_rows.append(chunk_row)
-                    if embeddings_enabled:
-                        embed_text_batch.append(chunk_text_content)
-                        embed_chunk_refs.append(chunk_row)
-                        embed_file_paths.append(relative_path)
-
-            if total_chunks == 0:
-                db.rollback()
-                logger.warning("No chunks produced repo_id=%s", repo_id)
-                return
-
-            insert_start = time.perf_counter()
-            try:
-                # Bulk insert chunks (fast path). return_defaults populates chunk IDs when supported.
-                db.bulk_save_objects(chunk_rows, return_defaults=True)
-                db.commit()
-                ingest_success = True
-            except Exception:
-                db.rollback()
-                logger.exception("DB chunk bulk insert failed repo_id=%s", repo_id)
-                return
-            logger.info(
-                "DB insert end repo_id=%s files=%s chunks=%s elapsed_ms=%s",
-                repo_id,
-                len(file_rows),
-                len(chunk_rows),
-                int((time.perf_counter() - insert_start) * 1000),
-            )
-            logger.info(
-                "Chunking end repo_id=%s elapsed_ms=%s",
-                repo_id,
-                int((time.perf_counter() - chunk_start) * 1000),
-            )
-
-            # Persist deterministic analytics stats (no DB/schema changes).
-            ingestion_time_ms = int((time.perf_counter() - start_total) * 1000)
-            avg_chunk_size = int(sum(c.token_count for c in chunk_rows) / len(chunk_rows)) if chunk_rows else 0
-            _write_repo_stats(
-                repo_id,
-                {
-                    "files": len(file_rows),
-                    "chunks": len(chunk_rows),
-                    "languages": language_counts,
-                    "avg_chunk_size": avg_chunk_size,
-                    "ingestion_time_ms": ingestion_time_ms,
-                },
-            )
-
-            # 5) Optional embeddings generation + FAISS insertion
-            if not embeddings_enabled:
-                logger.info("Embeddings disabled repo_id=%s (lexical-only)", repo_id)
-            else:
-                embed_start = time.perf_counter()
-                try:
-                    from vectorstore.embeddings import embed_texts
-
-                    vectors = embed_texts(embed_text_batch)
-                    logger.info(
-                        "Embedding end repo_id=%s texts=%s vectors=%s elapsed_ms=%s",
-                        repo_id,
-                        len(embed_text_batch),
-                        len(vectors),
-                        int((time.perf_counter() - embed_start) * 1000),
-                    )
-
-                    # Build metadata aligned with vectors order.
-                    metadata_batch: list[dict] = []
-                    usable_vectors: list[list[float]] = []
-                    for vec, chunk_row, file_path in zip(vectors, embed_chunk_refs, embed_file_paths):
-                        if getattr(chunk_row, "id", None) is None:
-                            continue
-                        usable_vectors.append(vec)
-                        metadata_batch.append(
-                            {
-                                "chunk_id": int(chunk_row.id),
-                                "file_path": file_path,
-                                "token_count": int(chunk_row.token_count),
-                            }
-                        )
-
-                    if usable_vectors and metadata_batch:
-                        faiss_start = time.perf_counter()
-                        try:
-                            add_embeddings(DATA_DIR, repo_id, usable_vectors, metadata_batch)
-                            logger.info(
-                                "FAISS insertion end repo_id=%s vectors=%s elapsed_ms=%s",
-                                repo_id,
-                                len(usable_vectors),
-                                int((time.perf_counter() - faiss_start) * 1000),
-                            )
-                        except Exception:
-                            logger.exception("FAISS insertion failed repo_id=%s; continuing", repo_id)
-                    else:
-                        logger.warning("No chunk IDs available for FAISS metadata repo_id=%s; skipping", repo_id)
-                except Exception:
-                    logger.exception("Embeddings generation failed repo_id=%s; continuing lexical-only", repo_id)
-
-            logger.info(
-                "Ingestion complete repo_id=%s files=%s chunks=%s elapsed_ms=%s",
-                repo_id,
-                len(code_files),
-                total_chunks,
-                int((time.perf_counter() - start_total) * 1000),
-            )
-    finally:
-        if should_cleanup and not ingest_success:
-            _cleanup_repo_record(repo_id)
-        db.close()
-
-
 @router.get("", response_model=List[RepoResponse])
-def list_repos(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def list_repos(db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
     """List repositories for the current user."""
     repos = crud.list_repos_by_user(db, current_user.id)
-    response = []
-    for repo in repos:
-        file_count = crud.count_files_by_repo(db, repo.id)
-        status_value = "indexed" if file_count > 0 else "processing"
-        response.append(
-            RepoResponse(
-                id=repo.id,
-                repo_url=repo.repo_url,
-                repo_name=repo.repo_name,
-                created_at=repo.created_at.isoformat(),
-                status=status_value,
-                file_count=file_count,
-            )
+    return [
+        RepoResponse(
+            id=repo.id,
+            repo_url=repo.repo_url,
+            repo_name=repo.repo_name,
+            created_at=repo.created_at.isoformat(),
+            status=repo.status or "processing",
+            file_count=int(repo.file_count or 0),
         )
-    return response
+        for repo in repos
+    ]
 
 
-@router.get("/{repo_id}/files", response_model=RepoFilesResponse)
-def list_repo_files(repo_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    """List file metadata for a repository."""
+@router.get("/{repo_id}/ingest/status", response_model=IngestionStatusResponse)
+def ingestion_status(repo_id: int, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
+    """Return state, per-stage progress and timings of the latest ingestion job."""
     repo = crud.get_repo_by_id_any(db, repo_id)
     if not repo:
         raise HTTPException(status_code=404, detail="Repository not found")
     if repo.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+    job = crud.get_latest_ingestion_job(db, repo_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No ingestion job found for repository")
+
+    try:
+        timings = json.loads(job.timings_json or "{}")
+    except ValueError:
+        timings = {}
+
+    def _iso(value) -> str | None:
+        return value.isoformat() if value else None
+
+    queue_position = None
+    if job.state == "queued":
+        queue_position = crud.get_ingestion_queue_position(
+            db,
+            job.id,
+            default_size_kb=settings.ingest_default_size_kb,
+            aging_seconds=settings.ingest_priority_aging_seconds,
+        )
+    wait_until = job.started_at or (datetime.utcnow() if job.state == "queued" else job.updated_at)
+    wait_ms = int(max(0.0, (wait_until - job.created_at).total_seconds()) * 1000) if wait_until and job.created_at else 0
+
+    return IngestionStatusResponse(
+        job_id=job.id,
+        repo_id=repo_id,
+        repo_status=repo.status or "processing",
+        state=job.state,
+        stage=job.stage,
+        files_total=int(job.files_total or 0),
+        files_done=int(job.files_done or 0),
+        chunks_done=int(job.chunks_done or 0),
+        embeddings_total=int(job.embeddings_total or 0),
+        embeddings_done=int(job.embeddings_done or 0),
+        attempts=int(job.attempts or 0),
+        queue_position=queue_position,
+        wait_ms=wait_ms,
+        estimated_size_kb=job.estimated_size_kb if (job.estimated_size_kb or 0) >= 0 else None,
+        error=job.error,
+        timings_ms={str(k): int(v or 0) for k, v in (timings or {}).items()},
+        created_at=_iso(job.created_at),
+        started_at=_iso(job.started_at),
+        finished_at=_iso(job.finished_at),
+        updated_at=_iso(job.updated_at),
+    )
+
+
+@router.get("/{repo_id}/files", response_model=RepoFilesResponse)
+def list_repo_files(repo_id: int, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
+    """List file metadata for a repository."""
+    _require_repo_owner(db, repo_id, current_user.id)
     files = crud.list_files_by_repo(db, repo_id)
     file_entries = [
         FileResponse(id=entry.id, file_path=entry.file_path, language=entry.language)
@@ -499,22 +318,18 @@ def list_repo_files(repo_id: int, db: Session = Depends(get_db), current_user=De
 def get_file_content(
     repo_id: int,
     file_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """Return full content for a file within a repository."""
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    _require_repo_owner(db, repo_id, current_user.id)
     code_file = crud.get_file_by_id(db, repo_id, file_id)
     if not code_file:
         raise HTTPException(status_code=404, detail="File not found")
     return FileContentResponse(
         file_path=code_file.file_path,
         language=code_file.language,
-        content=code_file.raw_content,
+        content=crud.get_file_text(code_file),
     )
 
 
@@ -527,27 +342,16 @@ def explain_file(
     current_user=Depends(get_current_user),
 ):
     """Explain THIS FILE using ONLY its indexed code chunks (strict file-scoped RAG)."""
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    _require_repo_owner(db, repo_id, current_user.id)
 
     code_file = crud.get_file_by_id(db, repo_id, file_id)
     if not code_file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    chunks = crud.list_chunks_by_file(db, code_file.id)
-    if not chunks:
-        return FileExplainResponse(message="No indexed code found for this file", referenced_chunks=[])
-
-    def _normalize_level(level: str | None) -> str:
-        raw = (level or "").strip().lower()
-        if raw in {"beginner", "intermediate", "expert"}:
-            return raw
-        return "intermediate"
-
-    level = _normalize_level(getattr(payload, "level", None) if payload is not None else None)
+    level = explanations.normalize_level(getattr(payload, "level", None) if payload is not None else None)
+    cached = explanations.get_cached(db, code_file, "explain", level)
+    if cached:
+        return cached
 
     # If the LLM isn't configured, return a non-hallucinated message instead of a 500.
     # (Explain is LLM-backed by design, but it must fail clearly when keys are missing.)
@@ -557,76 +361,9 @@ def explain_file(
     if provider == "openrouter" and not os.getenv("OPENROUTER_API_KEY"):
         return FileExplainResponse(message="LLM is not configured (OPENROUTER_API_KEY is not set).", referenced_chunks=[])
 
-    # Build a context strictly from this file's chunks.
-    max_tokens = max(200, int(settings.max_context_tokens or 1800))
-    selected_chunks = []
-    token_budget = 0
-    for ch in chunks:
-        if token_budget + int(ch.token_count) > max_tokens:
-            break
-        selected_chunks.append(ch)
-        token_budget += int(ch.token_count)
-
-    if not selected_chunks:
-        # If first chunk is too big, still include it.
-        selected_chunks = [chunks[0]]
-
-    context = "\n\n".join(
-        [f"[chunk_index={c.chunk_index}]\n{c.chunk_content}" for c in selected_chunks]
-    )
-
-    if level == "beginner":
-        fmt = (
-            "Output format (plain text):\n"
-            "- 6 to 9 bullet points (use '-' bullets).\n"
-            "- Each bullet must be one sentence.\n"
-            "- No preamble, no code blocks.\n"
-            "Style: explain for a new engineer; define acronyms briefly; keep it concrete."
-        )
-    elif level == "expert":
-        fmt = (
-            "Output format (plain text):\n"
-            "- 4 to 7 bullet points (use '-' bullets).\n"
-            "- Each bullet must be one sentence.\n"
-            "- No preamble, no code blocks.\n"
-            "Style: expert concise; focus on invariants, edge cases, and interfaces."
-        )
-    else:
-        fmt = (
-            "Output format (plain text):\n"
-            "- 6 to 9 bullet points (use '-' bullets).\n"
-            "- Each bullet must be one sentence.\n"
-            "- No preamble, no code blocks.\n"
-            "Style: concise but meaningfully informative."
-        )
-
-    system_prompt = (
-        "You are CodeLens AI. Explain the given file using ONLY the provided code context. "
-        "Do not speculate. If the code context is insufficient, say so briefly and only describe what is supported.\n\n"
-        f"{fmt}\n"
-        "Coverage requirements (include what applies): purpose, key responsibilities, important inputs/outputs, "
-        "notable dependencies/integrations, and any important edge cases/assumptions visible in the code."
-    )
-    user_prompt = (
-        f"File: {code_file.file_path}\nLanguage: {code_file.language}\n\n"
-        f"Indexed code context (from this file only):\n{context}\n\n"
-        "Task: Provide the minimal explanation in the required bullet format."
-    )
-
-    try:
-        explanation, _token_usage = generate_answer(
-            system_prompt,
-            user_prompt,
-            max_tokens=512 if level != "expert" else 384,
-            temperature=0.15,
-        )
-    except HTTPException as exc:
-        # Convert provider configuration errors into a safe message payload.
-        return FileExplainResponse(message=str(exc.detail), referenced_chunks=[])
-
-    explanation = (explanation or "").strip()
-    referenced = [int(c.chunk_index) for c in selected_chunks]
-    return FileExplainResponse(explanation=explanation, referenced_chunks=referenced)
+    response = explanations.generate_file_explanation(db, code_file, level)
+    explanations.store(db, code_file, "explain", level, response)
+    return response
 
 
 def _slice_lines(text: str, start_line: int, end_line: int, *, max_chars: int = 6000) -> str:
@@ -648,6 +385,21 @@ def _file_header(text: str, *, max_lines: int = 80, max_chars: int = 3000) -> st
     return header
 
 
+def _symbol_lines(db: Session, code_file: CodeFile, raw: str, function_name: str) -> tuple[int, int]:
+    """Line range of `name` / `Class.name` in a file from the symbol index.
+
+    Files ingested before the index existed are parsed on the spot.
+    """
+    parent, _, name = function_name.strip().rpartition(".")
+    row = crud.get_file_symbol(db, code_file.id, name, parent or None)
+    if row:
+        return row.start_line, row.end_line
+    for definition in extract_definitions(raw, code_file.language or ""):
+        if definition.name == name and (not parent or definition.parent == parent):
+            return definition.start_line, definition.end_line
+    raise HTTPException(status_code=404, detail="Symbol not found in file")
+
+
 def _require_groq_or_message() -> str | None:
     provider = (settings.llm_provider or "").strip().lower() or "groq"
     if provider != "groq":
@@ -665,28 +417,30 @@ def explain_symbol(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    _require_repo_owner(db, repo_id, current_user.id)
 
     code_file = crud.get_file_by_id(db, repo_id, file_id)
     if not code_file:
         raise HTTPException(status_code=404, detail="File not found")
 
+    raw = crud.get_file_text(code_file)
+    fn = (payload.function_name or "").strip()
+    if payload.start_line:
+        start_line = int(payload.start_line)
+        end_line = int(payload.end_line or start_line)
+    elif fn:
+        start_line, end_line = _symbol_lines(db, code_file, raw, fn)
+    else:
+        raise HTTPException(status_code=400, detail="function_name or start_line is required")
+    level = explanations.normalize_level(payload.level)
+    cached = explanations.get_cached(db, code_file, "explain_symbol", level, start_line, end_line)
+    if cached:
+        return cached
+
     msg = _require_groq_or_message()
     if msg:
         return FileExplainResponse(message=msg, referenced_chunks=[])
 
-    raw = code_file.raw_content or ""
-    fn = (payload.function_name or "").strip()
-    start_line = int(payload.start_line or 1)
-    end_line = int(payload.end_line or start_line)
-    level = (payload.level or "").strip().lower()
-    if level not in {"beginner", "intermediate", "expert"}:
-        level = "intermediate"
-
     snippet = _slice_lines(raw, start_line, end_line, max_chars=7000)
     header = _file_header(raw)
 
@@ -737,7 +491,9 @@ def explain_symbol(
     except HTTPException as exc:
         return FileExplainResponse(message=str(exc.detail), referenced_chunks=[])
 
-    return FileExplainResponse(explanation=(explanation or "").strip(), referenced_chunks=[])
+    response = FileExplainResponse(explanation=(explanation or "").strip(), referenced_chunks=[])
+    explanations.store(db, code_file, "explain_symbol", level, response, start_line, end_line)
+    return response
 
 
 @router.post("/{repo_id}/files/{file_id}/why_written", response_model=FileExplainResponse)
@@ -748,32 +504,35 @@ def why_written(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    _require_repo_owner(db, repo_id, current_user.id)
 
     code_file = crud.get_file_by_id(db, repo_id, file_id)
     if not code_file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    msg = _require_groq_or_message()
-    if msg:
-        return FileExplainResponse(message=msg, referenced_chunks=[])
-
-    raw = code_file.raw_content or ""
-    level = (payload.level or "").strip().lower()
-    if level not in {"beginner", "intermediate", "expert"}:
-        level = "intermediate"
+    raw = crud.get_file_text(code_file)
+    level = explanations.normalize_level(payload.level)
 
     header = _file_header(raw)
     scope = "file"
     snippet = ""
-    if payload.function_name and payload.start_line and payload.end_line:
-        fn = (payload.function_name or "").strip()
+    start_line = end_line = 0
+    fn = (payload.function_name or "").strip()
+    if fn:
+        if payload.start_line and payload.end_line:
+            start_line, end_line = int(payload.start_line), int(payload.end_line)
+        else:
+            start_line, end_line = _symbol_lines(db, code_file, raw, fn)
         scope = f"function {fn}"
-        snippet = _slice_lines(raw, int(payload.start_line), int(payload.end_line), max_chars=7000)
+        snippet = _slice_lines(raw, start_line, end_line, max_chars=7000)
+
+    cached = explanations.get_cached(db, code_file, "why_written", level, start_line, end_line)
+    if cached:
+        return cached
+
+    msg = _require_groq_or_message()
+    if msg:
+        return FileExplainResponse(message=msg, referenced_chunks=[])
 
     system_prompt = (
         "You are CodeLens AI. Answer using ONLY the provided code. "
@@ -801,24 +560,233 @@ def why_written(
     except HTTPException as exc:
         return FileExplainResponse(message=str(exc.detail), referenced_chunks=[])
 
-    return FileExplainResponse(explanation=(explanation or "").strip(), referenced_chunks=[])
+    response = FileExplainResponse(explanation=(explanation or "").strip(), referenced_chunks=[])
+    explanations.store(db, code_file, "why_written", level, response, start_line, end_line)
+    return response
+
+
+@router.get("/{repo_id}/symbols", response_model=SymbolLookupResponse)
+def lookup_symbol(
+    repo_id: int,
+    name: str,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
+    """Go-to-definition and find-references for an exact identifier (symbol index)."""
+
+    _require_repo_owner(db, repo_id, current_user.id)
+    name = (name or "").strip().rpartition(".")[2]
+    if not name:
+        raise HTTPException(status_code=400, detail="name is required")
+    definitions = crud.find_symbol_definitions(db, [repo_id], [name])
+    references = crud.find_symbol_references(db, repo_id, name)
+    return SymbolLookupResponse(
+        name=name,
+        definitions=[
+            SymbolDefinitionResponse(
+                file_id=d.file_id,
+                file_path=d.file_path,
+                name=d.name,
+                kind=d.kind,
+                parent=d.parent,
+                signature=d.signature,
+                start_line=d.start_line,
+                end_line=d.end_line,
+            )
+            for d in definitions
+        ],
+        references=[
+            SymbolReferenceResponse(file_id=file_id, file_path=file_path, line=line)
+            for file_id, file_path, line in references
+        ],
+    )
+
+
+@router.get("/{repo_id}/graph", response_model=RepoGraphResponse)
+def repo_graph(
+    repo_id: int,
+    level: str = "module",
+    limit: int = 200,
+    db: Session = Depends(get_read_db),
+    current_user=Depends(get_current_user),
+):
+    """Import graph (`level=module`) or call graph (`level=function`) of a repository.
+
+    Returns the `limit` most central nodes and the edges between them.
+    """
+
+    _require_repo_owner(db, repo_id, current_user.id)
+    level = (level or "").strip().lower()
+    if level not in {"module", "function"}:
+        raise HTTPException(status_code=400, detail="level must be 'module' or 'function'")
+    graph = load_graph(repo_id)
+    if graph is None:
+        raise HTTPException(status_code=404, detail="Graph not built yet; re-ingest the repository")
+
+    if level == "module":
+        ids, matrix, rank = graph.file_ids, graph.imports, graph.file_rank
+    else:
+        ids, matrix, rank = graph.symbol_ids, graph.calls, graph.symbol_rank
+    limit = max(1, min(int(limit), 2000))
+    top = np.argsort(-rank, kind="stable")[:limit].tolist()
+    chosen = set(top)
+
+    if level == "module":
+        paths = {int(file_id): path for file_id, path, _ in crud.list_files_by_repo(db, repo_id)}
+        nodes = [
+            GraphNodeResponse(
+                id=int(ids[i]),
+                label=paths.get(int(ids[i]), ""),
+                file_path=paths.get(int(ids[i]), ""),
+                kind="module",
+                centrality=round(float(rank[i]), 4),
+            )
+            for i in top
+        ]
+    else:
+        symbols = crud.get_symbols_by_ids(db, [int(ids[i]) for i in top])
+        nodes = []
+        for i in top:
+            row = symbols.get(int(ids[i]))
+            if row is None:
+                continue
+            nodes.append(
+                GraphNodeResponse(
+                    id=int(ids[i]),
+                    label=f"{row.parent}.{row.name}" if row.parent else row.name,
+                    file_path=row.file_path,
+                    kind=row.kind,
+                    centrality=round(float(rank[i]), 4),
+                )
+            )
+    edges = []
+    for i in top:
+        targets, weights = matrix.row(i)
+        edges.extend(
+            GraphEdgeResponse(source=int(ids[i]), target=int(ids[t]), weight=int(w))
+            for t, w in zip(targets.tolist(), weights.tolist())
+            if t in chosen
+        )
+    return RepoGraphResponse(level=level, node_count=len(ids), edge_count=matrix.edge_count, nodes=nodes, edges=edges)
+
+
+_CLEAN_NOTES = {
+    "security": "Looks clean — no obvious security red flags detected in this file.",
+    "performance": "Looks good — no obvious performance hotspots detected in this file.",
+    "maintainability": "Looks maintainable — no obvious maintainability issues detected in this file.",
+}
+
+
+def _stable_top(items: list[str], n: int = 12) -> list[str]:
+    seen: set[str] = set()
+    out: list[str] = []
+    for it in items:
+        s = (it or "").strip()
+        if not s or s in seen:
+            continue
+        seen.add(s)
+        out.append(s)
+        if len(out) >= n:
+            break
+    return out
+
+
+# Legacy files (ingested before risk scanning) the repo-wide risk radar scans
+# per request; the rest are reported as unscanned until a re-ingest or later
+# requests cover them.
+_RISK_BACKFILL_FILES = 50
+
+
+def _store_risks(db: Session, repo_id: int, files: list[CodeFile]) -> dict[int, dict]:
+    """Scan files ingested before risk scanning existed and store their findings."""
+    findings = {int(f.id): risk.scan_file(crud.get_file_text(f)) for f in files}
+    crud.save_file_risks(
+        db, [{"file_id": file_id, "repo_id": repo_id, "findings": items} for file_id, items in findings.items()]
+    )
+    return findings
+
+
+def _risk_notes(db: Session, code_file: CodeFile, path: str, categories: list[str]) -> dict[str, str]:
+    """Notes for categories without findings; LLM-written once per file version (cached)."""
+
+    cached = explanations.get_cached(db, code_file, "risk_notes", "")
+    if cached:
+        parsed = json.loads(cached.explanation or "{}")
+    else:
+        if _require_groq_or_message():
+            # Fallback if AI provider is not configured.
+            return {category: _CLEAN_NOTES[category] for category in categories}
+
+        system_prompt = (
+            "You are CodeLens AI. Generate short, optimistic status notes for a file risk scan. "
+            "Be cautious: say 'no obvious signals' rather than guarantees.\n\n"
+            "Return STRICT JSON only, no markdown, no extra keys.\n"
+            "Schema: {\"security\": string, \"performance\": string, \"maintainability\": string}"
+        )
+
+        user_prompt = (
+            f"File: {path}\nLanguage: {code_file.language}\n\n"
+            f"File header:\n{_file_header(crud.get_file_text(code_file))}\n\n"
+            "Write one sentence per category (max ~14 words each)."
+        )
+
+        try:
+            raw_notes, _token_usage = generate_answer(
+                system_prompt,
+                user_prompt,
+                max_tokens=128,
+                temperature=0.2,
+            )
+            parsed = json.loads((raw_notes or "").strip() or "{}")
+        except Exception:
+            parsed = None
+        if not isinstance(parsed, dict):
+            # If AI output is malformed, fall back to safe optimistic notes.
+            return {category: _CLEAN_NOTES[category] for category in categories}
+        # All three notes are cached, whichever categories this version lacks findings for.
+        notes_json = json.dumps({category: str(parsed.get(category) or "").strip() for category in risk.CATEGORIES})
+        explanations.store(db, code_file, "risk_notes", "", FileExplainResponse(explanation=notes_json))
+    return {category: str(parsed.get(category) or "").strip() for category in categories}
 
 
 @router.get("/{repo_id}/risk_radar")
 def risk_radar(
     repo_id: int,
+    limit: int = 50,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    """Deterministic risk heuristics.
+    """Deterministic repo-wide risk heuristics (no AI), read from the ingest-time scan.
 
-    The UI expects file-scoped results. Use:
-    GET /repos/{repo_id}/files/{file_id}/risk_radar
+    Up to `limit` findings per category in file path order, with full counts.
+    Files ingested before risk scanning are scanned here, at most
+    _RISK_BACKFILL_FILES per request; the remainder is `files_unscanned`.
     """
-    raise HTTPException(
-        status_code=400,
-        detail="Risk radar is file-scoped. Call /repos/{repo_id}/files/{file_id}/risk_radar instead.",
-    )
+    _require_repo_owner(db, repo_id, current_user.id)
+    limit = max(1, min(int(limit), 1000))
+
+    unscanned, legacy = crud.list_unscanned_files(db, repo_id, _RISK_BACKFILL_FILES)
+    if legacy:
+        _store_risks(db, repo_id, legacy)
+    scanned, flagged = crud.list_flagged_file_risks(db, repo_id)
+
+    hits: dict[str, list[str]] = {category: [] for category in risk.CATEGORIES}
+    for path, findings in flagged:
+        for category in risk.CATEGORIES:
+            hits[category].extend(f"{path}: {message}" for message in findings.get(category) or [])
+
+    return {
+        **{category: _stable_top(items, limit) for category, items in hits.items()},
+        "counts": {category: len(items) for category, items in hits.items()},
+        "files_scanned": scanned,
+        "files_flagged": len(flagged),
+        "files_unscanned": unscanned - len(legacy),
+        "notes": {
+            category: _CLEAN_NOTES[category].replace("this file", "this repository")
+            for category, items in hits.items()
+            if not items
+        },
+    }
 
 
 @router.get("/{repo_id}/files/{file_id}/risk_radar")
@@ -828,132 +796,31 @@ def risk_radar_file(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    """Deterministic file-level risk heuristics (no AI)."""
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    """Deterministic file-level risk heuristics (no AI), read from the ingest-time scan."""
+    _require_repo_owner(db, repo_id, current_user.id)
 
     code_file = crud.get_file_by_id(db, repo_id, file_id)
     if not code_file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    security_hits: list[str] = []
-    perf_hits: list[str] = []
-    maintain_hits: list[str] = []
-
-    secret_re = re.compile(r"(api[_-]?key|secret|token|password)\s*[:=]\s*['\"][^'\"]{8,}['\"]", re.IGNORECASE)
-    eval_re = re.compile(r"\b(eval|exec)\s*\(")
-    shell_re = re.compile(r"shell\s*=\s*True")
-    xss_re = re.compile(r"dangerouslySetInnerHTML")
-    sql_re = re.compile(r"\bSELECT\b|\bINSERT\b|\bUPDATE\b|\bDELETE\b", re.IGNORECASE)
-    type_suppress_re = re.compile(
-        r"(#\s*type:\s*ignore\b|@ts-ignore\b|@ts-expect-error\b|\bas\s+any\b|:\s*any\b|<any>\b)",
-        re.IGNORECASE,
-    )
+    findings = crud.get_file_risk(db, code_file.id)
+    if findings is None:
+        findings = _store_risks(db, repo_id, [code_file])[int(code_file.id)]
 
     path = (code_file.file_path or "").strip().replace("\\", "/")
-    raw = code_file.raw_content or ""
-
-    if raw:
-        # Security
-        if secret_re.search(raw):
-            security_hits.append(f"{path}: possible hardcoded secret-like value")
-        if eval_re.search(raw):
-            security_hits.append(f"{path}: uses eval/exec")
-        if shell_re.search(raw):
-            security_hits.append(f"{path}: uses shell=True")
-        if xss_re.search(raw):
-            security_hits.append(f"{path}: uses dangerouslySetInnerHTML")
-        if sql_re.search(raw) and re.search(r"execute\(.*\+|f\".*(SELECT|INSERT|UPDATE|DELETE)", raw, re.IGNORECASE):
-            security_hits.append(f"{path}: possible dynamic SQL construction")
-
-        # Performance
-        if len(raw) > 300_000:
-            perf_hits.append(f"{path}: very large file ({len(raw)} chars)")
-        if re.search(r"for\s*\(.*\)\s*\{[\s\S]{0,2000}for\s*\(", raw):
-            perf_hits.append(f"{path}: nested loops pattern")
-        if re.search(r"\.map\(.*\.map\(", raw):
-            perf_hits.append(f"{path}: nested map pattern")
-
-        # Maintainability
-        lines = raw.splitlines()
-        if len(lines) > 1200:
-            maintain_hits.append(f"{path}: very long file ({len(lines)} lines)")
-        if re.search(r"TODO|FIXME", raw):
-            maintain_hits.append(f"{path}: contains TODO/FIXME")
-        if type_suppress_re.search(raw):
-            maintain_hits.append(f"{path}: suppresses type checking")
-
-    def _stable_top(items: list[str], n: int = 12) -> list[str]:
-        seen: set[str] = set()
-        out: list[str] = []
-        for it in items:
-            s = (it or "").strip()
-            if not s or s in seen:
-                continue
-            seen.add(s)
-            out.append(s)
-            if len(out) >= n:
-                break
-        return out
-
-    security_out = _stable_top(security_hits)
-    perf_out = _stable_top(perf_hits)
-    maintain_out = _stable_top(maintain_hits)
+    security_out, perf_out, maintain_out = (
+        _stable_top([f"{path}: {message}" for message in findings.get(category) or []])
+        for category in risk.CATEGORIES
+    )
 
     notes: dict[str, str] = {}
-    needs_notes = (len(security_out) == 0) or (len(perf_out) == 0) or (len(maintain_out) == 0)
-
-    if needs_notes:
-        header = _file_header(raw)
-        msg = _require_groq_or_message()
-        if msg:
-            # Fallback if AI provider is not configured.
-            if len(security_out) == 0:
-                notes["security"] = "Looks clean — no obvious security red flags detected in this file."
-            if len(perf_out) == 0:
-                notes["performance"] = "Looks good — no obvious performance hotspots detected in this file."
-            if len(maintain_out) == 0:
-                notes["maintainability"] = "Looks maintainable — no obvious maintainability issues detected in this file."
-        else:
-            system_prompt = (
-                "You are CodeLens AI. Generate short, optimistic status notes for a file risk scan. "
-                "Be cautious: say 'no obvious signals' rather than guarantees.\n\n"
-                "Return STRICT JSON only, no markdown, no extra keys.\n"
-                "Schema: {\"security\": string, \"performance\": string, \"maintainability\": string}"
-            )
-
-            user_prompt = (
-                f"File: {path}\nLanguage: {code_file.language}\n\n"
-                f"File header:\n{header}\n\n"
-                "Write one sentence per category (max ~14 words each)."
-            )
-
-            try:
-                raw_notes, _token_usage = generate_answer(
-                    system_prompt,
-                    user_prompt,
-                    max_tokens=128,
-                    temperature=0.2,
-                )
-                parsed = json.loads((raw_notes or "").strip() or "{}")
-                if isinstance(parsed, dict):
-                    if len(security_out) == 0:
-                        notes["security"] = str(parsed.get("security") or "").strip()
-                    if len(perf_out) == 0:
-                        notes["performance"] = str(parsed.get("performance") or "").strip()
-                    if len(maintain_out) == 0:
-                        notes["maintainability"] = str(parsed.get("maintainability") or "").strip()
-            except Exception:
-                # If AI output is malformed, fall back to safe optimistic notes.
-                if len(security_out) == 0:
-                    notes["security"] = "Looks clean — no obvious security red flags detected in this file."
-                if len(perf_out) == 0:
-                    notes["performance"] = "Looks good — no obvious performance hotspots detected in this file."
-                if len(maintain_out) == 0:
-                    notes["maintainability"] = "Looks maintainable — no obvious maintainability issues detected in this file."
+    empty = [
+        category
+        for category, items in zip(risk.CATEGORIES, (security_out, perf_out, maintain_out))
+        if not items
+    ]
+    if empty:
+        notes = _risk_notes(db, code_file, path, empty)
 
     return {
         "security": security_out,
@@ -967,42 +834,33 @@ def risk_radar_file(
 def file_metrics(
     repo_id: int,
     file_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """Deterministic file-level metrics (no AI)."""
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    _require_repo_owner(db, repo_id, current_user.id)
 
-    code_file = crud.get_file_by_id(db, repo_id, file_id)
-    if not code_file:
+    metrics = crud.get_file_metrics(db, repo_id, file_id)
+    if metrics is None:
         raise HTTPException(status_code=404, detail="File not found")
 
-    lines = len((code_file.raw_content or "").splitlines())
-    chunk_count = crud.count_chunks_by_file(db, code_file.id)
-    avg_chunk = crud.avg_chunk_size_by_file(db, code_file.id)
+    lines, chunk_count, avg_chunk = metrics
     return FileMetricsResponse(lines=lines, chunks=chunk_count, avg_chunk_size=avg_chunk)
 
 
 @router.get("/{repo_id}/analytics", response_model=RepoAnalyticsResponse)
 def repo_analytics(
     repo_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user=Depends(get_current_user),
 ):
     """Deterministic per-repo analytics (no AI)."""
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    _require_repo_owner(db, repo_id, current_user.id)
 
     base = crud.get_repo_analytics(db, repo_id)
-    stats = _read_repo_stats(repo_id)
-    ingestion_time_ms = int(stats.get("ingestion_time_ms") or 0)
+    ingestion_time_ms = int(base.get("ingestion_time_ms") or 0)
+    if not ingestion_time_ms:
+        ingestion_time_ms = int(_read_repo_stats(repo_id).get("ingestion_time_ms") or 0)
     return RepoAnalyticsResponse(
         files=int(base.get("files") or 0),
         chunks=int(base.get("chunks") or 0),
@@ -1018,28 +876,26 @@ def delete_repository(
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
-    """Delete a repository and all its associated data (files, chunks, FAISS index, chat history)."""
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+    """Delete a repository and all its associated data (files, chunks, vectors, chat history)."""
+    _require_repo_owner(db, repo_id, current_user.id)
 
     try:
+        content_hashes = crud.list_content_hashes_by_repo(db, repo_id)
         crud.delete_repo(db, repo_id)
-        # Best-effort cleanup of stats file and FAISS index
+        _delete_unreferenced_blobs(db, content_hashes)
+        # Best-effort cleanup of stats/graph files and vectors
         try:
             stats_file = _stats_path(repo_id)
             if stats_file.exists():
                 stats_file.unlink()
+            delete_graph(repo_id)
         except Exception:
-            logger.warning("Failed to delete stats file for repo_id=%s", repo_id)
+            logger.warning("Failed to delete stats/graph files for repo_id=%s", repo_id)
 
         try:
-            from vectorstore.faiss_index import delete_index
-            delete_index(DATA_DIR, repo_id)
+            get_vector_store().delete_repo(repo_id)
         except Exception:
-            logger.warning("Failed to delete FAISS index for repo_id=%s", repo_id)
+            logger.warning("Failed to delete vectors for repo_id=%s", repo_id)
 
         logger.info("Repository deleted repo_id=%s user_id=%s", repo_id, current_user.id)
         return {"status": "deleted", "repo_id": repo_id}
@@ -0,0 +1,308 @@
+"""Deterministic risk heuristics (risk radar), scanned once per file at ingest time.
+
+`scan_file` returns the findings of one file per category; ingestion runs it
+over every batch in a process pool (`RiskScanner`) and stores the result in
+`file_risks`, which both risk radar endpoints read.
+"""
+
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ("security", "performance", "maintainability")
+
+Findings = Dict[str, List[str]]
+
+# Compiled once per process. Every pattern is linear: no nested or unbounded
+# `.*` quantifiers, and each attempt only consumes a run (keyword, whitespace,
+# quoted text) that no other attempt consumes. The former
+# `for\s*\(.*\)\s*\{[\s\S]{0,2000}for\s*\(`, `\.map\(.*\.map\(`,
+# `execute\(.*\+` and `f".*(SELECT|...)` backtracked over whole lines
+# (quadratic or worse on minified code); they are evaluated below by scans over
+# the matches of their literal parts, with the same results.
+# `(api[_-]?key|secret|token|password)\s*[:=]\s*['"][^'"]{8,}['"]`, split so
+# the search is led by the separator and quote rather than by the keyword
+# alternation, which Python's engine retries at every position.
+_ASSIGN_QUOTE = re.compile(r"[:=]\s*['\"]")
+_SECRET_KEY = re.compile(r"(?:api[_-]?key|secret|token|password)\Z", re.IGNORECASE)
+_SECRET_VALUE = re.compile(r"[^'\"]{8,}['\"]")
+# `\b(eval|exec)\s*\(` with the leading `\b` checked per match (see _word_start).
+_EVAL = re.compile(r"(?:eval|exec)\s*\(")
+_SHELL = re.compile(r"shell\s*=\s*True")
+_XSS = re.compile(r"dangerouslySetInnerHTML")
+_SQL = re.compile(r"\bSELECT\b|\bINSERT\b|\bUPDATE\b|\bDELETE\b", re.IGNORECASE)
+_SQL_WORD = re.compile(r"SELECT|INSERT|UPDATE|DELETE", re.IGNORECASE)
+_EXECUTE = re.compile(r"execute\(", re.IGNORECASE)
+_F_STRING = re.compile(r"f\"", re.IGNORECASE)
+_FOR = re.compile(r"for\s*\(")
+_BLOCK_OPEN = re.compile(r"\)\s*\{")
+_MAP = re.compile(r"\.map\(")
+_TODO = re.compile(r"TODO|FIXME")
+# `#\s*type:\s*ignore\b|...|\bas\s+any\b|...`, with `\bas\s+any\b` split off for
+# the same reason as _EVAL.
+_TYPE_SUPPRESS = re.compile(
+    r"#\s*type:\s*ignore\b|@ts-ignore\b|@ts-expect-error\b|:\s*any\b|<any>\b",
+    re.IGNORECASE,
+)
+_AS_ANY = re.compile(r"as\s+any\b", re.IGNORECASE)
+_WORD = re.compile(r"\w")
+_SPACE = re.compile(r"\s")
+
+# Characters the inner `for (` may start after the outer loop's block opens.
+_NESTED_LOOP_WINDOW = 2000
+# Python-level loops check the deadline every this many matches.
+_CHECK_EVERY = 4096
+
+_BUDGET_FINDING = "risk scan stopped at its time budget; later checks skipped"
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def _tick(i: int, deadline: Optional[float]) -> None:
+    if deadline is not None and not i % _CHECK_EVERY and time.perf_counter() > deadline:
+        raise _OutOfTime
+
+
+def _word_start(text: str, start: int) -> bool:
+    """Whether a match starting with a word character at `start` begins at `\\b`."""
+    return start == 0 or not _WORD.match(text, start - 1)
+
+
+def _any_word_start(pattern: "re.Pattern", text: str, deadline: Optional[float]) -> bool:
+    for i, match in enumerate(pattern.finditer(text)):
+        _tick(i, deadline)
+        if _word_start(text, match.start()):
+            return True
+    return False
+
+
+def _secret(text: str, deadline: Optional[float]) -> bool:
+    """A keyword, `:` or `=`, then a quoted value of 8+ characters (see _ASSIGN_QUOTE).
+
+    Each separator match looks back over its whitespace for a keyword ending
+    there (at most 8 characters) and forward for the closing quote; separators
+    and value runs belong to one candidate each, so the text is read about twice.
+    """
+
+    for i, match in enumerate(_ASSIGN_QUOTE.finditer(text)):
+        _tick(i, deadline)
+        key_end = match.start()
+        while key_end > 0 and _SPACE.match(text, key_end - 1):
+            key_end -= 1
+        if _SECRET_KEY.search(text, max(0, key_end - 8), key_end) and _SECRET_VALUE.match(text, match.end()):
+            return True
+    return False
+
+
+def _type_suppress(text: str, deadline: Optional[float]) -> bool:
+    return bool(_TYPE_SUPPRESS.search(text)) or _any_word_start(_AS_ANY, text, deadline)
+
+
+def _followed_on_line(text: str, anchor: "re.Pattern", target, deadline: Optional[float]) -> bool:
+    """Whether some `anchor` match is followed later on its line by `target`.
+
+    `target` is a literal or a pattern. Only the first anchor of each line is
+    checked, since a later anchor sees a subset of the same line, so the whole
+    text is scanned about twice.
+    """
+
+    checked_until = -1
+    for i, match in enumerate(anchor.finditer(text)):
+        _tick(i, deadline)
+        if match.start() < checked_until:
+            continue
+        end = text.find("\n", match.end())
+        end = len(text) if end == -1 else end
+        if isinstance(target, str):
+            if text.find(target, match.end(), end) != -1:
+                return True
+        elif target.search(text, match.end(), end):
+            return True
+        checked_until = end
+    return False
+
+
+def _dynamic_sql(text: str, deadline: Optional[float]) -> bool:
+    """`execute\(.*\+|f".*(SELECT|INSERT|UPDATE|DELETE)` (case-insensitive), without backtracking."""
+    return _followed_on_line(text, _EXECUTE, "+", deadline) or _followed_on_line(text, _F_STRING, _SQL_WORD, deadline)
+
+
+def _nested_loops(text: str, deadline: Optional[float]) -> bool:
+    """`for\s*\(.*\)\s*\{[\s\S]{0,2000}for\s*\(` in one pass over the matches of its parts.
+
+    A block opening `) {` qualifies when a `for (` header ends before its `)`
+    on the same line and another `for (` starts at most 2000 characters after
+    its `{`. Headers and openings are both in text order, so two pointers
+    find the latest header before each opening and the next `for (` after it.
+    """
+
+    fors = [(m.start(), m.end()) for m in _FOR.finditer(text)]
+    if len(fors) < 2:
+        return False
+    # Next newline after each header's end. Headers are in order, so each
+    # find starts past the previous line end and the scans do not overlap.
+    line_ends = []
+    line_end = -1
+    for i, (_, header_end) in enumerate(fors):
+        _tick(i, deadline)
+        if line_end < header_end:
+            line_end = text.find("\n", header_end)
+            line_end = len(text) if line_end == -1 else line_end
+        line_ends.append(line_end)
+
+    header = -1  # latest header ending at or before the current `)`
+    after = 0  # first `for (` starting at or after the current `{` end
+    for i, match in enumerate(_BLOCK_OPEN.finditer(text)):
+        _tick(i, deadline)
+        paren, block = match.start(), match.end()
+        while header + 1 < len(fors) and fors[header + 1][1] <= paren:
+            header += 1
+        if header < 0 or paren >= line_ends[header]:
+            continue
+        while after < len(fors) and fors[after][0] < block:
+            after += 1
+        if after == len(fors):
+            return False
+        if fors[after][0] <= block + _NESTED_LOOP_WINDOW:
+            return True
+    return False
+
+
+def _nested_map(text: str, deadline: Optional[float]) -> bool:
+    """`\.map\(.*\.map\(`: two consecutive `.map(` with no newline between them."""
+    previous_end = -1
+    for i, match in enumerate(_MAP.finditer(text)):
+        _tick(i, deadline)
+        if previous_end >= 0 and text.find("\n", previous_end, match.start()) == -1:
+            return True
+        previous_end = match.end()
+    return False
+
+
+# (category, check) in report order; a check returns its finding or None.
+_CHECKS: Sequence[Tuple[str, Callable[[str, Optional[float]], Optional[str]]]] = (
+    ("security", lambda t, d: "possible hardcoded secret-like value" if _secret(t, d) else None),
+    ("security", lambda t, d: "uses eval/exec" if _any_word_start(_EVAL, t, d) else None),
+    ("security", lambda t, d: "uses shell=True" if _SHELL.search(t) else None),
+    ("security", lambda t, d: "uses dangerouslySetInnerHTML" if _XSS.search(t) else None),
+    (
+        "security",
+        lambda t, d: "possible dynamic SQL construction" if _SQL.search(t) and _dynamic_sql(t, d) else None,
+    ),
+    ("performance", lambda t, d: f"very large file ({len(t)} chars)" if len(t) > 300_000 else None),
+    ("performance", lambda t, d: "nested loops pattern" if _nested_loops(t, d) else None),
+    ("performance", lambda t, d: "nested map pattern" if _nested_map(t, d) else None),
+    ("maintainability", lambda t, d: _long_file(t)),
+    ("maintainability", lambda t, d: "contains TODO/FIXME" if _TODO.search(t) else None),
+    ("maintainability", lambda t, d: "suppresses type checking" if _type_suppress(t, d) else None),
+)
+
+
+def _long_file(text: str) -> Optional[str]:
+    line_count = len(text.splitlines())
+    return f"very long file ({line_count} lines)" if line_count > 1200 else None
+
+
+def scan_file(text: str, budget_ms: Optional[float] = None) -> Findings:
+    """Findings of one file by category (messages without the file path).
+
+    Checks run in order until RISK_SCAN_BUDGET_MS (or `budget_ms`; 0 = no
+    limit) is spent; the rest are skipped and reported as a performance finding.
+    """
+
+    risk: Findings = {category: [] for category in CATEGORIES}
+    if not text:
+        return risk
+    budget_ms = settings.risk_scan_budget_ms if budget_ms is None else budget_ms
+    deadline = time.perf_counter() + budget_ms / 1000 if budget_ms and budget_ms > 0 else None
+    for category, check in _CHECKS:
+        try:
+            if deadline is not None and time.perf_counter() > deadline:
+                raise _OutOfTime
+            finding = check(text, deadline)
+        except _OutOfTime:
+            risk["performance"].append(_BUDGET_FINDING)
+            break
+        if finding:
+            risk[category].append(finding)
+    return risk
+
+
+def scan_batch(texts: Sequence[str]) -> List[Findings]:
+    """Findings for several files (the process pool task); a failing file gets none."""
+    out = []
+    for text in texts:
+        try:
+            out.append(scan_file(text))
+        except Exception:
+            logger.exception("Risk scan failed")
+            out.append({category: [] for category in CATEGORIES})
+    return out
+
+
+def scan_workers() -> int:
+    """RISK_SCAN_WORKERS, or the CPU count capped at 4 when unset (0)."""
+    workers = int(settings.risk_scan_workers or 0)
+    if workers <= 0:
+        workers = min(4, os.cpu_count() or 1)
+    return workers
+
+
+class RiskScanner:
+    """Scans file batches in a process pool; in-process with a single worker.
+
+    `submit` hands the batch to the pool and returns a callable that collects
+    the results, so the caller can chunk and parse the same batch meanwhile.
+    A broken pool falls back to scanning in-process.
+    """
+
+    def __init__(self, workers: Optional[int] = None) -> None:
+        self.workers = max(1, int(workers if workers is not None else scan_workers()))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, texts: Sequence[str]) -> Callable[[], List[Findings]]:
+        texts = list(texts)
+        if self._pool is None or len(texts) < 2:
+            results = scan_batch(texts)
+            return lambda: results
+
+        step = -(-len(texts) // self.workers)
+        parts: List[Tuple[Sequence[str], object]] = []
+        for offset in range(0, len(texts), step):
+            part = texts[offset : offset + step]
+            parts.append((part, self._pool.submit(scan_batch, part)))
+
+        def collect() -> List[Findings]:
+            out: List[Findings] = []
+            for part, future in parts:
+                try:
+                    out.extend(future.result())
+                except Exception:
+                    logger.warning("Risk scan pool failed; scanning %s file(s) in-process", len(part))
+                    out.extend(scan_batch(part))
+            return out
+
+        return collect
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "RiskScanner":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,148 @@
+"""Ingestion scheduling helpers: repo size estimates and the embedding-API budget.
+
+Job selection itself (global/per-user caps, small-repo priority) lives in
+`crud.claim_next_ingestion_job` because it is a single conditional UPDATE.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+import httpx
+from settings import settings
+from database import crud
+from database.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+_GITHUB_REPO_RE = re.compile(r"^https://github\.com/([\w\-\.]+)/([\w\-\.]+?)(?:\.git)?/?$")
+
+# Stored on the job when the size probe fails.
+UNKNOWN_SIZE_KB = -1
+
+
+def estimate_repo_size_kb(repo_url: str) -> int:
+    """Best-effort repository size (KB) from the GitHub API; UNKNOWN_SIZE_KB on failure."""
+
+    match = _GITHUB_REPO_RE.match((repo_url or "").strip())
+    if not match:
+        return UNKNOWN_SIZE_KB
+
+    headers = {"Accept": "application/vnd.github+json"}
+    token = (os.getenv("GITHUB_TOKEN") or "").strip()
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        with httpx.Client(timeout=settings.ingest_size_probe_timeout_seconds) as client:
+            resp = client.get(f"https://api.github.com/repos/{match.group(1)}/{match.group(2)}", headers=headers)
+        if resp.status_code >= 400:
+            return UNKNOWN_SIZE_KB
+        return max(0, int((resp.json() or {}).get("size") or 0))
+    except Exception as exc:
+        logger.info("Repo size probe failed url=%s (%s)", repo_url, type(exc).__name__)
+        return UNKNOWN_SIZE_KB
+
+
+def estimate_job_size(job_id: int) -> None:
+    """Probe a newly queued job's repo size so small repos can be prioritized.
+
+    Runs once per job as a background task of the enqueueing request, so
+    workers never wait on the GitHub API before claiming. A job claimed before
+    the probe finishes is ordered with INGEST_DEFAULT_SIZE_KB.
+    """
+
+    db = SessionLocal()
+    try:
+        job = crud.get_ingestion_job(db, job_id)
+        if job is None or job.state != "queued" or job.estimated_size_kb is not None:
+            return
+        crud.set_ingestion_job_size_estimate(db, job_id, estimate_repo_size_kb(job.repo_url))
+    except Exception:
+        logger.exception("Repo size estimate failed job_id=%s", job_id)
+    finally:
+        db.close()
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second refill up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def set_rate(self, rate: float, capacity: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            self.capacity = max(1.0, float(capacity))
+            self.tokens = min(self.tokens, self.capacity)
+
+    def acquire(self, amount: float) -> float:
+        """Block until `amount` tokens are available; returns seconds waited.
+
+        Requests larger than the capacity are clamped so they can still proceed.
+        """
+        waited = 0.0
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= amount or self.rate <= 0:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class EmbeddingBudget:
+    """Per-job share of the global embedding token budget.
+
+    Each running job gets `EMBEDDING_TOKENS_PER_MINUTE / running_jobs`, so the
+    sum across all worker processes stays under the provider limit and no job
+    can starve the others. The running-job count is refreshed periodically.
+    """
+
+    _REFRESH_SECONDS = 10.0
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.tokens_per_minute = max(0, int(tokens_per_minute))
+        self._bucket: TokenBucket | None = None
+        self._refreshed = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.tokens_per_minute > 0
+
+    def _share_per_second(self) -> float:
+        db = SessionLocal()
+        try:
+            running = crud.count_running_ingestion_jobs(db)
+        finally:
+            db.close()
+        return self.tokens_per_minute / 60.0 / max(1, running)
+
+    def acquire(self, tokens: int) -> float:
+        """Block until this job may spend `tokens` embedding tokens."""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        if self._bucket is None or now - self._refreshed >= self._REFRESH_SECONDS:
+            rate = self._share_per_second()
+            # Allow roughly ten seconds of burst, but always at least one full batch.
+            capacity = max(rate * 10.0, float(tokens))
+            if self._bucket is None:
+                self._bucket = TokenBucket(rate, capacity)
+            else:
+                self._bucket.set_rate(rate, capacity)
+            self._refreshed = now
+        return self._bucket.acquire(tokens)
@@ -0,0 +1,199 @@
+"""Ingestion worker pool.
+
+The API only enqueues `IngestionJob` rows; these worker processes pull jobs
+from that table (SQLite-backed queue, no external broker) and run them.
+
+Run standalone with:
+
+    python -m ingestion.worker
+
+or let the API spawn the pool at startup with INGEST_WORKER_MODE=embedded.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from typing import List
+
+from settings import settings
+from database import blob_store, crud
+from database.db import SessionLocal, init_db
+from .jobs import run_ingestion_job
+
+logger = logging.getLogger(__name__)
+
+_EMBEDDED_WORKERS: List[multiprocessing.Process] = []
+
+# How often each worker sweeps blobs left unreferenced by deleted repositories.
+_BLOB_SWEEP_INTERVAL_SECONDS = 3600
+
+
+def _heartbeat_loop(job_id: int, stop: threading.Event) -> None:
+    """Keep the job lease alive while long stages (clone, embeddings) run."""
+    interval = max(1, int(settings.ingest_heartbeat_seconds))
+    while not stop.wait(interval):
+        db = SessionLocal()
+        try:
+            crud.touch_ingestion_job(db, job_id)
+        except Exception:
+            logger.warning("Heartbeat failed job_id=%s", job_id)
+        finally:
+            db.close()
+
+
+def _sweep_blobs() -> None:
+    db = SessionLocal()
+    try:
+        removed = blob_store.sweep_unreferenced(crud.list_all_content_hashes(db))
+        if removed:
+            logger.info("Removed %s unreferenced blob(s)", removed)
+    except Exception:
+        logger.warning("Blob sweep failed")
+    finally:
+        db.close()
+
+
+def _run_claimed_job(job_id: int) -> None:
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat_loop, args=(job_id, stop), daemon=True)
+    heartbeat.start()
+    try:
+        run_ingestion_job(job_id)
+    finally:
+        stop.set()
+        heartbeat.join(timeout=5)
+
+
+def worker_loop(worker_id: str, *, parent_pid: int | None = None) -> None:
+    """Claim and run jobs until the process is stopped (or its parent exits)."""
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    poll_interval = max(0.2, float(settings.ingest_poll_interval_seconds))
+
+    logger.info("Ingestion worker started worker_id=%s", worker_id)
+    last_sweep = time.monotonic()
+    while not stopping.is_set():
+        if time.monotonic() - last_sweep >= _BLOB_SWEEP_INTERVAL_SECONDS:
+            _sweep_blobs()
+            last_sweep = time.monotonic()
+
+        if parent_pid is not None and os.getppid() != parent_pid:
+            logger.info("Ingestion worker parent exited; stopping worker_id=%s", worker_id)
+            break
+
+        db = SessionLocal()
+        try:
+            requeued = crud.requeue_stale_ingestion_jobs(db, lease_seconds=settings.ingest_job_lease_seconds)
+            if requeued:
+                logger.warning("Requeued %s stale ingestion job(s)", requeued)
+            job_id = crud.claim_next_ingestion_job(
+                db,
+                worker_id,
+                max_running=settings.ingest_max_running_jobs,
+                max_per_user=settings.ingest_max_jobs_per_user,
+                default_size_kb=settings.ingest_default_size_kb,
+                aging_seconds=settings.ingest_priority_aging_seconds,
+            )
+        except Exception:
+            logger.exception("Ingestion worker poll failed worker_id=%s", worker_id)
+            job_id = None
+        finally:
+            db.close()
+
+        if job_id is None:
+            stopping.wait(poll_interval)
+            continue
+
+        logger.info("Ingestion worker claimed job_id=%s worker_id=%s", job_id, worker_id)
+        _run_claimed_job(job_id)
+    logger.info("Ingestion worker stopped worker_id=%s", worker_id)
+
+
+def _worker_process_main(index: int, parent_pid: int | None) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    init_db(settings.database_url)
+    worker_loop(f"{socket.gethostname()}:{os.getpid()}:{index}", parent_pid=parent_pid)
+
+
+def start_worker_pool(concurrency: int, *, watch_parent: bool = False) -> List[multiprocessing.Process]:
+    """Spawn `concurrency` worker processes.
+
+    Processes are non-daemonic so they may use their own process pools; with
+    watch_parent they exit on their own when the spawning process dies.
+    """
+
+    ctx = multiprocessing.get_context("spawn")
+    parent_pid = os.getpid() if watch_parent else None
+    processes: List[multiprocessing.Process] = []
+    for index in range(max(1, int(concurrency))):
+        proc = ctx.Process(
+            target=_worker_process_main,
+            args=(index, parent_pid),
+            name=f"ingestion-worker-{index}",
+        )
+        proc.start()
+        processes.append(proc)
+    return processes
+
+
+def stop_worker_pool(processes: List[multiprocessing.Process], *, timeout: float = 10.0) -> None:
+    """Terminate worker processes; interrupted jobs are requeued once their lease expires."""
+    for proc in processes:
+        if proc.is_alive():
+            proc.terminate()
+    deadline = time.monotonic() + timeout
+    for proc in processes:
+        proc.join(timeout=max(0.0, deadline - time.monotonic()))
+        if proc.is_alive():
+            proc.kill()
+
+
+def start_embedded_workers() -> None:
+    """Start the worker pool from the API process when INGEST_WORKER_MODE=embedded."""
+    mode = (settings.ingest_worker_mode or "").strip().lower()
+    if mode != "embedded" or _EMBEDDED_WORKERS:
+        return
+    _EMBEDDED_WORKERS.extend(start_worker_pool(settings.ingest_worker_concurrency, watch_parent=True))
+    logger.info("Started %s embedded ingestion worker process(es)", len(_EMBEDDED_WORKERS))
+
+
+def stop_embedded_workers() -> None:
+    """Stop worker processes started by `start_embedded_workers`."""
+    if not _EMBEDDED_WORKERS:
+        return
+    stop_worker_pool(_EMBEDDED_WORKERS)
+    _EMBEDDED_WORKERS.clear()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    processes = start_worker_pool(settings.ingest_worker_concurrency)
+    logger.info("Ingestion worker pool running with %s process(es)", len(processes))
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    signal.signal(signal.SIGINT, lambda *_: stopping.set())
+    try:
+        while not stopping.wait(1.0):
+            # Replace crashed workers so configured concurrency is maintained.
+            for i, proc in enumerate(processes):
+                if not proc.is_alive():
+                    logger.warning("Ingestion worker %s exited (code=%s); restarting", proc.name, proc.exitcode)
+                    processes[i] = start_worker_pool(1)[0]
+    finally:
+        stop_worker_pool(processes)
+
+
+if __name__ == "__main__":
+    main()
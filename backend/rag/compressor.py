@@ -1,15 +1,42 @@
-from typing import List
+from typing import Callable, List, NamedTuple, Optional, Sequence, Union
 import json
 import logging
+import math
 import urllib.request
 import urllib.error
 
 import tiktoken
 
 from settings import settings
+from .extractive import LEVELS, compress_code, relevance_terms
+from .reranker import RetrievedChunk, question_terms
 
 logger = logging.getLogger(__name__)
 
+# Knapsack weights are counted in blocks of this many tokens (rounded up, so
+# a selection never exceeds the budget); keeps the table small.
+_TOKEN_STEP = 8
+# Tokens charged per segment for the "\n\n" separator and boundary drift.
+_SEPARATOR_TOKENS = 2
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int  # estimated from stored chunk token counts
+    tokens_saved: int  # stored tokens of the packed chunks minus `tokens`
+
+
+class ContextSegment(NamedTuple):
+    """One or more retrieved chunks of a file merged into a single span."""
+
+    repo_id: int
+    file_path: str
+    text: str
+    tokens: int
+    value: float
+    rank: int  # best (lowest) retrieval rank among the merged chunks
+    chunk_ids: tuple
+
 
 def _scaledown_compress(text: str) -> str:
     """Best-effort external compression via ScaleDown.
@@ -49,30 +76,262 @@ def _scaledown_compress(text: str) -> str:
         return text
 
 
-def compress_context(chunks: List[str]) -> str:
-    """Trim context to a token budget by concatenating top chunks."""
+def _values(chunks: Sequence[RetrievedChunk]) -> List[float]:
+    """Relevance of each chunk in (0, 1]: min-max scaled scores, else by rank."""
+    scores = [float(c.score or 0.0) for c in chunks]
+    low, high = min(scores), max(scores)
+    if high > low:
+        return [0.1 + 0.9 * (score - low) / (high - low) for score in scores]
+    return [1.0 / (1 + rank) for rank in range(len(chunks))]
 
-    encoder = tiktoken.get_encoding("cl100k_base")
-    max_tokens = settings.max_context_tokens
-    selected = []
-    total_tokens = 0
 
-    for chunk in chunks:
-        tokens = encoder.encode(chunk)
-        if total_tokens + len(tokens) > max_tokens:
-            break
-        selected.append(chunk)
-        total_tokens += len(tokens)
+def _text_overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of `head` that is a prefix of `tail`.
 
-    local = "\n\n".join(selected)
+    Overlaps shorter than the 16-character probe are not detected.
+    """
+    probe = tail[:16]
+    if len(probe) < 16:
+        return 0
+    pos = head.find(probe, max(0, len(head) - len(tail)))
+    while pos != -1:
+        if tail.startswith(head[pos:]):
+            return len(head) - pos
+        pos = head.find(probe, pos + 1)
+    return 0
 
-    # Optional external compression step (safe fallback).
+
+def merge_chunks(chunks: Sequence[RetrievedChunk], encoder=None) -> List[ContextSegment]:
+    """Merge adjacent/overlapping chunks of the same file into segments.
+
+    Chunks are neighbours when their `chunk_index` differs by one. The overlap
+    the chunker repeats between neighbours is cut using the stored character
+    offsets (or a text match for legacy rows without offsets), and the merged
+    token count is derived from the stored `token_count`s. Only chunks without
+    a stored count (plain strings) are encoded.
+    """
+
+    values = _values(chunks)
+    items = []  # (chunk, value, rank, tokens)
+    for rank, (chunk, value) in enumerate(zip(chunks, values)):
+        tokens = int(chunk.token_count or 0)
+        if tokens <= 0 and chunk.text:
+            encoder = encoder or tiktoken.get_encoding("cl100k_base")
+            tokens = len(encoder.encode(chunk.text))
+        items.append((chunk, value, rank, tokens))
+
+    groups: dict = {}
+    standalone = []
+    for item in items:
+        chunk = item[0]
+        if chunk.file_id is None or chunk.chunk_index is None:
+            standalone.append(item)
+        else:
+            groups.setdefault((chunk.repo_id, chunk.file_id), []).append(item)
+
+    segments: List[ContextSegment] = []
+    for chunk, value, rank, tokens in standalone:
+        segments.append(ContextSegment(chunk.repo_id, chunk.file_path, chunk.text, tokens, value, rank, (chunk.chunk_id,)))
+
+    for group in groups.values():
+        group.sort(key=lambda item: item[0].chunk_index)
+        run: Optional[dict] = None
+        for chunk, value, rank, tokens in group:
+            if run is not None and chunk.chunk_index == run["last_index"]:
+                continue  # same chunk retrieved twice (e.g. vector and lexical)
+            if run is not None and chunk.chunk_index == run["last_index"] + 1:
+                if chunk.start_offset is not None and run["end"] is not None:
+                    overlap = max(0, run["end"] - chunk.start_offset)
+                else:
+                    overlap = _text_overlap(run["text"], chunk.text)
+                overlap = min(overlap, len(chunk.text))
+                fresh = chunk.text[overlap:]
+                run["text"] += fresh
+                run["tokens"] += math.ceil(tokens * len(fresh) / len(chunk.text)) if chunk.text else 0
+                run["value"] += value
+                run["rank"] = min(run["rank"], rank)
+                run["ids"].append(chunk.chunk_id)
+                run["last_index"] = chunk.chunk_index
+                run["end"] = chunk.end_offset
+                continue
+            if run is not None:
+                segments.append(_close(run))
+            run = {
+                "chunk": chunk,
+                "text": chunk.text,
+                "tokens": tokens,
+                "value": value,
+                "rank": rank,
+                "ids": [chunk.chunk_id],
+                "last_index": chunk.chunk_index,
+                "end": chunk.end_offset,
+            }
+        if run is not None:
+            segments.append(_close(run))
+    return segments
+
+
+def _close(run: dict) -> ContextSegment:
+    chunk = run["chunk"]
+    return ContextSegment(
+        chunk.repo_id, chunk.file_path, run["text"], int(run["tokens"]), run["value"], run["rank"], tuple(run["ids"])
+    )
+
+
+def select_segments(segments: Sequence[ContextSegment], max_tokens: int) -> List[ContextSegment]:
+    """0/1 knapsack: the segments with the most total value within `max_tokens`.
+
+    Returned in retrieval rank order (most relevant first).
+    """
+
+    capacity = max(0, int(max_tokens)) // _TOKEN_STEP
+    weights = [math.ceil((s.tokens + _SEPARATOR_TOKENS) / _TOKEN_STEP) for s in segments]
+    best = [0.0] * (capacity + 1)
+    keep = [[False] * (capacity + 1) for _ in segments]
+    for i, (segment, weight) in enumerate(zip(segments, weights)):
+        if weight > capacity:
+            continue
+        for cap in range(capacity, weight - 1, -1):
+            candidate = best[cap - weight] + segment.value
+            if candidate > best[cap]:
+                best[cap] = candidate
+                keep[i][cap] = True
+
+    chosen: List[ContextSegment] = []
+    cap = capacity
+    for i in range(len(segments) - 1, -1, -1):
+        if keep[i][cap]:
+            chosen.append(segments[i])
+            cap -= weights[i]
+    chosen.sort(key=lambda s: s.rank)
+    return chosen
+
+
+def _with_text(segment: ContextSegment, text: str) -> ContextSegment:
+    """Segment with new text; tokens scaled from the stored count by length."""
+    if text == segment.text:
+        return segment
+    tokens = math.ceil(segment.tokens * len(text) / len(segment.text)) if segment.text else 0
+    return segment._replace(text=text, tokens=tokens)
+
+
+def _extract_segments(segments: List[ContextSegment], question: str, target_ratio: float) -> List[ContextSegment]:
+    """Local extractive compression (see rag/extractive.py).
+
+    Every segment loses irrelevant comments, docstrings, imports and blank
+    lines. While more than `target_ratio` of the original tokens remain, the
+    lowest-value segments are escalated to signature-only and then outline
+    form; the top-ranked segment is never reduced beyond the first step.
+    """
+
+    terms = relevance_terms(question_terms(question))
+    out = [_with_text(s, compress_code(s.text, s.file_path, terms)) for s in segments]
+    target = sum(s.tokens for s in segments) * max(0.0, float(target_ratio))
+    total = sum(s.tokens for s in out)
+    order = sorted((i for i, s in enumerate(segments) if s.rank > 0), key=lambda i: (segments[i].value, -segments[i].rank))
+    for level in LEVELS[1:]:
+        for i in order:
+            if total <= target:
+                return out
+            reduced = _with_text(segments[i], compress_code(segments[i].text, segments[i].file_path, terms, level))
+            if reduced.tokens < out[i].tokens:
+                total += reduced.tokens - out[i].tokens
+                out[i] = reduced
+    return out
+
+
+def _with_headers(
+    segments: List[ContextSegment], label: Callable[[int, str], str], encoder
+) -> tuple[List[ContextSegment], dict]:
+    """Prefix each segment with a `File: <label>` line, counted in its tokens.
+
+    Also returns {chunk_ids: header tokens}, so savings exclude the headers.
+    """
+    out = []
+    header_tokens = {}
+    for segment in segments:
+        name = label(segment.repo_id, segment.file_path) if segment.file_path else ""
+        if not name:
+            out.append(segment)
+            continue
+        header = f"File: {name}\n"
+        header_tokens[segment.chunk_ids] = len(encoder.encode(header))
+        out.append(segment._replace(text=header + segment.text, tokens=segment.tokens + header_tokens[segment.chunk_ids]))
+    return out, header_tokens
+
+
+def pack_context(
+    chunks: Sequence[Union[str, RetrievedChunk]],
+    question: str = "",
+    max_tokens: Optional[int] = None,
+    label: Optional[Callable[[int, str], str]] = None,
+) -> PackedContext:
+    """Pack ranked chunks into a `MAX_CONTEXT_TOKENS` budget.
+
+    Neighbouring chunks of a file are merged without their repeated overlap,
+    compressed per COMPRESSION_PROVIDER (`local`: query-aware extraction,
+    `scaledown`: external service, `none`), then the segments worth the most
+    relevance per token are chosen (knapsack over stored token counts), so a
+    large low-ranked chunk no longer blocks smaller ones after it. Each segment
+    starts with a `File: ...` line naming its file; `label(repo_id, file_path)`
+    sets the name (default: the path), so multi-repo context can tell repos apart.
+    """
+
+    max_tokens = settings.max_context_tokens if max_tokens is None else int(max_tokens)
+    ranked = [c if isinstance(c, RetrievedChunk) else RetrievedChunk(c, 0, "") for c in chunks]
+    ranked = [c for c in ranked if c.text and c.text.strip()]
+    if not ranked or max_tokens <= 0:
+        return PackedContext("", 0, 0)
+
+    encoder = None
     provider = (settings.compression_provider or "").strip().lower()
+    segments = merge_chunks(ranked)
+    if provider == "local":
+        segments = _extract_segments(segments, question, settings.compression_target_ratio)
+        # Extraction can empty a segment; don't spend a file header on it.
+        segments = [s for s in segments if s.text.strip()] or segments
+    header_tokens: dict = {}
+    if any(s.file_path for s in segments):
+        encoder = tiktoken.get_encoding("cl100k_base")
+        segments, header_tokens = _with_headers(segments, label or (lambda _repo_id, file_path: file_path), encoder)
+    selected = select_segments(segments, max_tokens)
+    if not selected:
+        # Every segment is larger than the budget: clip the most relevant one.
+        encoder = encoder or tiktoken.get_encoding("cl100k_base")
+        top = min(segments, key=lambda s: s.rank)
+        tokens = encoder.encode(top.text)[:max_tokens]
+        return PackedContext(encoder.decode(tokens), len(tokens), 0)
+
+    local = "\n\n".join(segment.text for segment in selected)
+    packed_tokens = sum(s.tokens for s in selected)
+    by_id = {c.chunk_id: c for c in ranked if c.chunk_id is not None}
+    original_tokens = sum(
+        (sum(by_id[chunk_id].token_count for chunk_id in s.chunk_ids if chunk_id in by_id) + header_tokens.get(s.chunk_ids, 0))
+        or s.tokens
+        for s in selected
+    )
+
+    # Optional external compression step (safe fallback).
     if provider == "scaledown":
         local = _scaledown_compress(local)
 
-    # Ensure we still respect the token budget after any compression.
-    tokens = encoder.encode(local)
-    if len(tokens) > max_tokens:
-        local = encoder.decode(tokens[:max_tokens])
-    return local
+        # Ensure we still respect the token budget after external compression;
+        # the local packing already fits by stored token counts.
+        encoder = encoder or tiktoken.get_encoding("cl100k_base")
+        tokens = encoder.encode(local)
+        if len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            local = encoder.decode(tokens)
+        packed_tokens = len(tokens)
+
+    saved = max(0, original_tokens - packed_tokens)
+    logger.info(
+        "Packed %s of %s chunks into %s segments (~%s tokens, %s saved, budget %s)",
+        sum(len(s.chunk_ids) for s in selected),
+        len(ranked),
+        len(selected),
+        packed_tokens,
+        saved,
+        max_tokens,
+    )
+    return PackedContext(local, packed_tokens, saved)
@@ -0,0 +1,221 @@
+"""Query-aware extractive compression of code context (COMPRESSION_PROVIDER=local).
+
+Works line by line on each packed segment and never rewrites code, only drops
+or elides it, so the output is deterministic and every kept line is verbatim:
+
+- `light`: drop blank lines, comment lines, docstrings and import lines that
+  mention none of the question's terms.
+- `signatures`: additionally collapse function bodies that mention none of
+  the terms to their signature plus `...`.
+- `outline`: keep only definition lines and lines that mention a term (for
+  segments that start inside a body, where there is no signature to keep).
+
+`compressor.pack_context` escalates the lowest-scoring segments through these
+levels until the context is down to COMPRESSION_TARGET_RATIO of its original
+size.
+
+Languages are recognised by file extension; unknown files only lose blank lines.
+"""
+
+import re
+from pathlib import PurePosixPath
+from typing import Iterable, List
+
+_HASH_COMMENT = {".py", ".rb", ".sh", ".bash", ".zsh", ".yml", ".yaml", ".toml", ".r", ".pl", ".ex", ".exs"}
+_SLASH_COMMENT = {
+    ".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".java", ".c", ".h", ".cpp", ".hpp", ".cc", ".cs",
+    ".go", ".rs", ".swift", ".kt", ".kts", ".scala", ".php", ".dart",
+}
+
+_IMPORT = re.compile(
+    r"^\s*(?:import\b|from\s+\S+\s+import\b|#\s*include\b|using\s+[\w.]+\s*;|use\s+[\w:\\{}, ]+;?\s*$"
+    r"|extern\s+crate\b|package\s+[\w.]+\s*;?\s*$|(?:const|let|var)\s+[\w{}, ]+\s*=\s*require\()"
+)
+LEVELS = ("light", "signatures", "outline")
+
+_PY_DEF = re.compile(r"^(\s*)(?:async\s+)?def\s+\w+")
+_DOCSTRING_START = re.compile(r"^\s*[rRuUbB]?(\"\"\"|''')")
+_BRACE_DEF = re.compile(r"^\s*(?!(?:if|for|while|switch|catch|else|do|try|return)\b|\})[^=;]*\w\s*\([^;]*\)[^;]*\{\s*$")
+_DEFINITION = re.compile(
+    r"^\s*(?:export\s+)?(?:public\s+|private\s+|protected\s+|static\s+|async\s+)*"
+    r"(?:def|class|function|func|fn|interface|struct|enum|impl|trait|type)\b"
+)
+_STRING_LITERAL = re.compile(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`[^`]*`")
+
+
+def _language(file_path: str) -> str:
+    suffix = PurePosixPath(file_path or "").suffix.lower()
+    if suffix == ".py":
+        return "python"
+    if suffix in _HASH_COMMENT:
+        return "hash"
+    if suffix in _SLASH_COMMENT:
+        return "slash"
+    return "other"
+
+
+def _mentions(text: str, terms: frozenset) -> bool:
+    if not terms:
+        return False
+    lowered = text.lower()
+    return any(term in lowered for term in terms)
+
+
+def relevance_terms(terms: Iterable[str]) -> frozenset:
+    """Terms used for relevance checks (3+ characters, lower-cased)."""
+    return frozenset(t.lower() for t in terms if len(t) >= 3)
+
+
+def _strip_light(lines: List[str], language: str, terms: frozenset) -> List[str]:
+    out: List[str] = []
+    i = 0
+    n = len(lines)
+    while i < n:
+        line = lines[i]
+        stripped = line.strip()
+        if not stripped:
+            i += 1
+            continue
+
+        if language == "python":
+            match = _DOCSTRING_START.match(line)
+            # Only a string right after a `def`/`class` header (or opening the
+            # segment) is a docstring; other triple-quoted lines are code (SQL etc.).
+            previous = out[-1].split("#", 1)[0].rstrip() if out else ""
+            if match and (not out or previous.endswith(":")):
+                quote = match.group(1)
+                rest = stripped[stripped.index(quote) + 3 :]
+                end = i
+                if quote not in rest:
+                    end = i + 1
+                    while end < n and quote not in lines[end]:
+                        end += 1
+                block = lines[i : end + 1]
+                if not _mentions("\n".join(block), terms):
+                    i = end + 1
+                    continue
+                out.extend(block)
+                i = end + 1
+                continue
+
+        if language in ("python", "hash") and stripped.startswith("#") and not stripped.startswith("#!"):
+            if not _mentions(stripped, terms):
+                i += 1
+                continue
+        if language == "slash":
+            if stripped.startswith("//") and not _mentions(stripped, terms):
+                i += 1
+                continue
+            if stripped.startswith("/*"):
+                end = i
+                while end < n and "*/" not in lines[end]:
+                    end += 1
+                block = lines[i : end + 1]
+                if not _mentions("\n".join(block), terms):
+                    i = end + 1
+                    continue
+
+        if language != "other" and _IMPORT.match(line):
+            end = i
+            if stripped.endswith("(") or stripped.endswith("{"):
+                closer = ")" if stripped.endswith("(") else "}"
+                end = i + 1
+                while end < n and closer not in lines[end]:
+                    end += 1
+            block = lines[i : end + 1]
+            if not _mentions("\n".join(block), terms):
+                i = end + 1
+                continue
+            out.extend(block)
+            i = end + 1
+            continue
+
+        out.append(line)
+        i += 1
+    return out
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _collapse_python(lines: List[str], terms: frozenset) -> List[str]:
+    out: List[str] = []
+    i = 0
+    n = len(lines)
+    while i < n:
+        match = _PY_DEF.match(lines[i])
+        if not match:
+            out.append(lines[i])
+            i += 1
+            continue
+        base = len(match.group(1))
+        # Signature may span lines until the one ending with ":".
+        sig_end = i
+        while sig_end < n - 1 and not lines[sig_end].split("#", 1)[0].rstrip().endswith(":"):
+            sig_end += 1
+        body_end = sig_end + 1
+        while body_end < n and (not lines[body_end].strip() or _indent(lines[body_end]) > base):
+            body_end += 1
+        body = lines[sig_end + 1 : body_end]
+        out.extend(lines[i : sig_end + 1])
+        if body and not _mentions("\n".join(body), terms):
+            out.append(" " * (base + 4) + "...")
+            i = body_end
+        else:
+            i = sig_end + 1
+    return out
+
+
+def _brace_delta(line: str) -> int:
+    code = _STRING_LITERAL.sub("", line.split("//", 1)[0])
+    return code.count("{") - code.count("}")
+
+
+def _collapse_braces(lines: List[str], terms: frozenset) -> List[str]:
+    out: List[str] = []
+    i = 0
+    n = len(lines)
+    while i < n:
+        line = lines[i]
+        if not _BRACE_DEF.match(line):
+            out.append(line)
+            i += 1
+            continue
+        depth = _brace_delta(line)
+        end = i + 1
+        while end < n and depth > 0:
+            depth += _brace_delta(lines[end])
+            end += 1
+        body = lines[i + 1 : end - 1] if depth <= 0 else lines[i + 1 : end]
+        if depth <= 0 and body and not _mentions("\n".join(body), terms):
+            out.append(line.rstrip() + " ... }")
+            i = end
+        else:
+            out.append(line)
+            i += 1
+    return out
+
+
+def _outline(lines: List[str], terms: frozenset) -> List[str]:
+    return [line for line in lines if _DEFINITION.match(line) or _mentions(line, terms)]
+
+
+def compress_code(text: str, file_path: str, terms: frozenset, level: str = "light") -> str:
+    """Extractively compress one code segment for a question's `terms`.
+
+    `level` is one of LEVELS; each includes the ones before it.
+    """
+    if not text:
+        return text
+    language = _language(file_path)
+    lines = _strip_light(text.splitlines(), language, terms)
+    if level in ("signatures", "outline"):
+        if language == "python":
+            lines = _collapse_python(lines, terms)
+        elif language == "slash":
+            lines = _collapse_braces(lines, terms)
+    if level == "outline":
+        lines = _outline(lines, terms)
+    return "\n".join(lines)
+
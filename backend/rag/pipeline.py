@@ -7,12 +7,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from analytics.metrics import record_query
+from ingestion.outline import summarize_file
+from settings import settings
 from auth.dependencies import get_current_user
 from database import crud
-from database.db import get_db
+from database.db import get_db, get_read_db
 from schemas.api_models import ChatHistoryMessage, ChatHistoryResponse, QueryRequest, QueryResponse
-from .retriever import retrieve_chunks
-from .compressor import compress_context
+from .retriever import retrieve_ranked_chunks
+from .compressor import pack_context
 from .llm import generate_answer, blend_general_and_rag_with_groq
 
 logger = logging.getLogger(__name__)
@@ -29,6 +31,29 @@ def _clip_to_token_budget(text: str, *, encoder, max_tokens: int) -> str:
     return encoder.decode(tokens[:max_tokens])
 
 
+def _file_summaries(db: Session, repo_id: int, paths: list[str]) -> dict[str, str]:
+    """Stored summaries by path; files ingested before summaries existed are summarized once and saved."""
+    rows = crud.get_file_summaries(db, repo_id, paths)
+    missing = [row for row in rows.values() if row.summary is None]
+    backfill: dict[int, str] = {}
+    if missing:
+        for code_file in crud.get_files_by_paths(db, repo_id, [row.file_path for row in missing]):
+            try:
+                text = crud.get_file_text(code_file)
+            except FileNotFoundError:
+                continue
+            backfill[int(code_file.id)] = summarize_file(code_file.language or "", text)
+        try:
+            crud.set_file_summaries(db, backfill)
+        except Exception:
+            db.rollback()
+            logger.exception("Saving file summaries failed repo_id=%s", repo_id)
+    by_id = {row.file_id: row for row in rows.values()}
+    out = {path: row.summary for path, row in rows.items() if row.summary}
+    out.update((by_id[file_id].file_path, summary) for file_id, summary in backfill.items())
+    return out
+
+
 def _build_rag_user_prompt(
     *,
     merged_context: str,
@@ -63,12 +88,31 @@ def _build_rag_user_prompt(
     return f"{prefix}{clipped_ctx}{suffix}"
 
 
+def _resolve_query_repos(db: Session, payload: QueryRequest, user_id: int) -> list[int]:
+    """Return the repo ids a query searches, enforcing ownership (404/403)."""
+    if payload.all_repos:
+        repo_ids = crud.list_repo_ids_by_user(db, user_id)
+        if not repo_ids:
+            raise HTTPException(status_code=404, detail="Repository not found")
+        return repo_ids
+
+    requested = list(dict.fromkeys(payload.repo_ids or ([payload.repo_id] if payload.repo_id is not None else [])))
+    if not requested:
+        raise HTTPException(status_code=400, detail="repo_id, repo_ids or all_repos is required")
+    owners = crud.get_repo_owner_ids(db, requested)
+    if any(repo_id not in owners for repo_id in requested):
+        raise HTTPException(status_code=404, detail="Repository not found")
+    if any(owners[repo_id] != user_id for repo_id in requested):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return requested
+
+
 @router.get("/repos/{repo_id}/chat/history", response_model=ChatHistoryResponse)
-def chat_history(repo_id: int, limit: int = 100, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    repo = crud.get_repo_by_id_any(db, repo_id)
-    if not repo:
+def chat_history(repo_id: int, limit: int = 100, db: Session = Depends(get_read_db), current_user=Depends(get_current_user)):
+    owner_id = crud.get_repo_owner_id(db, repo_id)
+    if owner_id is None:
         raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
+    if owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
     rows = crud.list_chat_messages_by_repo(db, user_id=current_user.id, repo_id=repo_id, limit=limit)
@@ -103,15 +147,16 @@ def chat_history(repo_id: int, limit: int = 100, db: Session = Depends(get_db),
 
 @router.post("/query", response_model=QueryResponse)
 def query(payload: QueryRequest, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    """Run the RAG pipeline for a repository question."""
+    """Run the RAG pipeline for a question over one or more repositories.
+
+    Single-repo questions are cached and saved to that repo's chat history;
+    multi-repo questions are answered fresh each time and not persisted.
+    """
     if not payload.question or not payload.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
-    repo = crud.get_repo_by_id_any(db, payload.repo_id)
-    if not repo:
-        raise HTTPException(status_code=404, detail="Repository not found")
-    if repo.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Forbidden")
+    repo_ids = _resolve_query_repos(db, payload, current_user.id)
+    single_repo_id = repo_ids[0] if len(repo_ids) == 1 else None
 
     start = time.perf_counter()
 
@@ -119,13 +164,15 @@ def query(payload: QueryRequest, db: Session = Depends(get_db), current_user=Dep
     if level not in {"beginner", "intermediate", "expert"}:
         level = "intermediate"
 
-    cached = crud.get_cached_chat_message(
-        db,
-        current_user.id,
-        payload.repo_id,
-        payload.question,
-        explain_level=level,
-    )
+    cached = None
+    if single_repo_id is not None:
+        cached = crud.get_cached_chat_message(
+            db,
+            current_user.id,
+            single_repo_id,
+            payload.question,
+            explain_level=level,
+        )
     if cached:
         try:
             referenced_files = json.loads(cached.referenced_files_json or "[]")
@@ -140,33 +187,34 @@ def query(payload: QueryRequest, db: Session = Depends(get_db), current_user=Dep
             cached=True,
         )
 
-    chunks, referenced_files = retrieve_chunks(db, payload.repo_id, payload.question)
-    referenced_files = sorted(set(referenced_files or []))
+    chunks = retrieve_ranked_chunks(db, repo_ids, payload.question)
+    refs = [(chunk.repo_id, chunk.file_path) for chunk in chunks]
+    # Multi-repo answers name files as "<repo_name>/<path>".
+    repo_names = crud.get_repo_names(db, repo_ids) if single_repo_id is None else {}
+
+    def _label(repo_id: int, file_path: str) -> str:
+        return f"{repo_names.get(repo_id, repo_id)}/{file_path}" if repo_names else file_path
+
+    referenced_files = sorted({_label(repo_id, file_path) for repo_id, file_path in refs})
 
-    # Build a richer repo context for the LLM by including the top file contents.
-    # This improves answer quality, especially when chunks are too small or missing key definitions.
+    # Give the LLM a file-level view next to the chunks: the ingest-time
+    # summaries (description, imports, definition signatures) of the top files.
+    # Chunks are re-ranked, so only the first few files are needed.
     file_context = ""
-    if referenced_files:
-        # Include up to a few files to keep prompts bounded.
-        files = crud.get_files_by_paths(db, payload.repo_id, referenced_files[:4])
+    if refs and settings.rag_context_files > 0:
+        top_refs = list(dict.fromkeys(refs))[: settings.rag_context_files]
         parts: list[str] = []
-        total_chars = 0
-        max_total_chars = 10_000
-        max_file_chars = 2_500
-        for f in files:
-            if total_chars >= max_total_chars:
-                break
-            raw = (getattr(f, "raw_content", "") or "").strip()
-            if not raw:
-                continue
-            clipped = raw[:max_file_chars]
-            block = f"File: {f.file_path}\n{clipped}"
-            parts.append(block)
-            total_chars += len(block)
+        for repo_id in dict.fromkeys(repo_id for repo_id, _ in top_refs):
+            paths = [file_path for ref_repo_id, file_path in top_refs if ref_repo_id == repo_id]
+            summaries = _file_summaries(db, repo_id, paths)
+            parts.extend(
+                f"File: {_label(repo_id, path)}\n{summaries[path]}" for path in paths if summaries.get(path)
+            )
         if parts:
             file_context = "\n\n".join(parts)
 
-    context = compress_context(chunks) if chunks else ""
+    packed = pack_context(chunks, payload.question, label=_label)
+    context = packed.text
     if level == "beginner":
         style = "Explain for a beginner engineer; define jargon briefly; use short paragraphs or bullets."
     elif level == "expert":
@@ -239,24 +287,31 @@ def query(payload: QueryRequest, db: Session = Depends(get_db), current_user=Dep
     token_usage = int(token_usage_rag or 0) + int(token_usage_general or 0) + int(token_usage_blend or 0)
     latency_ms = int((time.perf_counter() - start) * 1000)
 
-    record_query(token_usage, latency_ms)
-    logger.info("RAG query repo=%s latency=%sms tokens=%s", payload.repo_id, latency_ms, token_usage)
+    record_query(token_usage, latency_ms, packed.tokens_saved)
+    logger.info(
+        "RAG query repos=%s latency=%sms tokens=%s context_tokens_saved=%s",
+        repo_ids,
+        latency_ms,
+        token_usage,
+        packed.tokens_saved,
+    )
 
     # Persist the turn for later history + caching.
-    try:
-        crud.create_chat_message(
-            db,
-            user_id=current_user.id,
-            repo_id=payload.repo_id,
-            question=payload.question,
-            explain_level=level,
-            answer=answer,
-            referenced_files=referenced_files,
-            token_usage=token_usage,
-            latency_ms=latency_ms,
-        )
-    except Exception:
-        logger.exception("Failed to persist chat message")
+    if single_repo_id is not None:
+        try:
+            crud.create_chat_message(
+                db,
+                user_id=current_user.id,
+                repo_id=single_repo_id,
+                question=payload.question,
+                explain_level=level,
+                answer=answer,
+                referenced_files=referenced_files,
+                token_usage=token_usage,
+                latency_ms=latency_ms,
+            )
+        except Exception:
+            logger.exception("Failed to persist chat message")
 
     return QueryResponse(
         answer=answer,
@@ -264,4 +319,5 @@ def query(payload: QueryRequest, db: Session = Depends(get_db), current_user=Dep
         token_usage=token_usage,
         latency_ms=latency_ms,
         cached=False,
+        context_tokens_saved=packed.tokens_saved,
     )
@@ -1,71 +1,205 @@
 import logging
 import re
-from typing import List, Tuple
+from collections import Counter
+from typing import List, Sequence
 
+import numpy as np
 from sqlalchemy.orm import Session
 
 from settings import settings
 from database import crud
+from ingestion.graph import load_graph
 from vectorstore.embeddings import embed_query
-from vectorstore.faiss_index import get_metadata, search
+from vectorstore.base import get_vector_store
+from vectorstore.batcher import get_search_batcher
+from .reranker import RetrievedChunk, candidate_count, rerank
 
 logger = logging.getLogger(__name__)
 
+_BACKTICKED = re.compile(r"`([^`]+)`")
+_IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+_CODE_WORD = re.compile(r"(?<![\w.$])((?:[A-Za-z_$][\w$]*\.)*[A-Za-z_$][\w$]*)(\s*\()?")
+_CAMEL_HUMP = re.compile(r"[a-z0-9][A-Z]")
+_MAX_SYMBOL_NAMES = 8
+_MAX_DEFINITIONS_PER_NAME = 3
 
-def retrieve_chunks(db: Session, repo_id: int, question: str) -> Tuple[List[str], List[str]]:
-    """Retrieve top-k chunk contents and file paths for a repo."""
-
-    # Preferred path: semantic retrieval via FAISS if embeddings are configured and an index exists.
-    indices, metadata = [], []
-    if not settings.disable_embeddings:
-        try:
-            query_vector = embed_query(question)
-            indices, _ = search(repo_id, query_vector, settings.top_k)
-            metadata = get_metadata(repo_id)
-        except Exception:
-            indices, metadata = [], []
-
-    if indices and metadata:
-        chunk_ids: List[int] = []
-        referenced_files: List[str] = []
-        for idx in indices:
-            if idx == -1 or idx >= len(metadata):
-                continue
-            chunk_ids.append(int(metadata[idx]["chunk_id"]))
-            referenced_files.append(str(metadata[idx]["file_path"]))
-
-        chunks = crud.get_chunks_by_ids(db, chunk_ids)
-        chunk_map = {chunk.id: chunk.chunk_content for chunk in chunks}
-        ordered_chunks = [chunk_map[cid] for cid in chunk_ids if cid in chunk_map]
-        logger.info("Retrieved %s chunks via FAISS for repo %s", len(ordered_chunks), repo_id)
-        return ordered_chunks, referenced_files
 
+def retrieve_ranked_chunks(db: Session, repo_ids: Sequence[int], question: str) -> List[RetrievedChunk]:
+    """Fetch first-stage candidates, re-rank them and keep the best `settings.top_k`.
+
+    When the question names identifiers (`snake_case`, `camelCase`, `f()` or
+    backticked), their definitions are looked up in the symbol index first and
+    the chunks holding them lead the result. The first stage is vector search
+    when embeddings are available (hits from different repos merged by
+    distance, see `VectorStore.search_repos`), else lexical matching over chunk
+    text. See `rag/reranker.py` for the second.
+    """
+
+    repo_ids = list(dict.fromkeys(int(repo_id) for repo_id in repo_ids))
+    if not repo_ids:
+        return []
+    pinned = _symbol_chunks(db, repo_ids, question)
+    candidates = _vector_candidates(db, repo_ids, question) or _lexical_candidates(db, repo_ids, question)
+    if pinned:
+        pinned_ids = {c.chunk_id for c in pinned}
+        ranked = rerank(question, [c for c in candidates if c.chunk_id not in pinned_ids], settings.top_k - len(pinned))
+        # Definitions are as relevant as the best re-ranked chunk for context packing.
+        top_score = max((c.score for c in ranked), default=1.0)
+        ranked = [c._replace(score=top_score) for c in pinned] + ranked
+    else:
+        ranked = rerank(question, candidates, settings.top_k)
+    return _graph_expansion(db, ranked)
+
+
+def _graph_expansion(db: Session, ranked: List[RetrievedChunk]) -> List[RetrievedChunk]:
+    """Append callers/callees of the top hits' symbols (one hop, bounded).
+
+    Neighbours of the symbols defined in the first GRAPH_EXPANSION_SEEDS chunks
+    are scored by centrality x log(1 + references), discounted by the seed's
+    rank; the chunks holding the best GRAPH_EXPANSION_CHUNKS of them are added
+    after the ranked chunks with the lowest ranked score, so the context packer
+    only keeps them when the budget allows.
+    """
+
+    limit = int(settings.graph_expansion_chunks)
+    if limit <= 0 or not ranked:
+        return ranked
+    scores: dict[tuple[int, int], float] = {}
+    graphs = {}
+    for seed_rank, chunk in enumerate(ranked[: max(1, int(settings.graph_expansion_seeds))]):
+        if chunk.file_id is None or chunk.start_offset is None or chunk.end_offset is None:
+            continue
+        if chunk.repo_id not in graphs:
+            try:
+                graphs[chunk.repo_id] = load_graph(chunk.repo_id)
+            except Exception:
+                logger.exception("Loading graph failed repo_id=%s", chunk.repo_id)
+                graphs[chunk.repo_id] = None
+        graph = graphs[chunk.repo_id]
+        if graph is None:
+            continue
+        seeds = graph.symbols_in_span(chunk.file_id, chunk.start_offset, chunk.end_offset)
+        for node in seeds:
+            for matrix in (graph.calls, graph.called_by):
+                targets, weights = matrix.row(int(node))
+                values = graph.symbol_rank[targets] * np.log1p(weights) / (1 + seed_rank)
+                for target, value in zip(targets.tolist(), values.tolist()):
+                    key = (chunk.repo_id, target)
+                    scores[key] = scores.get(key, 0.0) + value
+        for node in seeds:
+            scores.pop((chunk.repo_id, int(node)), None)
+    if not scores:
+        return ranked
+
+    seen = {c.chunk_id for c in ranked}
+    floor = min(c.score for c in ranked)
+    added: List[RetrievedChunk] = []
+    for (repo_id, node), _ in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        if len(added) >= limit:
+            break
+        graph = graphs[repo_id]
+        file_id = int(graph.file_ids[graph.symbol_files[node]])
+        start, end = (int(x) for x in graph.symbol_offsets[node])
+        for row in crud.get_chunk_rows_by_span(db, file_id, start, end, limit=1):
+            if row.chunk_id not in seen:
+                seen.add(row.chunk_id)
+                added.append(RetrievedChunk.from_row(row, repo_id)._replace(score=floor))
+    if added:
+        logger.info("Graph expansion added %s chunks", len(added))
+    return ranked + added
+
+
+def mentioned_identifiers(question: str) -> List[str]:
+    """Code identifiers named in a question, in order: backticked words, `f(`,
+    and words that only make sense as code (snake_case, camelCase, dotted)."""
+
+    names: List[str] = []
+    for quoted in _BACKTICKED.findall(question or ""):
+        names.extend(_IDENTIFIER.findall(quoted)[-1:])
+    for match in _CODE_WORD.finditer(question or ""):
+        word = match.group(1).split(".")[-1]
+        called = match.group(2)
+        if called or "_" in word.strip("_") or word.startswith("_") or _CAMEL_HUMP.search(word) or "." in match.group(1):
+            names.append(word)
+    return list(dict.fromkeys(n for n in names if len(n) >= 3))
+
+
+def _symbol_chunks(db: Session, repo_ids: List[int], question: str) -> List[RetrievedChunk]:
+    """Chunks holding the definitions of identifiers the question names (exact index lookup)."""
+    names = mentioned_identifiers(question)
+    if not names:
+        return []
+    limit = max(1, settings.top_k // 2)
+    definitions = crud.find_symbol_definitions(db, repo_ids, names[:_MAX_SYMBOL_NAMES])
+    # A name defined in many places (`__init__`, `main`) does not point anywhere.
+    counts = Counter(d.name for d in definitions)
+    definitions = [d for d in definitions if counts[d.name] <= _MAX_DEFINITIONS_PER_NAME]
+    definitions.sort(key=lambda d: (names.index(d.name), d.kind == "method", d.file_path))
+
+    chunks: List[RetrievedChunk] = []
+    seen: set[int] = set()
+    for definition in definitions:
+        for row in crud.get_chunk_rows_by_span(db, definition.file_id, definition.start_offset, definition.end_offset):
+            if row.chunk_id not in seen and len(chunks) < limit:
+                seen.add(row.chunk_id)
+                chunks.append(RetrievedChunk.from_row(row, definition.repo_id))
+    if chunks:
+        logger.info("Pinned %s definition chunks for %s in repos %s", len(chunks), names, repo_ids)
+    return chunks
+
+
+def _vector_candidates(db: Session, repo_ids: List[int], question: str) -> List[RetrievedChunk]:
+    # Preferred path: semantic retrieval if embeddings are configured and the repo has vectors.
+    if settings.disable_embeddings:
+        return []
+    limit = candidate_count(settings.top_k)
+    try:
+        query_vector = embed_query(question)
+        if len(repo_ids) == 1:
+            hits = get_search_batcher().search(repo_ids[0], query_vector, limit)
+        else:
+            hits = get_vector_store().search_repos(repo_ids, query_vector, limit)
+    except Exception:
+        return []
+    if not hits:
+        return []
+
+    chunk_map = crud.get_chunk_rows_by_ids(db, [hit.chunk_id for hit in hits])
+    # Single-repo stores may not tag hits with their repo.
+    candidates = [
+        RetrievedChunk.from_row(chunk_map[hit.chunk_id], hit.repo_id or repo_ids[0])
+        for hit in hits
+        if hit.chunk_id in chunk_map
+    ]
+    logger.info("Retrieved %s candidates via vector search for repos %s", len(candidates), repo_ids)
+    return candidates
+
+
+def _lexical_candidates(db: Session, repo_ids: List[int], question: str) -> List[RetrievedChunk]:
     # Fallback path: lexical retrieval over DB chunks (works without any external API keys).
     lexical_limit = max(200, settings.top_k * 50)
-    rows = crud.search_chunks_lexical(db, repo_id, question, limit=lexical_limit)
+    rows: List[tuple[int, crud.ChunkRow]] = []  # (repo_id, chunk row)
+    for repo_id in repo_ids:
+        rows.extend((repo_id, row) for row in crud.search_chunk_rows_lexical(db, repo_id, question, limit=lexical_limit))
     if not rows:
         # If nothing matches, still return a few chunks so the LLM has context.
-        rows = crud.search_chunks_lexical(db, repo_id, "", limit=lexical_limit)
+        for repo_id in repo_ids:
+            rows.extend((repo_id, row) for row in crud.search_chunk_rows_lexical(db, repo_id, "", limit=lexical_limit))
     if not rows:
-        return [], []
+        return []
 
     terms = [t for t in re.split(r"\W+", question.lower()) if len(t) >= 3]
-    scored: List[tuple[int, str, str]] = []  # (score, chunk_content, file_path)
-    for chunk_content, file_path in rows:
-        text = (chunk_content or "").lower()
+    scored: List[tuple[int, int, crud.ChunkRow]] = []  # (score, repo_id, chunk row)
+    for repo_id, row in rows:
+        text = (row.text or "").lower()
         score = 0
         for term in terms:
             if term in text:
                 score += text.count(term)
-        scored.append((score, chunk_content, file_path))
+        scored.append((score, repo_id, row))
 
     scored.sort(key=lambda x: x[0], reverse=True)
-    top = scored[: settings.top_k]
-    if top and top[0][0] == 0:
-        # If no terms matched at all, still return the first few chunks so the LLM has some context.
-        top = scored[: settings.top_k]
-
-    ordered_chunks = [c for _, c, _ in top]
-    referenced_files = [p for _, _, p in top]
-    logger.info("Retrieved %s chunks via lexical fallback for repo %s", len(ordered_chunks), repo_id)
-    return ordered_chunks, referenced_files
+    # If no terms matched at all, this still returns the first few chunks so the LLM has some context.
+    top = scored[: candidate_count(settings.top_k)]
+    logger.info("Retrieved %s candidates via lexical fallback for repos %s", len(top), repo_ids)
+    return [RetrievedChunk.from_row(row, repo_id) for _, repo_id, row in top]
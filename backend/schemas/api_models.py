@@ -57,12 +57,38 @@ class RepoIngestResponse(BaseModel):
     created_at: str
     status: str
     file_count: int
+    job_id: Optional[int] = None
+
+
+class IngestionStatusResponse(BaseModel):
+    job_id: int
+    repo_id: int
+    repo_status: str
+    state: str
+    stage: str
+    files_total: int
+    files_done: int
+    chunks_done: int
+    embeddings_total: int
+    embeddings_done: int
+    attempts: int
+    queue_position: Optional[int] = None
+    wait_ms: int = 0
+    estimated_size_kb: Optional[int] = None
+    error: Optional[str] = None
+    timings_ms: Dict[str, int] = {}
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    updated_at: Optional[str] = None
 
 
 class RepoReingestRequest(BaseModel):
     """Request body for re-running ingestion on an existing repository."""
 
     branch: Optional[str] = "main"
+    # False: keep unchanged files and their vectors, re-index only changed files.
+    full: bool = False
 
 
 class FileResponse(BaseModel):
@@ -89,6 +115,8 @@ class FileExplainResponse(BaseModel):
 
     # When no chunks exist
     message: Optional[str] = None
+    # Served from the explanation cache (ingestion/explanations.py)
+    cached: bool = False
 
 
 class FileExplainRequest(BaseModel):
@@ -96,9 +124,10 @@ class FileExplainRequest(BaseModel):
 
 
 class FileExplainSymbolRequest(BaseModel):
-    function_name: str
-    start_line: int
-    end_line: int
+    function_name: str  # `name` or `Class.name`
+    # Optional: looked up in the symbol index when omitted.
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
     level: Optional[str] = None
 
 
@@ -109,6 +138,51 @@ class WhyWrittenRequest(BaseModel):
     level: Optional[str] = None
 
 
+class SymbolDefinitionResponse(BaseModel):
+    file_id: int
+    file_path: str
+    name: str
+    kind: str
+    parent: Optional[str] = None
+    signature: str
+    start_line: int
+    end_line: int
+
+
+class SymbolReferenceResponse(BaseModel):
+    file_id: int
+    file_path: str
+    line: int
+
+
+class SymbolLookupResponse(BaseModel):
+    name: str
+    definitions: List[SymbolDefinitionResponse] = []
+    references: List[SymbolReferenceResponse] = []
+
+
+class GraphNodeResponse(BaseModel):
+    id: int  # code_files id (module level) or code_symbols id (function level)
+    label: str
+    file_path: str
+    kind: str  # module | class | type | function | method
+    centrality: float  # PageRank, 1.0 = most central
+
+
+class GraphEdgeResponse(BaseModel):
+    source: int
+    target: int
+    weight: int  # number of references
+
+
+class RepoGraphResponse(BaseModel):
+    level: str
+    node_count: int
+    edge_count: int
+    nodes: List[GraphNodeResponse] = []
+    edges: List[GraphEdgeResponse] = []
+
+
 class FileMetricsResponse(BaseModel):
     lines: int
     chunks: int
@@ -131,7 +205,11 @@ class DashboardOverview(BaseModel):
 
 
 class QueryRequest(BaseModel):
-    repo_id: int
+    """Question scope: one `repo_id`, a list of `repo_ids`, or `all_repos`."""
+
+    repo_id: Optional[int] = None
+    repo_ids: Optional[List[int]] = None
+    all_repos: bool = False
     question: str
     explain_level: Optional[str] = None
 
@@ -142,6 +220,7 @@ class QueryResponse(BaseModel):
     token_usage: int
     latency_ms: int
     cached: bool = False
+    context_tokens_saved: int = 0
 
 
 class ChatHistoryMessage(BaseModel):
@@ -163,3 +242,5 @@ class AnalyticsResponse(BaseModel):
     total_chunks: int
     avg_query_latency_ms: int
     token_usage: int
+    context_tokens_saved: int = 0
+    avg_context_tokens_saved: int = 0
@@ -36,6 +36,9 @@ class Settings:
         self.database_url = self._normalize_database_url(
             os.getenv("DATABASE_URL", "sqlite:///./codelens.db")
         )
+        # Optional separate URL for read-only query paths (e.g. a replica). For a
+        # SQLite file the read pool defaults to query_only connections on the same file.
+        self.database_read_url = self._normalize_database_url(os.getenv("DATABASE_READ_URL", ""))
         self.secret_key = os.getenv("SECRET_KEY", "change-me")
         self.algorithm = os.getenv("ALGORITHM", "HS256")
         self.access_token_expire_minutes = int(
@@ -56,17 +59,130 @@ class Settings:
         # Chunking defaults tuned for fewer, larger chunks (faster ingest) while preserving overlap.
         self.chunk_size_tokens = int(os.getenv("CHUNK_SIZE_TOKENS", "1000"))
         self.chunk_overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+        # Files per ingestion commit; each committed batch is a resume checkpoint.
+        self.ingest_batch_files = int(os.getenv("INGEST_BATCH_FILES", "200"))
+
+        # Ingestion worker pool. "embedded" spawns worker processes from the API at
+        # startup; "external" only enqueues and expects `python -m ingestion.worker`.
+        self.ingest_worker_mode = os.getenv("INGEST_WORKER_MODE", "embedded")
+        self.ingest_worker_concurrency = int(os.getenv("INGEST_WORKER_CONCURRENCY", "2"))
+        self.ingest_poll_interval_seconds = float(os.getenv("INGEST_POLL_INTERVAL_SECONDS", "1.0"))
+        self.ingest_heartbeat_seconds = int(os.getenv("INGEST_HEARTBEAT_SECONDS", "15"))
+        self.ingest_job_lease_seconds = int(os.getenv("INGEST_JOB_LEASE_SECONDS", "120"))
+
+        # Scheduling across users: caps on running jobs (0 = unlimited), small-repo
+        # priority from a GitHub size probe, and aging so large repos are not starved.
+        self.ingest_max_running_jobs = int(os.getenv("INGEST_MAX_RUNNING_JOBS", "4"))
+        self.ingest_max_jobs_per_user = int(os.getenv("INGEST_MAX_JOBS_PER_USER", "1"))
+        self.ingest_default_size_kb = int(os.getenv("INGEST_DEFAULT_SIZE_KB", "50000"))
+        self.ingest_priority_aging_seconds = int(os.getenv("INGEST_PRIORITY_AGING_SECONDS", "300"))
+        self.ingest_size_probe_timeout_seconds = float(os.getenv("INGEST_SIZE_PROBE_TIMEOUT_SECONDS", "3"))
+        # Embedding-API budget shared fairly by running jobs (0 = unlimited).
+        self.embedding_tokens_per_minute = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "0"))
+
+        # Connection profile. Pool defaults leave room for the API threadpool plus
+        # the ingestion workers' commits and heartbeats.
+        self.db_pool_size = int(
+            os.getenv("DB_POOL_SIZE", str(max(5, 2 * self.ingest_worker_concurrency + 4)))
+        )
+        self.db_max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+        self.sqlite_journal_mode = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+        self.sqlite_synchronous = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+        self.sqlite_busy_timeout_ms = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        self.sqlite_cache_size_kb = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+        self.sqlite_mmap_size_mb = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
+        # File contents live in a content-addressed blob store under DATA_DIR/blobs
+        # (zstd when `zstandard` is installed, zlib otherwise) with an in-process LRU.
+        self.blob_zstd_level = int(os.getenv("BLOB_ZSTD_LEVEL", "6"))
+        self.blob_cache_mb = int(os.getenv("BLOB_CACHE_MB", "64"))
 
         # Embeddings are optional; set DISABLE_EMBEDDINGS=true to force lexical-only mode.
         self.disable_embeddings = os.getenv("DISABLE_EMBEDDINGS", "false").lower() == "true"
         self.embeddings_batch_size = int(os.getenv("EMBEDDINGS_BATCH_SIZE", "64"))
+        # Embedding provider: "openrouter" (remote API, needs OPENROUTER_API_KEY) or
+        # "local" (on-box CPU model, see vectorstore/local_embeddings.py).
+        self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "openrouter").strip().lower()
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+        # Local provider: a sentence-transformers model name/path, or a directory
+        # with model.onnx + tokenizer.json for the ONNX Runtime backend.
+        self.local_embedding_model = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        self.local_embedding_backend = os.getenv("LOCAL_EMBEDDING_BACKEND", "auto").strip().lower()
+        self.local_embedding_threads = int(os.getenv("LOCAL_EMBEDDING_THREADS", str(os.cpu_count() or 1)))
+        self.local_embedding_batch_size = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+        self.local_embedding_max_tokens = int(os.getenv("LOCAL_EMBEDDING_MAX_TOKENS", "256"))
+        # Shorter embeddings (0 = model default). "api" requests/truncates to this
+        # size; "pca" projects full vectors with a locally trained PCA matrix.
+        self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+        self.embedding_reduction = os.getenv("EMBEDDING_REDUCTION", "api").strip().lower()
         self.chat_model = os.getenv("CHAT_MODEL", "openai/gpt-4o-mini")
         self.llm_provider = os.getenv("LLM_PROVIDER", "groq")
         self.openrouter_base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
         self.groq_model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+        # Vector store backend: "faiss" (in-process, per-repo files under DATA_DIR)
+        # or "pgvector" (shared PostgreSQL table with an HNSW index).
+        self.vector_store = os.getenv("VECTOR_STORE", "faiss")
+        self.pgvector_database_url = os.getenv(
+            "PGVECTOR_DATABASE_URL",
+            self.database_url if self.database_url.startswith("postgres") else "",
+        )
+        self.pgvector_dimensions = int(os.getenv("PGVECTOR_DIMENSIONS", "0"))
+        self.pgvector_hnsw_m = int(os.getenv("PGVECTOR_HNSW_M", "16"))
+        self.pgvector_hnsw_ef_construction = int(os.getenv("PGVECTOR_HNSW_EF_CONSTRUCTION", "64"))
+        self.pgvector_ef_search = int(os.getenv("PGVECTOR_EF_SEARCH", "64"))
+        self.pgvector_pool_size = int(os.getenv("PGVECTOR_POOL_SIZE", "4"))
+        # Queries to the same repo arriving within this window are searched as one
+        # batch (0 disables micro-batching).
+        self.vector_batch_window_ms = float(os.getenv("VECTOR_BATCH_WINDOW_MS", "2"))
+        self.vector_batch_max = int(os.getenv("VECTOR_BATCH_MAX", "64"))
+        # FAISS storage per repo: flat (float32), fp16, sq8 or pq. Compressed indexes
+        # keep float32 copies on disk for exact re-ranking of the top
+        # k * FAISS_RERANK_FACTOR candidates (0 disables re-ranking). Repos stay
+        # flat until they reach FAISS_TRAIN_MIN_VECTORS vectors.
+        self.faiss_index_type = os.getenv("FAISS_INDEX_TYPE", "flat")
+        # Per-repo overrides, e.g. "12=pq,15=flat".
+        self.faiss_index_type_by_repo = {
+            int(repo_id): index_type.strip()
+            for repo_id, _, index_type in (
+                item.strip().partition("=") for item in os.getenv("FAISS_INDEX_TYPE_BY_REPO", "").split(",")
+            )
+            if repo_id.strip().isdigit() and index_type.strip()
+        }
+        self.faiss_pq_m = int(os.getenv("FAISS_PQ_M", "32"))
+        self.faiss_rerank_factor = int(os.getenv("FAISS_RERANK_FACTOR", "4"))
+        self.faiss_train_min_vectors = int(os.getenv("FAISS_TRAIN_MIN_VECTORS", "10000"))
+        # Threads used to fan a multi-repo query out over per-repo FAISS indexes.
+        self.multi_repo_search_workers = int(os.getenv("MULTI_REPO_SEARCH_WORKERS", "8"))
         self.top_k = int(os.getenv("RAG_TOP_K", "4"))
         self.max_context_tokens = int(os.getenv("MAX_CONTEXT_TOKENS", "1800"))
+        # Second-stage re-ranking: fetch RERANK_CANDIDATES chunks, keep the best
+        # RAG_TOP_K. RERANKER=lexical|cross-encoder|none (see rag/reranker.py).
+        self.reranker = os.getenv("RERANKER", "lexical").strip().lower()
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "50"))
+        self.rerank_first_stage_weight = float(os.getenv("RERANK_FIRST_STAGE_WEIGHT", "0.2"))
+        self.rerank_model = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+        self.rerank_batch_size = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.rerank_budget_ms = int(os.getenv("RERANK_BUDGET_MS", "150"))
+        # One-hop expansion over the repo dependency graph (ingestion/graph.py):
+        # callers/callees of the symbols in the first GRAPH_EXPANSION_SEEDS
+        # hits add up to GRAPH_EXPANSION_CHUNKS chunks (0 disables).
+        self.graph_expansion_chunks = int(os.getenv("GRAPH_EXPANSION_CHUNKS", "2"))
+        self.graph_expansion_seeds = int(os.getenv("GRAPH_EXPANSION_SEEDS", "3"))
+        # File summaries added next to the top chunks (files in rank order).
+        # Summaries are outlines computed at ingest time, capped at
+        # FILE_SUMMARY_MAX_CHARS each (see ingestion/outline.py).
+        self.rag_context_files = int(os.getenv("RAG_CONTEXT_FILES", "4"))
+        self.file_summary_max_chars = int(os.getenv("FILE_SUMMARY_MAX_CHARS", "1200"))
+        # After each ingestion, regenerate the whole-file explanations of the
+        # EXPLAIN_PREGENERATE_FILES most-requested (file, level) pairs whose file
+        # changed (ingestion/explanations.py; 0 disables, LLM calls run in the worker).
+        self.explain_pregenerate_files = int(os.getenv("EXPLAIN_PREGENERATE_FILES", "0"))
+        # Risk radar heuristics run at ingest time in a process pool of this
+        # many workers (0 = CPU count, at most 4; 1 scans in-process).
+        self.risk_scan_workers = int(os.getenv("RISK_SCAN_WORKERS", "0"))
+        # Per-file time budget for those heuristics (0 = unlimited); checks left
+        # when it runs out are skipped and reported as a finding.
+        self.risk_scan_budget_ms = int(os.getenv("RISK_SCAN_BUDGET_MS", "250"))
 
         # Optional OAuth (for GitHub/Google login). If client creds are not set,
         # OAuth endpoints will return 503 with a clear message.
@@ -75,8 +191,12 @@ class Settings:
         self.google_client_id = os.getenv("GOOGLE_CLIENT_ID", "")
         self.google_client_secret = os.getenv("GOOGLE_CLIENT_SECRET", "")
 
-        # Optional external compression provider (defaults to local token trimming)
+        # Context compression: "local" (query-aware extractive, rag/extractive.py),
+        # "scaledown" (external service) or "none" (packing only).
         self.compression_provider = os.getenv("COMPRESSION_PROVIDER", "local")
+        # Local compression collapses function bodies until the context is at most
+        # this fraction of its original tokens.
+        self.compression_target_ratio = float(os.getenv("COMPRESSION_TARGET_RATIO", "0.6"))
         self.scaledown_api_key = os.getenv("SCALEDOWN_API_KEY", "")
         self.scaledown_api_url = os.getenv("SCALEDOWN_API_URL", "")
 
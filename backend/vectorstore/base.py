@@ -0,0 +1,122 @@
+"""Vector store interface shared by the FAISS and pgvector backends.
+
+Callers (ingestion jobs, the retriever, repo deletion) go through
+`get_vector_store()`; the backend is chosen with VECTOR_STORE=faiss|pgvector.
+"""
+
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class VectorHit(NamedTuple):
+    chunk_id: int
+    file_path: str
+    distance: float
+    repo_id: int = 0
+
+
+class VectorStore:
+    """Per-repo nearest-neighbour index over chunk embeddings.
+
+    Metadata rows passed to `add` carry `chunk_id`, `file_path` and
+    `token_count` for each vector, in the same order. Vectors are keyed by
+    chunk id: adding an id that is already indexed replaces its vector.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def load(self) -> None:
+        """Prepare the store at process startup (load indexes, create tables)."""
+
+    def add(self, repo_id: int, embeddings: List[List[float]], metadata: List[dict], persist: bool = True) -> None:
+        """Add vectors; with persist=False a store may hold them in memory until `flush`."""
+        raise NotImplementedError
+
+    def flush(self, repo_id: int) -> None:
+        """Persist vectors added with persist=False (no-op for stores that write through)."""
+
+    def search(
+        self,
+        repo_id: int,
+        query_vector: List[float],
+        top_k: int,
+        *,
+        file_paths: Optional[Sequence[str]] = None,
+    ) -> List[VectorHit]:
+        """Nearest chunks for a query, optionally restricted to some file paths."""
+        raise NotImplementedError
+
+    def search_batch(
+        self,
+        repo_id: int,
+        query_vectors: Sequence[List[float]],
+        top_k: int,
+        *,
+        file_paths: Optional[Sequence[str]] = None,
+    ) -> List[List[VectorHit]]:
+        """Nearest chunks for several queries against one repo, in query order."""
+        return [self.search(repo_id, vector, top_k, file_paths=file_paths) for vector in query_vectors]
+
+    def search_repos(self, repo_ids: Sequence[int], query_vector: List[float], top_k: int) -> List[VectorHit]:
+        """Nearest chunks across several repos: parallel per-repo searches, k-way merged by distance."""
+        repo_ids = list(dict.fromkeys(int(repo_id) for repo_id in repo_ids))
+        if not repo_ids:
+            return []
+        if len(repo_ids) == 1:
+            return self.search(repo_ids[0], query_vector, top_k)
+        workers = max(1, min(len(repo_ids), int(settings.multi_repo_search_workers)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            per_repo = list(pool.map(lambda repo_id: self.search(repo_id, query_vector, top_k), repo_ids))
+        # Each per-repo list is already sorted by distance.
+        merged = heapq.merge(*per_repo, key=lambda hit: hit.distance)
+        return [hit for _, hit in zip(range(int(top_k)), merged)]
+
+    def indexed_chunk_ids(self, repo_id: int) -> set[int]:
+        """Chunk ids that already have a vector (used to resume ingestion)."""
+        raise NotImplementedError
+
+    def delete_chunks(self, repo_id: int, chunk_ids: Sequence[int]) -> None:
+        """Remove the vectors of specific chunks (no-op for ids that are not indexed)."""
+        raise NotImplementedError
+
+    def delete_files(self, repo_id: int, file_paths: Sequence[str]) -> None:
+        """Remove every vector of the given files (used by incremental re-ingestion)."""
+        raise NotImplementedError
+
+    def delete_repo(self, repo_id: int) -> None:
+        raise NotImplementedError
+
+
+_STORE: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """Return the process-wide vector store selected by settings.vector_store."""
+
+    global _STORE
+    if _STORE is not None:
+        return _STORE
+
+    backend = (settings.vector_store or "faiss").strip().lower()
+    if backend == "pgvector":
+        from .pgvector_store import PgVectorStore
+
+        _STORE = PgVectorStore(settings.pgvector_database_url)
+    else:
+        if backend != "faiss":
+            logger.warning("Unknown VECTOR_STORE=%s; using faiss", backend)
+        from settings import DATA_DIR
+        from .faiss_index import FaissVectorStore
+
+        _STORE = FaissVectorStore(DATA_DIR)
+    return _STORE
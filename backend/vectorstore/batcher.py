@@ -0,0 +1,104 @@
+"""Micro-batching for vector searches.
+
+Concurrent requests (API threads, bulk jobs) that search the same repo within
+`VECTOR_BATCH_WINDOW_MS` of each other are combined into one
+`VectorStore.search_batch` call, which FAISS answers with a single matrix
+search instead of one per query. The first caller of a window waits for it to
+close (or for `VECTOR_BATCH_MAX` queries) and runs the batch for everyone.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from settings import settings
+from .base import VectorHit, VectorStore, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+_BatchKey = Tuple[int, int]
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.vectors: List[List[float]] = []
+        self.futures: List[Future] = []
+        self.full = threading.Event()
+
+
+class SearchBatcher:
+    """Collect same-repo searches for a few milliseconds and run them together."""
+
+    def __init__(self, store: VectorStore, *, window_ms: float, max_batch: int) -> None:
+        self.store = store
+        self.window_s = max(0.0, float(window_ms)) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self._lock = threading.Lock()
+        self._open: Dict[_BatchKey, _Batch] = {}
+
+    def search(self, repo_id: int, query_vector: List[float], top_k: int) -> List[VectorHit]:
+        if self.window_s <= 0 or self.max_batch <= 1:
+            return self.store.search(repo_id, query_vector, top_k)
+
+        key = (int(repo_id), int(top_k))
+        future: Future = Future()
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            batch.vectors.append(query_vector)
+            batch.futures.append(future)
+            if len(batch.vectors) >= self.max_batch:
+                # Close the batch now so later queries start a new one.
+                self._open.pop(key, None)
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window_s)
+            with self._lock:
+                if self._open.get(key) is batch:
+                    del self._open[key]
+            self._run(key, batch)
+        return future.result()
+
+    def search_many(self, repo_id: int, query_vectors: List[List[float]], top_k: int) -> List[List[VectorHit]]:
+        """Search a caller-side batch directly (bulk jobs that already hold many queries)."""
+        results: List[List[VectorHit]] = []
+        for offset in range(0, len(query_vectors), self.max_batch):
+            chunk = query_vectors[offset : offset + self.max_batch]
+            results.extend(self.store.search_batch(repo_id, chunk, top_k))
+        return results
+
+    def _run(self, key: _BatchKey, batch: _Batch) -> None:
+        repo_id, top_k = key
+        try:
+            results = self.store.search_batch(repo_id, batch.vectors, top_k)
+        except Exception as exc:
+            for future in batch.futures:
+                future.set_exception(exc)
+            return
+        for future, hits in zip(batch.futures, results):
+            future.set_result(hits)
+        if len(batch.vectors) > 1:
+            logger.debug("Vector search batch repo_id=%s size=%s", repo_id, len(batch.vectors))
+
+
+_BATCHER: Optional[SearchBatcher] = None
+_BATCHER_LOCK = threading.Lock()
+
+
+def get_search_batcher() -> SearchBatcher:
+    """Return the process-wide batcher over `get_vector_store()`."""
+
+    global _BATCHER
+    if _BATCHER is None:
+        with _BATCHER_LOCK:
+            if _BATCHER is None:
+                _BATCHER = SearchBatcher(
+                    get_vector_store(),
+                    window_ms=settings.vector_batch_window_ms,
+                    max_batch=settings.vector_batch_max,
+                )
+    return _BATCHER
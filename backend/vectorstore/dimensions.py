@@ -0,0 +1,137 @@
+"""Embedding dimensionality reduction (EMBEDDING_DIMENSIONS).
+
+Two ways to get shorter vectors, applied identically to chunk and query
+embeddings in `vectorstore.embeddings`:
+
+- `api` (default): ask the provider for `dimensions` (text-embedding-3-*
+  supports it). Longer vectors that still come back are truncated to the first
+  `dimensions` values and re-normalized, which is what the API does for these
+  Matryoshka-trained models.
+- `pca`: keep full-size API vectors and project them with a `faiss.PCAMatrix`
+  trained locally and saved under the vector store data directory:
+
+      python -m vectorstore.dimensions train-pca <repo_id> <dimensions>
+
+  trains it from an existing full-dimension FAISS repo index.
+
+Changing the dimension invalidates existing vectors: re-ingest with
+`{"full": true}`. `python -m benchmarks.dimension_recall` measures the recall
+lost at each candidate size before switching.
+"""
+
+import logging
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import faiss  # type: ignore
+    _FAISS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+    _FAISS_AVAILABLE = False
+import numpy as np
+
+from settings import DATA_DIR, settings
+
+logger = logging.getLogger(__name__)
+
+_pca_lock = threading.Lock()
+_pca: Optional["faiss.PCAMatrix"] = None
+_pca_path: Optional[Path] = None
+
+
+def pca_path(dimensions: Optional[int] = None) -> Path:
+    """Where the PCA transform for a target dimension is stored."""
+    dims = int(dimensions or settings.embedding_dimensions)
+    name = settings.local_embedding_model if settings.embedding_provider == "local" else settings.embedding_model
+    model = "".join(ch if ch.isalnum() else "-" for ch in name)
+    return DATA_DIR / f"pca_{model}_{dims}.bin"
+
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """Matryoshka truncation: keep the first `dimensions` values and L2-normalize."""
+    cut = np.ascontiguousarray(vectors[:, : int(dimensions)], dtype="float32")
+    norms = np.linalg.norm(cut, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return cut / norms
+
+
+def train_pca(vectors: np.ndarray, dimensions: int) -> "faiss.PCAMatrix":
+    """Fit a PCA projection from full-size vectors down to `dimensions`."""
+    if not _FAISS_AVAILABLE:
+        raise RuntimeError("faiss is required for PCA reduction")
+    data = np.ascontiguousarray(vectors, dtype="float32")
+    pca = faiss.PCAMatrix(int(data.shape[1]), int(dimensions))
+    pca.train(data)
+    return pca
+
+
+def _load_pca() -> "faiss.PCAMatrix":
+    global _pca, _pca_path
+    path = pca_path()
+    with _pca_lock:
+        if _pca is None or _pca_path != path:
+            if not path.exists():
+                raise RuntimeError(
+                    f"PCA transform {path.name} not found; run python -m vectorstore.dimensions train-pca"
+                )
+            _pca = faiss.read_VectorTransform(str(path))
+            _pca_path = path
+        return _pca
+
+
+def request_dimensions() -> Optional[int]:
+    """`dimensions` to send to the embeddings API (None = model default)."""
+    dims = int(settings.embedding_dimensions or 0)
+    if dims <= 0 or settings.embedding_reduction == "pca":
+        return None
+    return dims
+
+
+def reduce_vectors(vectors: List[List[float]]) -> List[List[float]]:
+    """Bring provider vectors to EMBEDDING_DIMENSIONS (no-op when unset)."""
+    dims = int(settings.embedding_dimensions or 0)
+    if dims <= 0 or not vectors:
+        return vectors
+    matrix = np.asarray(vectors, dtype="float32")
+    if settings.embedding_reduction == "pca":
+        pca = _load_pca()
+        if matrix.shape[1] == pca.d_out:
+            return vectors
+        return pca.apply_py(matrix).tolist()
+    if matrix.shape[1] <= dims:
+        return vectors
+    return truncate(matrix, dims).tolist()
+
+
+def _repo_vectors(repo_id: int) -> np.ndarray:
+    """Full vectors of a repo from its FAISS index (flat) or raw vector file."""
+    from vectorstore import faiss_index
+
+    faiss_index.refresh_index(DATA_DIR, repo_id)
+    index = faiss_index.INDEXES.get(repo_id)
+    if index is None or not index.ntotal:
+        raise SystemExit(f"repo {repo_id} has no FAISS index under {DATA_DIR}")
+    metadata = faiss_index.METADATA.get(repo_id, {})
+    raw = faiss_index.RAW_VECTORS.get(repo_id)
+    rows = [row.get("row") for row in metadata.values()]
+    if raw is not None and rows and all(row is not None for row in rows):
+        return raw.read(rows)
+    return np.vstack([index.reconstruct(int(chunk_id)) for chunk_id in metadata]).astype("float32")
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m vectorstore.dimensions train-pca <repo_id> <dimensions>
+    if len(sys.argv) == 4 and sys.argv[1] == "train-pca" and sys.argv[2].isdigit() and sys.argv[3].isdigit():
+        target = int(sys.argv[3])
+        data = _repo_vectors(int(sys.argv[2]))
+        if len(data) < target:
+            raise SystemExit(f"need at least {target} vectors to train, repo has {len(data)}")
+        transform = train_pca(data, target)
+        out = pca_path(target)
+        faiss.write_VectorTransform(transform, str(out))
+        print(f"Trained PCA {data.shape[1]} -> {target} on {len(data)} vectors: {out}")
+    else:
+        print("Usage: python -m vectorstore.dimensions train-pca <repo_id> <dimensions>")
@@ -1,9 +1,35 @@
-from typing import List
+"""Embedding providers.
+
+`embed_texts` / `embed_query` go through the provider selected by
+EMBEDDING_PROVIDER: "openrouter" (remote API) or "local" (on-box CPU model,
+`vectorstore/local_embeddings.py`). Both return vectors already brought to
+EMBEDDING_DIMENSIONS (see `vectorstore/dimensions.py`).
+"""
+
+import logging
 import os
+import threading
+from typing import List, Optional
 
 import httpx
 
 from settings import settings
+from .dimensions import reduce_vectors, request_dimensions
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingProvider:
+    """Turns texts into vectors; `available` says whether it can run here."""
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return False
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
 
 
 def _get_openrouter_key() -> str:
@@ -32,6 +58,66 @@ def _embeddings_endpoint() -> str:
     return f"{base_url}/embeddings"
 
 
+def _payload(texts: List[str]) -> dict:
+    payload = {"model": settings.embedding_model, "input": texts}
+    dimensions = request_dimensions()
+    if dimensions:
+        payload["dimensions"] = dimensions
+    return payload
+
+
+class OpenRouterEmbeddingProvider(EmbeddingProvider):
+    """OpenAI-compatible embeddings endpoint on OpenRouter."""
+
+    name = "openrouter"
+
+    @property
+    def available(self) -> bool:
+        return bool((os.getenv("OPENROUTER_API_KEY") or "").strip())
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        batch_size = max(1, int(getattr(settings, "embeddings_batch_size", 64)))
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i : i + batch_size]
+            with httpx.Client(timeout=60) as client:
+                resp = client.post(_embeddings_endpoint(), headers=_headers(), json=_payload(batch))
+            if resp.status_code >= 400:
+                raise RuntimeError(f"OpenRouter embeddings failed: {resp.status_code} {resp.text[:500]}")
+            data = resp.json()
+            vectors.extend([item["embedding"] for item in (data.get("data") or []) if "embedding" in item])
+        return vectors
+
+
+_PROVIDER: Optional[EmbeddingProvider] = None
+_PROVIDER_LOCK = threading.Lock()
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the process-wide provider selected by settings.embedding_provider."""
+
+    global _PROVIDER
+    if _PROVIDER is not None:
+        return _PROVIDER
+    with _PROVIDER_LOCK:
+        if _PROVIDER is None:
+            name = (settings.embedding_provider or "openrouter").strip().lower()
+            if name == "local":
+                from .local_embeddings import LocalEmbeddingProvider
+
+                _PROVIDER = LocalEmbeddingProvider()
+            else:
+                if name != "openrouter":
+                    logger.warning("Unknown EMBEDDING_PROVIDER=%s; using openrouter", name)
+                _PROVIDER = OpenRouterEmbeddingProvider()
+    return _PROVIDER
+
+
+def embeddings_available() -> bool:
+    """True when embeddings are enabled and the configured provider can run."""
+    return (not settings.disable_embeddings) and get_embedding_provider().available
+
+
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """Generate embeddings for a list of texts."""
 
@@ -40,20 +126,7 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
 
     if not texts:
         return []
-
-    batch_size = max(1, int(getattr(settings, "embeddings_batch_size", 64)))
-    vectors: List[List[float]] = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-
-        payload = {"model": settings.embedding_model, "input": batch}
-        with httpx.Client(timeout=60) as client:
-            resp = client.post(_embeddings_endpoint(), headers=_headers(), json=payload)
-        if resp.status_code >= 400:
-            raise RuntimeError(f"OpenRouter embeddings failed: {resp.status_code} {resp.text[:500]}")
-        data = resp.json()
-        vectors.extend([item["embedding"] for item in (data.get("data") or []) if "embedding" in item])
-    return vectors
+    return reduce_vectors(get_embedding_provider().embed(texts))
 
 
 def embed_query(text: str) -> List[float]:
@@ -62,10 +135,5 @@ def embed_query(text: str) -> List[float]:
     if settings.disable_embeddings:
         raise RuntimeError("Embeddings are disabled (DISABLE_EMBEDDINGS=true)")
 
-    payload = {"model": settings.embedding_model, "input": [text]}
-    with httpx.Client(timeout=60) as client:
-        resp = client.post(_embeddings_endpoint(), headers=_headers(), json=payload)
-    if resp.status_code >= 400:
-        raise RuntimeError(f"OpenRouter embeddings failed: {resp.status_code} {resp.text[:500]}")
-    data = resp.json()
-    return (data.get("data") or [{}])[0].get("embedding") or []
+    vectors = get_embedding_provider().embed([text])
+    return reduce_vectors(vectors)[0] if vectors and vectors[0] else []
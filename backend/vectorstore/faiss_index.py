@@ -1,6 +1,7 @@
 import logging
+import os
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 try:
     import faiss  # type: ignore
@@ -10,18 +11,73 @@ except Exception:  # pragma: no cover
     _FAISS_AVAILABLE = False
 import numpy as np
 
-from .metadata import load_metadata, save_metadata
+from settings import settings
+from .base import VectorHit, VectorStore
+from .metadata import load_metadata, metadata_path, save_metadata
+from .quantization import RawVectors, build_index, configured_index_type, index_type_of, rerank
 
 logger = logging.getLogger(__name__)
 
-INDEXES: Dict[int, "faiss.IndexFlatL2"] = {}
-METADATA: Dict[int, List[dict]] = {}
+INDEXES: Dict[int, "faiss.IndexIDMap2"] = {}
+# Per repo: chunk_id -> metadata row, and file_path -> chunk ids (vector ids).
+METADATA: Dict[int, Dict[int, dict]] = {}
+FILE_IDS: Dict[int, Dict[str, Set[int]]] = {}
+# mtime of the index file each in-memory index was loaded from / saved as, so a
+# process notices indexes written by ingestion workers in other processes.
+_LOADED_MTIME: Dict[int, float] = {}
+# Float32 copies of vectors in compressed indexes (memory-mapped, for re-ranking).
+RAW_VECTORS: Dict[int, RawVectors] = {}
+# The raw vector file is rewritten once more than this share of its rows
+# belongs to removed or replaced chunks.
+_RAW_DEAD_FRACTION = 0.25
+# Repos with vectors added in memory but not yet saved (add_embeddings with
+# persist=False); refresh_index leaves them alone until flush_index.
+_UNSAVED: Set[int] = set()
 
 
 def _index_path(base_dir: Path, repo_id: int) -> Path:
     return base_dir / f"repo_{repo_id}.index"
 
 
+def _raw_vectors_path(base_dir: Path, repo_id: int) -> Path:
+    return base_dir / f"repo_{repo_id}.vectors"
+
+
+def _raw_vectors(base_dir: Path, repo_id: int, dimensions: int) -> RawVectors:
+    raw = RAW_VECTORS.get(repo_id)
+    if raw is None or raw.dimensions != int(dimensions):
+        raw = RAW_VECTORS[repo_id] = RawVectors(_raw_vectors_path(base_dir, repo_id), dimensions)
+    return raw
+
+
+def _new_index(dimensions: int) -> "faiss.IndexIDMap2":
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(int(dimensions)))
+
+
+def _set_metadata(repo_id: int, rows: List[dict]) -> None:
+    by_id: Dict[int, dict] = {}
+    by_file: Dict[str, Set[int]] = {}
+    for row in rows:
+        chunk_id = int(row["chunk_id"])
+        by_id[chunk_id] = row
+        by_file.setdefault(str(row.get("file_path") or ""), set()).add(chunk_id)
+    METADATA[repo_id] = by_id
+    FILE_IDS[repo_id] = by_file
+
+
+def _as_id_map(index, rows: List[dict]) -> "faiss.IndexIDMap2":
+    """Convert a legacy positional IndexFlatL2 (row i = metadata[i]) to an IndexIDMap2."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return index
+    converted = _new_index(index.d)
+    count = min(int(index.ntotal), len(rows))
+    if count:
+        vectors = index.reconstruct_n(0, count)
+        ids = np.array([int(row["chunk_id"]) for row in rows[:count]], dtype="int64")
+        converted.add_with_ids(vectors, ids)
+    return converted
+
+
 def load_indexes_from_disk(base_dir: Path) -> None:
     """Load any persisted FAISS indexes into memory."""
     if not _FAISS_AVAILABLE:
@@ -32,10 +88,49 @@ def load_indexes_from_disk(base_dir: Path) -> None:
             repo_id = int(path.stem.split("_")[1])
         except (IndexError, ValueError):
             continue
-        index = faiss.read_index(str(path))
-        INDEXES[repo_id] = index
-        METADATA[repo_id] = load_metadata(base_dir, repo_id)
-        logger.info("Loaded FAISS index for repo %s with %s vectors", repo_id, index.ntotal)
+        _load_repo_index(base_dir, repo_id)
+        logger.info("Loaded FAISS index for repo %s with %s vectors", repo_id, INDEXES[repo_id].ntotal)
+
+
+def _load_repo_index(base_dir: Path, repo_id: int) -> None:
+    path = _index_path(base_dir, repo_id)
+    mtime = path.stat().st_mtime
+    index = faiss.read_index(str(path))
+    rows = load_metadata(base_dir, repo_id)
+    legacy = not isinstance(index, faiss.IndexIDMap2)
+    INDEXES[repo_id] = _as_id_map(index, rows)
+    _set_metadata(repo_id, rows)
+    # Fresh memory map: another process may have appended rows.
+    RAW_VECTORS[repo_id] = RawVectors(_raw_vectors_path(base_dir, repo_id), INDEXES[repo_id].d)
+    _LOADED_MTIME[repo_id] = mtime
+    if legacy:
+        logger.info("Converted positional FAISS index to IndexIDMap2 repo_id=%s", repo_id)
+        save_index(base_dir, repo_id)
+
+
+def _forget(repo_id: int) -> None:
+    """Drop a repo's in-memory index state; the next access reloads it from disk."""
+    INDEXES.pop(repo_id, None)
+    METADATA.pop(repo_id, None)
+    FILE_IDS.pop(repo_id, None)
+    RAW_VECTORS.pop(repo_id, None)
+    _LOADED_MTIME.pop(repo_id, None)
+    _UNSAVED.discard(repo_id)
+
+
+def refresh_index(base_dir: Path, repo_id: int) -> None:
+    """Reload a repo index if another process rewrote it since it was loaded."""
+    if not _FAISS_AVAILABLE or repo_id in _UNSAVED:
+        return
+    path = _index_path(base_dir, repo_id)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        if repo_id in INDEXES:
+            _forget(repo_id)
+        return
+    if _LOADED_MTIME.get(repo_id) != mtime:
+        _load_repo_index(base_dir, repo_id)
 
 
 def save_index(base_dir: Path, repo_id: int) -> None:
@@ -44,57 +139,380 @@ def save_index(base_dir: Path, repo_id: int) -> None:
         return
     if repo_id not in INDEXES:
         return
-    faiss.write_index(INDEXES[repo_id], str(_index_path(base_dir, repo_id)))
-    save_metadata(base_dir, repo_id, METADATA.get(repo_id, []))
+    # Metadata first, then an atomic index replace: readers key reloads off the
+    # index mtime and never see a partially written file.
+    save_metadata(base_dir, repo_id, list(METADATA.get(repo_id, {}).values()))
+    path = _index_path(base_dir, repo_id)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    faiss.write_index(INDEXES[repo_id], str(tmp_path))
+    os.replace(tmp_path, path)
+    _LOADED_MTIME[repo_id] = path.stat().st_mtime
+    _UNSAVED.discard(repo_id)
+
+
+def _remove_ids_in_memory(repo_id: int, chunk_ids: Iterable[int]) -> int:
+    index = INDEXES.get(repo_id)
+    metadata = METADATA.get(repo_id, {})
+    ids = [int(chunk_id) for chunk_id in chunk_ids if int(chunk_id) in metadata]
+    if index is None or not ids:
+        return 0
+    removed = int(index.remove_ids(np.array(ids, dtype="int64")))
+    by_file = FILE_IDS.get(repo_id, {})
+    for chunk_id in ids:
+        row = metadata.pop(chunk_id)
+        path = str(row.get("file_path") or "")
+        file_ids = by_file.get(path)
+        if file_ids is not None:
+            file_ids.discard(chunk_id)
+            if not file_ids:
+                del by_file[path]
+    return removed
+
+
+def _compact_raw_vectors(base_dir: Path, repo_id: int) -> None:
+    """Rewrite a repo's raw vector file with only the rows of live chunks, renumbering `row`.
+
+    Skipped while dead rows are at most _RAW_DEAD_FRACTION of the file. The
+    caller saves the index, which makes readers reload the new row numbers.
+    """
+    index = INDEXES.get(repo_id)
+    if index is None:
+        return
+    raw = _raw_vectors(base_dir, repo_id, index.d)
+    total = raw.rows
+    if not total:
+        return
+    metadata = METADATA[repo_id]
+    live = [chunk_id for chunk_id, row in metadata.items() if row.get("row") is not None]
+    if total - len(live) <= total * _RAW_DEAD_FRACTION:
+        return
+    if not live:
+        raw.delete()
+    else:
+        rows = raw.rewrite(raw.read([metadata[chunk_id]["row"] for chunk_id in live]))
+        for chunk_id, raw_row in zip(live, rows):
+            metadata[chunk_id] = dict(metadata[chunk_id], row=raw_row)
+    logger.info("Compacted raw vectors repo_id=%s from %s to %s rows", repo_id, total, len(live))
 
 
-def add_embeddings(base_dir: Path, repo_id: int, embeddings: List[List[float]], metadata: List[dict]) -> None:
-    """Add embeddings and metadata to a repo index and persist them."""
+def add_embeddings(
+    base_dir: Path, repo_id: int, embeddings: List[List[float]], metadata: List[dict], persist: bool = True
+) -> None:
+    """Add (or replace) vectors keyed by chunk_id and persist the repo index.
+
+    With persist=False the vectors stay in memory until `flush_index`: saving
+    rewrites the whole index and metadata file, so ingestion saves every few
+    batches instead of after each one. Raw vector rows are appended right away.
+    """
     if not _FAISS_AVAILABLE:
         return
     vectors = np.array(embeddings, dtype="float32")
+    ids = np.array([int(row["chunk_id"]) for row in metadata], dtype="int64")
+    refresh_index(base_dir, repo_id)
     if repo_id not in INDEXES:
-        INDEXES[repo_id] = faiss.IndexFlatL2(vectors.shape[1])
-        METADATA[repo_id] = []
-    INDEXES[repo_id].add(vectors)
-    METADATA[repo_id].extend(metadata)
+        INDEXES[repo_id] = _new_index(vectors.shape[1])
+        METADATA[repo_id] = {}
+        FILE_IDS[repo_id] = {}
+    if INDEXES[repo_id].d != vectors.shape[1]:
+        raise RuntimeError(
+            f"repo {repo_id} index has {INDEXES[repo_id].d} dimensions, got {vectors.shape[1]}; re-ingest with full=true"
+        )
+    target = configured_index_type(repo_id)
+    if target != "flat":
+        rows = _raw_vectors(base_dir, repo_id, vectors.shape[1]).append(vectors)
+        metadata = [dict(row, row=raw_row) for row, raw_row in zip(metadata, rows)]
+    # IndexIDMap2 keeps duplicate ids, so re-added chunks replace the old vector.
+    _remove_ids_in_memory(repo_id, ids.tolist())
+    INDEXES[repo_id].add_with_ids(vectors, ids)
+    by_file = FILE_IDS[repo_id]
+    for row in metadata:
+        chunk_id = int(row["chunk_id"])
+        METADATA[repo_id][chunk_id] = row
+        by_file.setdefault(str(row.get("file_path") or ""), set()).add(chunk_id)
+    if persist:
+        _persist_added(base_dir, repo_id)
+    else:
+        _UNSAVED.add(repo_id)
+
+
+def _persist_added(base_dir: Path, repo_id: int) -> None:
+    # Rebuilds and compaction renumber raw rows, so they wait for the save that
+    # publishes the new row numbers to readers.
+    target = configured_index_type(repo_id)
+    current = index_type_of(INDEXES[repo_id])
+    if current != target and (target == "flat" or INDEXES[repo_id].ntotal >= int(settings.faiss_train_min_vectors)):
+        _rebuild_in_memory(base_dir, repo_id, target)
+    else:
+        _compact_raw_vectors(base_dir, repo_id)
+    save_index(base_dir, repo_id)
+
+
+def flush_index(base_dir: Path, repo_id: int) -> None:
+    """Persist vectors added with persist=False (no-op when nothing is pending)."""
+    if not _FAISS_AVAILABLE or repo_id not in _UNSAVED:
+        return
+    if repo_id not in INDEXES:
+        _UNSAVED.discard(repo_id)
+        return
+    try:
+        _persist_added(base_dir, repo_id)
+    except Exception:
+        # Unsaved vectors are dropped (the resume backfill re-embeds them) so
+        # this process goes back to following the saved index.
+        _forget(repo_id)
+        raise
+
+
+def _rebuild_in_memory(base_dir: Path, repo_id: int, index_type: str) -> None:
+    """Rebuild a repo index as `index_type`, training on its full vectors.
+
+    Full vectors come from the raw vector file; chunks without a stored row are
+    reconstructed from the current index (exact for flat indexes). For
+    compressed targets the raw file is then rewritten with exactly these
+    vectors (dead rows dropped, rows renumbered); flat indexes need none, so
+    it is deleted.
+    """
+    index = INDEXES[repo_id]
+    metadata = METADATA[repo_id]
+    chunk_ids = sorted(metadata)
+    raw = _raw_vectors(base_dir, repo_id, index.d)
+    vectors = np.empty((len(chunk_ids), index.d), dtype="float32")
+
+    missing = [i for i, chunk_id in enumerate(chunk_ids) if metadata[chunk_id].get("row") is None]
+    if missing:
+        if index_type_of(index) != "flat":
+            logger.warning("Rebuilding repo_id=%s from approximate vectors for %s chunks", repo_id, len(missing))
+        for i in missing:
+            vectors[i] = index.reconstruct(int(chunk_ids[i]))
+
+    missing_set = set(missing)
+    stored = [i for i in range(len(chunk_ids)) if i not in missing_set]
+    if stored:
+        vectors[stored] = raw.read([metadata[chunk_ids[i]]["row"] for i in stored])
+    if index_type != "flat":
+        for chunk_id, raw_row in zip(chunk_ids, raw.rewrite(vectors)):
+            metadata[chunk_id] = dict(metadata[chunk_id], row=raw_row)
+    else:
+        raw.delete()
+        for chunk_id in chunk_ids:
+            metadata[chunk_id] = {key: value for key, value in metadata[chunk_id].items() if key != "row"}
+    INDEXES[repo_id] = build_index(index_type, vectors, np.array(chunk_ids, dtype="int64"))
+    logger.info("Rebuilt FAISS index repo_id=%s as %s (%s vectors)", repo_id, index_type, len(chunk_ids))
+
+
+def rebuild_index(base_dir: Path, repo_id: int, index_type: Optional[str] = None) -> None:
+    """Rebuild a repo index as `index_type` (default: its configured type) and persist it."""
+    if not _FAISS_AVAILABLE:
+        return
+    refresh_index(base_dir, repo_id)
+    if repo_id not in INDEXES or not METADATA.get(repo_id):
+        return
+    _rebuild_in_memory(base_dir, repo_id, index_type or configured_index_type(repo_id))
     save_index(base_dir, repo_id)
 
 
+def remove_ids(base_dir: Path, repo_id: int, chunk_ids: Iterable[int]) -> int:
+    """Remove vectors by chunk id and persist; returns the number removed."""
+    if not _FAISS_AVAILABLE:
+        return 0
+    refresh_index(base_dir, repo_id)
+    removed = _remove_ids_in_memory(repo_id, chunk_ids)
+    if removed:
+        _compact_raw_vectors(base_dir, repo_id)
+        save_index(base_dir, repo_id)
+    return removed
+
+
+def remove_files(base_dir: Path, repo_id: int, file_paths: Iterable[str]) -> int:
+    """Remove every vector belonging to the given files (O(chunks in those files))."""
+    if not _FAISS_AVAILABLE:
+        return 0
+    refresh_index(base_dir, repo_id)
+    by_file = FILE_IDS.get(repo_id, {})
+    ids: Set[int] = set()
+    for path in file_paths:
+        ids.update(by_file.get(path, ()))
+    removed = _remove_ids_in_memory(repo_id, ids)
+    if removed:
+        _compact_raw_vectors(base_dir, repo_id)
+        save_index(base_dir, repo_id)
+    return removed
+
+
 def search(repo_id: int, query_vector: List[float], top_k: int) -> Tuple[List[int], List[float]]:
-    """Search the FAISS index for nearest neighbors."""
+    """Search the FAISS index; returns (chunk_ids, distances), -1 for empty slots."""
     if not _FAISS_AVAILABLE:
         return [], []
     if repo_id not in INDEXES:
         return [], []
     index = INDEXES[repo_id]
     vector = np.array([query_vector], dtype="float32")
-    distances, indices = index.search(vector, top_k)
-    return indices[0].tolist(), distances[0].tolist()
+    distances, ids = index.search(vector, top_k)
+    return ids[0].tolist(), distances[0].tolist()
+
+
+def search_batch(repo_id: int, query_vectors: Sequence[List[float]], top_k: int) -> Tuple[List[List[int]], List[List[float]]]:
+    """Search several query vectors in one `index.search` call (one BLAS GEMM).
+
+    Compressed indexes return `top_k * FAISS_RERANK_FACTOR` candidates, which
+    are re-ranked with exact distances from the memory-mapped float vectors.
+    """
+    if not _FAISS_AVAILABLE or len(query_vectors) == 0:
+        return [], []
+    if repo_id not in INDEXES:
+        return [[] for _ in query_vectors], [[] for _ in query_vectors]
+    index = INDEXES[repo_id]
+    matrix = np.asarray(query_vectors, dtype="float32")
+    if matrix.ndim != 2 or matrix.shape[1] != index.d:
+        # Index built with another EMBEDDING_DIMENSIONS; it needs a full re-ingest.
+        logger.warning("Query dimension %s does not match repo_id=%s index (%s)", matrix.shape[-1], repo_id, index.d)
+        return [[] for _ in query_vectors], [[] for _ in query_vectors]
+    factor = int(settings.faiss_rerank_factor)
+    raw = RAW_VECTORS.get(repo_id)
+    if factor <= 0 or raw is None or index_type_of(index) == "flat" or not raw.rows:
+        distances, ids = index.search(matrix, top_k)
+        return ids.tolist(), distances.tolist()
+    _, ids = index.search(matrix, min(int(index.ntotal), top_k * factor))
+    return rerank(raw, METADATA.get(repo_id, {}), matrix, ids, top_k)
 
 
-def get_metadata(repo_id: int) -> List[dict]:
-    """Return metadata rows for a repo index."""
-    return METADATA.get(repo_id, [])
+def get_metadata(repo_id: int) -> Dict[int, dict]:
+    """Return metadata rows for a repo index, keyed by chunk_id."""
+    return METADATA.get(repo_id, {})
 
 
 def delete_index(base_dir: Path, repo_id: int) -> None:
     """Delete the FAISS index and metadata for a repo from memory and disk."""
     # Remove from memory
-    if repo_id in INDEXES:
-        del INDEXES[repo_id]
-    if repo_id in METADATA:
-        del METADATA[repo_id]
-    
+    _forget(repo_id)
+
     # Remove from disk
     try:
         index_file = _index_path(base_dir, repo_id)
         if index_file.exists():
             index_file.unlink()
-        
-        from .metadata import metadata_path
+
         metadata_file = metadata_path(base_dir, repo_id)
         if metadata_file.exists():
             metadata_file.unlink()
+
+        raw_file = _raw_vectors_path(base_dir, repo_id)
+        if raw_file.exists():
+            raw_file.unlink()
     except Exception:
         logger.exception("Failed to delete index files for repo %s", repo_id)
+
+
+class FaissVectorStore(VectorStore):
+    """In-process FAISS indexes persisted under DATA_DIR (one index per repo)."""
+
+    name = "faiss"
+
+    def __init__(self, base_dir: Path) -> None:
+        self.base_dir = base_dir
+
+    @property
+    def available(self) -> bool:
+        return _FAISS_AVAILABLE
+
+    def load(self) -> None:
+        load_indexes_from_disk(self.base_dir)
+
+    def add(self, repo_id: int, embeddings: List[List[float]], metadata: List[dict], persist: bool = True) -> None:
+        add_embeddings(self.base_dir, repo_id, embeddings, metadata, persist)
+
+    def flush(self, repo_id: int) -> None:
+        flush_index(self.base_dir, repo_id)
+
+    @staticmethod
+    def _collect_hits(
+        repo_id: int,
+        metadata: Dict[int, dict],
+        ids: List[int],
+        distances: List[float],
+        top_k: int,
+        wanted: Optional[Set[str]],
+    ) -> List[VectorHit]:
+        hits: List[VectorHit] = []
+        for chunk_id, dist in zip(ids, distances):
+            row = metadata.get(int(chunk_id))
+            if row is None:
+                continue
+            if wanted is not None and row.get("file_path") not in wanted:
+                continue
+            hits.append(VectorHit(int(row["chunk_id"]), str(row["file_path"]), float(dist), int(repo_id)))
+            if len(hits) >= top_k:
+                break
+        return hits
+
+    def search(
+        self,
+        repo_id: int,
+        query_vector: List[float],
+        top_k: int,
+        *,
+        file_paths: Optional[Sequence[str]] = None,
+    ) -> List[VectorHit]:
+        return self.search_batch(repo_id, [query_vector], top_k, file_paths=file_paths)[0]
+
+    def search_batch(
+        self,
+        repo_id: int,
+        query_vectors: Sequence[List[float]],
+        top_k: int,
+        *,
+        file_paths: Optional[Sequence[str]] = None,
+    ) -> List[List[VectorHit]]:
+        refresh_index(self.base_dir, repo_id)
+        index = INDEXES.get(repo_id)
+        if index is None or not index.ntotal or len(query_vectors) == 0:
+            return [[] for _ in query_vectors]
+        metadata = METADATA.get(repo_id, {})
+        wanted = set(file_paths) if file_paths else None
+
+        # Flat indexes cannot pre-filter; oversample and post-filter by path,
+        # then rescan the whole index for queries that are still short.
+        k = top_k if wanted is None else min(index.ntotal, max(top_k * 8, top_k))
+        ids, distances = search_batch(repo_id, query_vectors, k)
+        results = [
+            self._collect_hits(repo_id, metadata, row_ids, row_dists, top_k, wanted)
+            for row_ids, row_dists in zip(ids, distances)
+        ]
+        if wanted is None or k >= index.ntotal:
+            return results
+        short = [i for i, hits in enumerate(results) if len(hits) < top_k]
+        if short:
+            ids, distances = search_batch(repo_id, [query_vectors[i] for i in short], int(index.ntotal))
+            for i, row_ids, row_dists in zip(short, ids, distances):
+                results[i] = self._collect_hits(repo_id, metadata, row_ids, row_dists, top_k, wanted)
+        return results
+
+    def indexed_chunk_ids(self, repo_id: int) -> set[int]:
+        refresh_index(self.base_dir, repo_id)
+        return set(get_metadata(repo_id))
+
+    def delete_chunks(self, repo_id: int, chunk_ids: Sequence[int]) -> None:
+        remove_ids(self.base_dir, repo_id, chunk_ids)
+
+    def delete_files(self, repo_id: int, file_paths: Sequence[str]) -> None:
+        remove_files(self.base_dir, repo_id, file_paths)
+
+    def delete_repo(self, repo_id: int) -> None:
+        delete_index(self.base_dir, repo_id)
+
+
+if __name__ == "__main__":
+    # Usage (from backend/): python -m vectorstore.faiss_index rebuild <repo_id> [flat|fp16|sq8|pq]
+    import sys
+
+    from settings import DATA_DIR
+
+    if len(sys.argv) >= 3 and sys.argv[1] == "rebuild" and sys.argv[2].isdigit():
+        target_repo = int(sys.argv[2])
+        rebuild_index(DATA_DIR, target_repo, sys.argv[3] if len(sys.argv) > 3 else None)
+        if target_repo in INDEXES:
+            print(f"repo {target_repo}: {index_type_of(INDEXES[target_repo])}, {INDEXES[target_repo].ntotal} vectors")
+        else:
+            print(f"repo {target_repo}: no index")
+    else:
+        print("Usage: python -m vectorstore.faiss_index rebuild <repo_id> [flat|fp16|sq8|pq]")
@@ -0,0 +1,171 @@
+"""On-box CPU embedding provider (EMBEDDING_PROVIDER=local).
+
+Two optional backends, picked by LOCAL_EMBEDDING_BACKEND (default `auto`):
+
+- `onnx`: ONNX Runtime + `tokenizers`. LOCAL_EMBEDDING_MODEL is a directory
+  holding `model.onnx` and `tokenizer.json` (a sentence-transformers model
+  exported to ONNX). No PyTorch needed, which keeps air-gapped images small.
+- `sentence-transformers`: LOCAL_EMBEDDING_MODEL is a model name or path.
+
+`auto` uses ONNX when the model directory has `model.onnx`, otherwise
+sentence-transformers. Vectors are mean-pooled and L2-normalized. Inference
+uses LOCAL_EMBEDDING_THREADS threads and batches of LOCAL_EMBEDDING_BATCH_SIZE
+texts, sorted by length so batches carry little padding.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import onnxruntime  # type: ignore
+    _ONNX_AVAILABLE = True
+except Exception:  # pragma: no cover
+    onnxruntime = None  # type: ignore
+    _ONNX_AVAILABLE = False
+
+try:
+    from tokenizers import Tokenizer  # type: ignore
+    _TOKENIZERS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    Tokenizer = None  # type: ignore
+    _TOKENIZERS_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer  # type: ignore
+    _SENTENCE_TRANSFORMERS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    SentenceTransformer = None  # type: ignore
+    _SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+from settings import settings
+from .embeddings import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _OnnxEncoder:
+    def __init__(self, model_dir: Path, threads: int, max_tokens: int) -> None:
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, threads)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / "model.onnx"), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_tokens)
+        self.tokenizer.enable_padding()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype="int64")
+        attention = np.array([e.attention_mask for e in encodings], dtype="int64")
+        feeds = {"input_ids": input_ids, "attention_mask": attention}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention[:, :, None].astype("float32")
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return _normalize(pooled.astype("float32"))
+
+
+class _SentenceTransformerEncoder:
+    def __init__(self, model: str, threads: int, max_tokens: int) -> None:
+        try:
+            import torch  # type: ignore
+
+            torch.set_num_threads(max(1, threads))
+        except Exception:  # pragma: no cover
+            pass
+        self.model = SentenceTransformer(model, device="cpu")
+        self.model.max_seq_length = max_tokens
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(
+            texts,
+            batch_size=len(texts),
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return np.asarray(vectors, dtype="float32")
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Sentence-embedding model running in-process on the CPU."""
+
+    name = "local"
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        *,
+        backend: Optional[str] = None,
+        threads: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        self.model = model or settings.local_embedding_model
+        self.requested_backend = (backend or settings.local_embedding_backend or "auto").strip().lower()
+        self.threads = int(threads or settings.local_embedding_threads)
+        self.batch_size = max(1, int(batch_size or settings.local_embedding_batch_size))
+        self._encoder = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> Optional[str]:
+        onnx_ready = _ONNX_AVAILABLE and _TOKENIZERS_AVAILABLE and (Path(self.model) / "model.onnx").is_file()
+        if self.requested_backend == "onnx":
+            return "onnx" if onnx_ready else None
+        if self.requested_backend == "sentence-transformers":
+            return "sentence-transformers" if _SENTENCE_TRANSFORMERS_AVAILABLE else None
+        if onnx_ready:
+            return "onnx"
+        return "sentence-transformers" if _SENTENCE_TRANSFORMERS_AVAILABLE else None
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    def _get_encoder(self):
+        if self._encoder is not None:
+            return self._encoder
+        with self._lock:
+            if self._encoder is None:
+                backend = self.backend
+                max_tokens = int(settings.local_embedding_max_tokens)
+                if backend == "onnx":
+                    self._encoder = _OnnxEncoder(Path(self.model), self.threads, max_tokens)
+                elif backend == "sentence-transformers":
+                    self._encoder = _SentenceTransformerEncoder(self.model, self.threads, max_tokens)
+                else:
+                    raise RuntimeError(
+                        "Local embeddings need onnxruntime + tokenizers (with model.onnx in "
+                        "LOCAL_EMBEDDING_MODEL) or sentence-transformers"
+                    )
+                logger.info("Loaded local embedding model %s backend=%s threads=%s", self.model, backend, self.threads)
+        return self._encoder
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        encoder = self._get_encoder()
+        # Length-sorted batches keep padding (wasted compute) small.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: List[Optional[List[float]]] = [None] * len(texts)
+        for offset in range(0, len(order), self.batch_size):
+            positions = order[offset : offset + self.batch_size]
+            vectors = encoder.encode([texts[i] for i in positions])
+            for position, vector in zip(positions, vectors.tolist()):
+                out[position] = vector
+        return out  # type: ignore[return-value]
@@ -1,4 +1,5 @@
 import json
+import os
 from pathlib import Path
 from typing import Any, Dict, List
 
@@ -19,4 +20,6 @@ def load_metadata(base_dir: Path, repo_id: int) -> List[Dict[str, Any]]:
 def save_metadata(base_dir: Path, repo_id: int, items: List[Dict[str, Any]]) -> None:
     """Persist metadata JSON for a repo."""
     path = metadata_path(base_dir, repo_id)
-    path.write_text(json.dumps(items, ensure_ascii=True), encoding="utf-8")
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(items, ensure_ascii=True), encoding="utf-8")
+    os.replace(tmp_path, path)
@@ -0,0 +1,275 @@
+"""pgvector-backed vector store (VECTOR_STORE=pgvector).
+
+All repos share one `chunk_embeddings` table with an HNSW index, so every API
+replica and ingestion worker queries the same index instead of holding its own
+FAISS copy in memory. Requires PostgreSQL with the `vector` extension and the
+optional `psycopg` (v3) package; `psycopg_pool` is used when installed.
+"""
+
+import logging
+import re
+import threading
+from typing import List, Optional, Sequence
+
+try:
+    import psycopg  # type: ignore
+    _PSYCOPG_AVAILABLE = True
+except Exception:  # pragma: no cover
+    psycopg = None  # type: ignore
+    _PSYCOPG_AVAILABLE = False
+
+try:
+    from psycopg_pool import ConnectionPool  # type: ignore
+except Exception:  # pragma: no cover
+    ConnectionPool = None  # type: ignore
+
+from settings import settings
+from .base import VectorHit, VectorStore
+
+logger = logging.getLogger(__name__)
+
+_TABLE = "chunk_embeddings"
+
+
+def _conninfo(database_url: str) -> str:
+    """Turn a SQLAlchemy URL (postgresql+psycopg://...) into a libpq URL."""
+    return re.sub(r"^postgres(?:ql)?(\+\w+)?://", "postgresql://", (database_url or "").strip())
+
+
+def _vector_literal(vector: Sequence[float]) -> str:
+    return "[" + ",".join(repr(float(v)) for v in vector) + "]"
+
+
+class PgVectorStore(VectorStore):
+    """Chunk embeddings in PostgreSQL, searched through an HNSW index."""
+
+    name = "pgvector"
+
+    def __init__(self, database_url: str) -> None:
+        self.conninfo = _conninfo(database_url)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._dimensions: Optional[int] = None
+        self._iterative_scan = False
+
+    @property
+    def available(self) -> bool:
+        return _PSYCOPG_AVAILABLE and bool(self.conninfo)
+
+    def _connection(self):
+        if not self.available:
+            raise RuntimeError("pgvector store needs psycopg and PGVECTOR_DATABASE_URL")
+        if ConnectionPool is None:
+            return psycopg.connect(self.conninfo, autocommit=True)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ConnectionPool(
+                    self.conninfo,
+                    min_size=1,
+                    max_size=max(1, int(settings.pgvector_pool_size)),
+                    kwargs={"autocommit": True},
+                )
+        return self._pool.connection()
+
+    def _ensure_schema(self, dimensions: int) -> None:
+        if self._dimensions is not None:
+            return
+        # A separate lock: _connection() takes self._lock to create the pool.
+        with self._schema_lock:
+            if self._dimensions is not None:
+                return
+            with self._connection() as conn:
+                conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+                conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {_TABLE} (
+                        chunk_id BIGINT PRIMARY KEY,
+                        repo_id INTEGER NOT NULL,
+                        file_path TEXT NOT NULL,
+                        token_count INTEGER NOT NULL DEFAULT 0,
+                        embedding vector({int(dimensions)}) NOT NULL
+                    )
+                    """
+                )
+                conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{_TABLE}_repo_file ON {_TABLE} (repo_id, file_path)")
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS ix_{_TABLE}_hnsw ON {_TABLE} USING hnsw (embedding vector_l2_ops) "
+                    f"WITH (m = {int(settings.pgvector_hnsw_m)}, ef_construction = {int(settings.pgvector_hnsw_ef_construction)})"
+                )
+                version = conn.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'").fetchone()
+            parts = [int(p) for p in re.findall(r"\d+", (version or ["0"])[0])[:2]] + [0, 0]
+            # Iterative index scans (pgvector >= 0.8) keep filtered HNSW searches from under-returning.
+            self._iterative_scan = (parts[0], parts[1]) >= (0, 8)
+            self._dimensions = int(dimensions)
+
+    def _existing_dimensions(self) -> Optional[int]:
+        with self._connection() as conn:
+            row = conn.execute(
+                """
+                SELECT atttypmod FROM pg_attribute
+                WHERE attrelid = to_regclass(%s) AND attname = 'embedding'
+                """,
+                (_TABLE,),
+            ).fetchone()
+        return int(row[0]) if row and row[0] and int(row[0]) > 0 else None
+
+    def load(self) -> None:
+        if not self.available:
+            logger.warning("pgvector store unavailable (install psycopg and set PGVECTOR_DATABASE_URL)")
+            return
+        dimensions = int(settings.pgvector_dimensions or 0) or self._existing_dimensions()
+        if dimensions:
+            self._ensure_schema(dimensions)
+
+    def add(self, repo_id: int, embeddings: List[List[float]], metadata: List[dict], persist: bool = True) -> None:
+        """Bulk-load vectors with COPY through a staging table (upsert on chunk_id).
+
+        Rows are committed per call, so `persist` is ignored.
+        """
+        if not embeddings:
+            return
+        self._ensure_schema(len(embeddings[0]))
+        with self._connection() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute(
+                        f"CREATE TEMP TABLE IF NOT EXISTS _{_TABLE}_staging "
+                        f"(LIKE {_TABLE} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                    )
+                    with cur.copy(
+                        f"COPY _{_TABLE}_staging (chunk_id, repo_id, file_path, token_count, embedding) FROM STDIN"
+                    ) as copy:
+                        for vector, meta in zip(embeddings, metadata):
+                            copy.write_row(
+                                (
+                                    int(meta["chunk_id"]),
+                                    int(repo_id),
+                                    str(meta.get("file_path") or ""),
+                                    int(meta.get("token_count") or 0),
+                                    _vector_literal(vector),
+                                )
+                            )
+                    cur.execute(
+                        f"INSERT INTO {_TABLE} (chunk_id, repo_id, file_path, token_count, embedding) "
+                        f"SELECT chunk_id, repo_id, file_path, token_count, embedding FROM _{_TABLE}_staging "
+                        "ON CONFLICT (chunk_id) DO UPDATE SET repo_id = EXCLUDED.repo_id, "
+                        "file_path = EXCLUDED.file_path, token_count = EXCLUDED.token_count, "
+                        "embedding = EXCLUDED.embedding"
+                    )
+
+    def search(
+        self,
+        repo_id: int,
+        query_vector: List[float],
+        top_k: int,
+        *,
+        file_paths: Optional[Sequence[str]] = None,
+    ) -> List[VectorHit]:
+        return self.search_batch(repo_id, [query_vector], top_k, file_paths=file_paths)[0]
+
+    def search_batch(
+        self,
+        repo_id: int,
+        query_vectors: Sequence[List[float]],
+        top_k: int,
+        *,
+        file_paths: Optional[Sequence[str]] = None,
+    ) -> List[List[VectorHit]]:
+        """Run the queries back to back on one connection and transaction."""
+        if not self.available or not query_vectors:
+            return [[] for _ in query_vectors]
+        if self._dimensions is None:
+            self.load()
+            if self._dimensions is None:
+                return [[] for _ in query_vectors]
+
+        k = max(1, int(top_k))
+        where = "repo_id = %s"
+        filters: list = [int(repo_id)]
+        if file_paths:
+            where += " AND file_path = ANY(%s)"
+            filters.append(list(file_paths))
+        sql = (
+            f"SELECT chunk_id, file_path, embedding <-> %s::vector AS distance FROM {_TABLE} "
+            f"WHERE {where} ORDER BY embedding <-> %s::vector LIMIT %s"
+        )
+
+        results: List[List[VectorHit]] = []
+        with self._connection() as conn:
+            with conn.transaction():
+                conn.execute(f"SET LOCAL hnsw.ef_search = {max(k, int(settings.pgvector_ef_search))}")
+                if self._iterative_scan:
+                    conn.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+                for query_vector in query_vectors:
+                    if not query_vector:
+                        results.append([])
+                        continue
+                    query = _vector_literal(query_vector)
+                    rows = conn.execute(sql, [query, *filters, query, k]).fetchall()
+                    hits = [
+                        VectorHit(int(chunk_id), str(path), float(distance), int(repo_id))
+                        for chunk_id, path, distance in rows
+                    ]
+                    # relaxed_order may return slightly out-of-order rows; restore distance order.
+                    results.append(sorted(hits, key=lambda hit: hit.distance))
+        return results
+
+    def search_repos(self, repo_ids: Sequence[int], query_vector: List[float], top_k: int) -> List[VectorHit]:
+        """One HNSW query over the shared table, filtered to `repo_ids`."""
+        repo_ids = sorted({int(repo_id) for repo_id in repo_ids})
+        if not repo_ids or not self.available or not query_vector:
+            return []
+        if self._dimensions is None:
+            self.load()
+            if self._dimensions is None:
+                return []
+
+        k = max(1, int(top_k))
+        query = _vector_literal(query_vector)
+        with self._connection() as conn:
+            with conn.transaction():
+                conn.execute(f"SET LOCAL hnsw.ef_search = {max(k, int(settings.pgvector_ef_search))}")
+                if self._iterative_scan:
+                    conn.execute("SET LOCAL hnsw.iterative_scan = relaxed_order")
+                rows = conn.execute(
+                    f"SELECT chunk_id, file_path, repo_id, embedding <-> %s::vector AS distance FROM {_TABLE} "
+                    "WHERE repo_id = ANY(%s) ORDER BY embedding <-> %s::vector LIMIT %s",
+                    [query, repo_ids, query, k],
+                ).fetchall()
+        hits = [
+            VectorHit(int(chunk_id), str(path), float(distance), int(repo))
+            for chunk_id, path, repo, distance in rows
+        ]
+        return sorted(hits, key=lambda hit: hit.distance)
+
+    def indexed_chunk_ids(self, repo_id: int) -> set[int]:
+        if not self.available or (self._dimensions is None and self._existing_dimensions() is None):
+            return set()
+        with self._connection() as conn:
+            rows = conn.execute(f"SELECT chunk_id FROM {_TABLE} WHERE repo_id = %s", (int(repo_id),)).fetchall()
+        return {int(row[0]) for row in rows}
+
+    def delete_chunks(self, repo_id: int, chunk_ids: Sequence[int]) -> None:
+        if not chunk_ids or not self.available or (self._dimensions is None and self._existing_dimensions() is None):
+            return
+        with self._connection() as conn:
+            conn.execute(
+                f"DELETE FROM {_TABLE} WHERE repo_id = %s AND chunk_id = ANY(%s)",
+                (int(repo_id), [int(chunk_id) for chunk_id in chunk_ids]),
+            )
+
+    def delete_files(self, repo_id: int, file_paths: Sequence[str]) -> None:
+        if not file_paths or not self.available or (self._dimensions is None and self._existing_dimensions() is None):
+            return
+        with self._connection() as conn:
+            conn.execute(
+                f"DELETE FROM {_TABLE} WHERE repo_id = %s AND file_path = ANY(%s)",
+                (int(repo_id), list(file_paths)),
+            )
+
+    def delete_repo(self, repo_id: int) -> None:
+        if not self.available or (self._dimensions is None and self._existing_dimensions() is None):
+            return
+        with self._connection() as conn:
+            conn.execute(f"DELETE FROM {_TABLE} WHERE repo_id = %s", (int(repo_id),))
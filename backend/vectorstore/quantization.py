@@ -0,0 +1,170 @@
+"""Compressed FAISS index types and exact re-ranking from on-disk float vectors.
+
+`FAISS_INDEX_TYPE` picks how a repo's vectors are held in RAM:
+
+- `flat`: float32 (exact, 4 bytes per dimension)
+- `fp16`: half-precision scalar quantizer (2 bytes per dimension)
+- `sq8`: 8-bit scalar quantizer (1 byte per dimension)
+- `pq`: product quantizer, `FAISS_PQ_M` bytes per vector
+
+For the compressed types the full float32 vectors are also appended to
+`repo_<id>.vectors` and read back through a memory map, so the top
+`k * FAISS_RERANK_FACTOR` candidates can be re-ranked with exact distances
+without keeping the floats in RAM. Rows of removed or replaced chunks are
+dropped when the file is rewritten (rebuilds, and once they pile up; see
+`faiss_index._compact_raw_vectors`).
+"""
+
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import faiss  # type: ignore
+    _FAISS_AVAILABLE = True
+except Exception:  # pragma: no cover
+    faiss = None  # type: ignore
+    _FAISS_AVAILABLE = False
+import numpy as np
+
+from settings import settings
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "fp16", "sq8", "pq")
+
+
+def configured_index_type(repo_id: int) -> str:
+    """Index type for a repo: FAISS_INDEX_TYPE_BY_REPO override, else FAISS_INDEX_TYPE."""
+    index_type = settings.faiss_index_type_by_repo.get(int(repo_id), settings.faiss_index_type)
+    index_type = (index_type or "flat").strip().lower()
+    if index_type not in INDEX_TYPES:
+        logger.warning("Unknown FAISS index type %s; using flat", index_type)
+        return "flat"
+    return index_type
+
+
+def _pq_subquantizers(dimensions: int) -> int:
+    """Largest divisor of `dimensions` not above FAISS_PQ_M (PQ needs d % M == 0)."""
+    wanted = max(1, min(int(settings.faiss_pq_m), int(dimensions)))
+    for m in range(wanted, 0, -1):
+        if dimensions % m == 0:
+            return m
+    return 1
+
+
+def build_index(index_type: str, vectors: np.ndarray, ids: np.ndarray) -> "faiss.IndexIDMap2":
+    """Build (and train, if needed) an id-mapped index of `index_type` over vectors."""
+    dimensions = int(vectors.shape[1])
+    if index_type == "fp16":
+        inner = faiss.IndexScalarQuantizer(dimensions, faiss.ScalarQuantizer.QT_fp16)
+    elif index_type == "sq8":
+        inner = faiss.IndexScalarQuantizer(dimensions, faiss.ScalarQuantizer.QT_8bit)
+    elif index_type == "pq":
+        inner = faiss.IndexPQ(dimensions, _pq_subquantizers(dimensions), 8)
+    else:
+        inner = faiss.IndexFlatL2(dimensions)
+    if not inner.is_trained:
+        inner.train(vectors)
+    index = faiss.IndexIDMap2(inner)
+    if len(ids):
+        index.add_with_ids(vectors, ids)
+    return index
+
+
+def index_type_of(index) -> str:
+    """Name of the storage type of an (id-mapped) index."""
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap2) else index)
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    if isinstance(inner, faiss.IndexPQ):
+        return "pq"
+    return "flat"
+
+
+def index_memory_bytes(index) -> int:
+    """Approximate RAM held by the vector codes (ids and metadata excluded)."""
+    inner = faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap2) else index)
+    code_size = int(getattr(inner, "code_size", 0) or inner.d * 4)
+    return int(index.ntotal) * code_size
+
+
+class RawVectors:
+    """Float32 vector file for one repo (appended to, compacted by rewrite), read through np.memmap."""
+
+    def __init__(self, path: Path, dimensions: int) -> None:
+        self.path = path
+        self.dimensions = int(dimensions)
+        self._map: Optional[np.memmap] = None
+
+    @property
+    def rows(self) -> int:
+        try:
+            return self.path.stat().st_size // (4 * self.dimensions)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, vectors: np.ndarray) -> List[int]:
+        """Append vectors and return their row numbers."""
+        start = self.rows
+        with open(self.path, "ab") as handle:
+            handle.truncate(start * 4 * self.dimensions)  # drop a torn partial row
+            handle.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+        self._map = None
+        return list(range(start, start + len(vectors)))
+
+    def rewrite(self, vectors: np.ndarray) -> List[int]:
+        """Atomically replace the file with exactly `vectors`; returns their new row numbers."""
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as handle:
+            handle.write(np.ascontiguousarray(vectors, dtype="float32").tobytes())
+        os.replace(tmp_path, self.path)
+        self._map = None
+        return list(range(len(vectors)))
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+        self._map = None
+
+    def read(self, rows: Sequence[int]) -> np.ndarray:
+        needed = (max(rows) + 1) if len(rows) else 0
+        if self._map is None or self._map.shape[0] < needed:
+            count = self.rows
+            if count < needed:
+                raise IndexError(f"{self.path.name} has {count} rows, need {needed}")
+            self._map = np.memmap(self.path, dtype="float32", mode="r", shape=(count, self.dimensions))
+        return np.asarray(self._map[np.asarray(rows, dtype="int64")])
+
+
+def rerank(
+    raw: RawVectors,
+    metadata: Dict[int, dict],
+    queries: np.ndarray,
+    ids: np.ndarray,
+    top_k: int,
+) -> Tuple[List[List[int]], List[List[float]]]:
+    """Re-order candidate ids per query by exact L2 distance from the raw vectors.
+
+    Candidates without a stored row keep their approximate distance order after
+    the exactly scored ones.
+    """
+    out_ids: List[List[int]] = []
+    out_dists: List[List[float]] = []
+    for query, row_ids in zip(queries, ids):
+        candidates = [int(chunk_id) for chunk_id in row_ids if int(chunk_id) in metadata]
+        rows = [metadata[chunk_id].get("row") for chunk_id in candidates]
+        scored = [(chunk_id, row) for chunk_id, row in zip(candidates, rows) if row is not None]
+        if scored:
+            vectors = raw.read([row for _, row in scored])
+            exact = ((vectors - query) ** 2).sum(axis=1)
+            order = np.argsort(exact, kind="stable")
+            ranked = [(scored[i][0], float(exact[i])) for i in order]
+        else:
+            ranked = []
+        seen = {chunk_id for chunk_id, _ in ranked}
+        ranked.extend((chunk_id, float("inf")) for chunk_id in candidates if chunk_id not in seen)
+        ranked = ranked[:top_k]
+        out_ids.append([chunk_id for chunk_id, _ in ranked])
+        out_dists.append([dist for _, dist in ranked])
+    return out_ids, out_dists